@@ -12,7 +12,7 @@ __docformat__ = 'restructuredtext'
 
 from .connection import Connection
 from .channel import Channel
-from .message import Message
+from .message import Message, MessageTemplate
 from .consumer import AbstractConsumer
 from .spec import basic_return_t, queue_declare_ok_t, method_t
 from .exceptions import (
@@ -46,5 +46,5 @@ from .exceptions import (
     __all__ as _all_exceptions,
 )
 
-__all__ = ['Connection', 'Channel', 'Message', 'AbstractConsumer',
+__all__ = ['Connection', 'Channel', 'Message', 'MessageTemplate', 'AbstractConsumer',
            'basic_return_t', 'queue_declare_ok_t', 'method_t'] + _all_exceptions
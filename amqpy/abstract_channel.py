@@ -4,10 +4,12 @@ from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
 from abc import ABCMeta, abstractmethod
-from threading import Lock
+from threading import Lock, Condition
+import time
 
 from .proto import Method
-from .exceptions import AMQPNotImplementedError, RecoverableConnectionError
+from .method_io import MethodQueue
+from .exceptions import AMQPNotImplementedError, RecoverableConnectionError, Timeout
 from . import spec
 
 __all__ = ['AbstractChannel']
@@ -26,7 +28,7 @@ class AbstractChannel:
     METHOD_MAP = {}
 
     #: List of methods which must be handled immediately
-    IMMEDIATE_METHODS = [spec.Basic.Return]
+    IMMEDIATE_METHODS = [spec.Basic.Return, spec.Basic.Ack, spec.Basic.Nack]
 
     def __init__(self, connection, channel_id):
         """
@@ -37,7 +39,13 @@ class AbstractChannel:
         self.channel_id = channel_id
         connection.channels[channel_id] = self
         # queue of incoming methods for this channel
-        self.incoming_methods = []  # list[Method]
+        self.incoming_methods = MethodQueue()
+        # guards `incoming_methods` when the connection's reader thread is enabled
+        self.incoming_cond = Condition()
+        # `allowed_methods` of each thread currently waiting on this channel; methods matching
+        # these are left in the queue for the waiters rather than being handled by
+        # `Connection.drain_events()`
+        self.waiting_for = []  # list[list[method_t] or None]
         self.auto_decode = False
         self.lock = Lock()
 
@@ -62,54 +70,68 @@ class AbstractChannel:
             method.channel_id = self.channel_id
         self.connection.method_writer.write_method(method)
 
-    def wait(self, method=None):
+    def wait(self, method=None, timeout=None):
         """Wait for the specified method from the server
 
         :param method: method to wait for, or `None` to wait for any method
+        :param timeout: maximum allowed time to wait, or `None` to wait indefinitely
         :type method: spec.method_t or None
+        :type timeout: float or None
+        :raise amqpy.exceptions.Timeout: if the operation times out
         """
         if method is None:
-            m = self._wait_method(None)
+            m = self._wait_method(None, timeout)
         else:
-            m = self._wait_method([method])
+            m = self._wait_method([method], timeout)
         return self.handle_method(m)
 
-    def wait_any(self, allowed_methods):
+    def wait_any(self, allowed_methods, timeout=None):
         """Wait for a method that matches any one of `allowed_methods`
 
         :param allowed_methods: list of methods to wait for
+        :param timeout: maximum allowed time to wait, or `None` to wait indefinitely
         :type allowed_methods: list[spec.method_t]
+        :type timeout: float or None
+        :raise amqpy.exceptions.Timeout: if the operation times out
         """
-        m = self._wait_method(allowed_methods)
+        m = self._wait_method(allowed_methods, timeout)
         return self.handle_method(m)
 
-    def _wait_method(self, allowed_methods):
+    def _wait_method(self, allowed_methods, timeout=None):
         """Wait for a method from the server destined for the current channel
 
         This method is designed to be called from a channel instance.
 
         :type allowed_methods: list or None
+        :type timeout: float or None
         :return: method
         :rtype: Method
+        :raise amqpy.exceptions.Timeout: if the operation times out
         """
         # create a more convenient list of methods to check
         if isinstance(allowed_methods, list):
             # we should always check if the incoming method is a channel or connection close
             allowed_methods = [spec.Channel.Close, spec.Connection.Close] + allowed_methods
 
-        # check the channel's method queue
-        incoming_methods = self.incoming_methods
+        connection = self.connection
+        # noinspection PyProtectedMember
+        if connection is not None and connection._reader_thread is not None:
+            return self._wait_queued_method(allowed_methods, timeout)
 
-        for qm in incoming_methods:
-            assert isinstance(qm, Method)
-            if allowed_methods is None or qm.method_type in allowed_methods:
-                # found the method we're looking for in the queue
-                incoming_methods.remove(qm)
-                return qm
+        # check the channel's method queue
+        method = self.incoming_methods.pop(allowed_methods)
+        if method is not None:
+            # found the method we're looking for in the queue
+            return method
 
         # nothing queued, need to wait for a method from the server
+        deadline = None if timeout is None else time.monotonic() + timeout
         while True:
-            method = self.connection.method_reader.read_method()
+            if deadline is None:
+                method = self.connection.method_reader.read_method()
+            else:
+                method = self.connection.method_reader.read_method(
+                    max(deadline - time.monotonic(), 0))
             ch_id = method.channel_id
             ch = self.connection.channels[ch_id]
             m_type = method.method_type
@@ -128,14 +150,68 @@ class AbstractChannel:
                 continue
 
             # not the channel and/or method we were looking for
-            # enqueue this method for later in the target channel's queue
-            ch.incoming_methods.append(method)
+            # enqueue this method for later in the target channel's queue; it may stay there for a
+            # while, so don't let it hold on to the transport's receive buffer
+            method.detach()
+            # noinspection PyProtectedMember
+            self.connection._queue_method(ch, method)
 
             # if the method is destined for channel 0 (the connection itself), it's probably an
             # exception, so handle it immediately
             if ch_id == 0:
                 self.connection.wait()
 
+    def _wait_queued_method(self, allowed_methods, timeout=None):
+        """Wait for a method to be placed in this channel's queue by the connection's reader
+        thread
+
+        Methods which must be handled immediately are handled as they are found in the queue. If
+        the reader thread places an exception in the queue, it is raised.
+
+        :type allowed_methods: list or None
+        :type timeout: float or None
+        :return: method
+        :rtype: Method
+        :raise amqpy.exceptions.Timeout: if the operation times out
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        incoming_methods = self.incoming_methods
+        cond = self.incoming_cond
+        try:
+            while True:
+                with cond:
+                    self.waiting_for.append(allowed_methods)
+                    try:
+                        while True:
+                            # an exception placed in the queue is raised here (and left in the
+                            # queue, so that it is raised to all waiters)
+                            method = incoming_methods.pop(allowed_methods)
+                            if method is not None:
+                                # found the method we're looking for in the queue
+                                return method
+                            immediate = incoming_methods.pop(self.IMMEDIATE_METHODS)
+                            if immediate is not None:
+                                break
+
+                            if deadline is None:
+                                cond.wait()
+                            else:
+                                remaining = deadline - time.monotonic()
+                                if remaining <= 0:
+                                    raise Timeout()
+                                cond.wait(remaining)
+                    finally:
+                        self.waiting_for.remove(allowed_methods)
+
+                # handle immediate methods (such as publisher confirms) outside of the lock, since
+                # they may invoke callbacks
+                self.handle_method(immediate)
+        finally:
+            if incoming_methods and self.connection is not None:
+                # methods this channel skipped over may now be handled by `drain_events()`
+                # noinspection PyProtectedMember
+                self.connection._notify_drain()
+
     def handle_method(self, method, channel=None):
         """Handle the specified received method
 
@@ -152,13 +228,9 @@ class AbstractChannel:
         content = method.content
         channel = channel or self
 
-        if content and channel.auto_decode and 'content_encoding' in content.properties:
-            # try to decode message body
-            # noinspection PyBroadException
-            try:
-                content.body = content.body.decode(content.properties['content_encoding'])
-            except Exception:
-                pass
+        if content and channel.auto_decode:
+            # the body is decoded when the application first accesses it
+            content.defer_decode()
 
         try:
             callback = channel.METHOD_MAP[method.method_type]
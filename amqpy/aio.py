@@ -0,0 +1,1132 @@
+"""asyncio-native AMQP connections and channels (Python 3.5+)
+
+This module provides :class:`Connection` and :class:`Channel` classes which run on an asyncio event
+loop instead of blocking sockets and threads. Any number of connections and channels can share a
+single event loop. The wire-level layers (:mod:`amqpy.proto`, :mod:`amqpy.serialization`,
+:mod:`amqpy.spec`) as well as :class:`~amqpy.method_io.MethodReader` and
+:class:`~amqpy.method_io.MethodWriter` are shared with the blocking implementation.
+
+Example::
+
+    async def main():
+        conn = await amqpy.aio.connect('localhost')
+        ch = await conn.channel()
+        qname, _, _ = await ch.queue_declare()
+        await ch.basic_publish(Message('hello'), routing_key=qname)
+
+        consumer = await ch.basic_consume(qname)
+        async for msg in consumer:
+            print(msg.body)
+            msg.ack()
+            break
+
+        await conn.close()
+
+This module is not imported by the :mod:`amqpy` package; import :mod:`amqpy.aio` explicitly.
+"""
+import asyncio
+import logging
+import struct
+import time
+from array import array
+from collections import OrderedDict, deque
+
+from . import spec
+from .proto import Frame, Method
+from .method_io import MethodReader, MethodWriter
+from .method_codecs import pack_args, unpack_args
+from .spec import FrameType, method_t, queue_declare_ok_t, basic_return_t
+from .exceptions import (AMQPConnectionError, ChannelError, ConsumerCancelled, ResourceError,
+                         RecoverableConnectionError, UnexpectedFrame, error_for_code)
+from .connection import LIBRARY_PROPERTIES
+from .login import login_responses
+
+__all__ = ['Connection', 'Channel', 'Consumer', 'connect']
+
+log = logging.getLogger('amqpy')
+
+AMQP_PROTOCOL_HEADER = b'AMQP\x00\x00\x09\x01'
+
+# frame type, channel, payload size
+_frame_header = struct.Struct('>BHI')
+
+
+class _AMQPProtocol(asyncio.Protocol):
+    """asyncio protocol which splits the incoming byte stream into frames and feeds them to a
+    :class:`MethodReader`
+
+    The protocol also acts as the transport for a :class:`MethodWriter`: see :meth:`write_frames()`.
+    """
+
+    #: :class:`MethodReader` never reads from the socket directly when used with this protocol
+    sock = None
+
+    def __init__(self, connection):
+        """
+        :type connection: Connection
+        """
+        self.connection = connection
+        self.transport = None
+        self.method_reader = MethodReader(self)
+
+        # bytes of an incomplete frame, and the number of bytes needed to continue parsing
+        self._rbuf = bytearray()
+        self._rneed = 0
+
+        self.last_read = self.last_write = time.monotonic()
+
+        self._paused = False
+        self._drain_waiters = deque()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(AMQP_PROTOCOL_HEADER)
+        self.last_write = time.monotonic()
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self._wake_drain_waiters()
+        # noinspection PyProtectedMember
+        self.connection._connection_lost(exc)
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        self._wake_drain_waiters()
+
+    def _wake_drain_waiters(self):
+        while self._drain_waiters:
+            waiter = self._drain_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self):
+        """Wait until the transport's write buffer is below its high-water mark
+        """
+        if self._paused and self.transport is not None:
+            waiter = self.connection.loop.create_future()
+            self._drain_waiters.append(waiter)
+            await waiter
+
+    def data_received(self, data):
+        self.last_read = time.monotonic()
+
+        if self._rbuf:
+            # continue an incomplete frame; only re-parse once enough data has been received
+            self._rbuf += data
+            if len(self._rbuf) < self._rneed:
+                return
+            data = bytes(self._rbuf)
+            self._rbuf = bytearray()
+
+        # frames are views of `data`, which is never modified
+        view = memoryview(data)
+        pos = 0
+        end = len(data)
+        reader = self.method_reader
+        while end - pos >= 7:
+            frame_type, channel, size = _frame_header.unpack_from(data, pos)
+            frame_end = pos + size + 8
+            if frame_end > end:
+                break
+
+            if data[frame_end - 1] != FrameType.END:
+                exc = UnexpectedFrame('Received {} while expecting 0xce (FrameType.END)'
+                                      .format(hex(data[frame_end - 1])))
+                # noinspection PyProtectedMember
+                self.connection._abort(exc)
+                return
+
+            frame = Frame()
+            frame.data = view[pos:frame_end]
+            reader.process_frame(frame)
+            pos = frame_end
+
+        if pos < end:
+            self._rbuf += view[pos:]
+            if end - pos >= 7:
+                self._rneed = _frame_header.unpack_from(data, pos)[2] + 8
+            else:
+                self._rneed = 7
+
+        queue = reader.method_queue
+        while queue:
+            # noinspection PyProtectedMember
+            self.connection._dispatch(queue.popleft())
+
+    def write_frames(self, buffers):
+        """Write buffers containing one or more complete frames
+
+        :param buffers: buffers, as produced by :meth:`amqpy.proto.Method.pack_frames()`
+        :type buffers: list[bytes or bytearray or memoryview]
+        """
+        if self.transport is None:
+            raise RecoverableConnectionError('connection already closed')
+        self.transport.writelines(buffers)
+        self.last_write = time.monotonic()
+
+
+class _AbstractChannel:
+    """Code common to :class:`Connection` and :class:`Channel`
+    """
+
+    def __init__(self, connection, channel_id):
+        """
+        :type connection: Connection
+        :type channel_id: int
+        """
+        self.connection = connection
+        self.channel_id = channel_id
+
+        # (allowed method types, future, reply hook) of the coroutine waiting for a reply
+        self._waiter = None
+        # synchronous requests on a channel are serialized; created on first use so that it is
+        # bound to the running event loop
+        self._rpc_lock = None
+
+    def _send_method(self, method):
+        if self.connection is None or self.connection.method_writer is None:
+            raise RecoverableConnectionError('connection already closed')
+
+        method.channel_id = self.channel_id
+        self.connection.method_writer.write_method(method)
+
+    async def _wait(self, allowed_methods, on_reply=None):
+        """Wait for a method from the server destined for this channel
+
+        :param allowed_methods: method types to wait for
+        :param on_reply: function called with the reply as soon as it is received, before any
+            following methods are handled; its return value is returned instead of the reply
+        :type allowed_methods: list[spec.method_t]
+        :type on_reply: callable or None
+        :rtype: amqpy.proto.Method
+        """
+        fut = self.connection.loop.create_future()
+        self._waiter = (allowed_methods, fut, on_reply)
+        try:
+            return await fut
+        finally:
+            self._waiter = None
+
+    async def _rpc(self, method, allowed_methods, on_reply=None):
+        """Send a method and wait for one of `allowed_methods` in reply
+
+        :type method: amqpy.proto.Method
+        :type allowed_methods: list[spec.method_t]
+        :type on_reply: callable or None
+        :rtype: amqpy.proto.Method
+        """
+        if self._rpc_lock is None:
+            self._rpc_lock = asyncio.Lock()
+        async with self._rpc_lock:
+            self._send_method(method)
+            return await self._wait(allowed_methods, on_reply)
+
+    def _resolve_waiter(self, method):
+        """Hand `method` to the waiting coroutine, if it is waiting for this method type
+
+        :return: True if the method was handed over, else False
+        :rtype: bool
+        """
+        waiter = self._waiter
+        if waiter is None or method.method_type not in waiter[0] or waiter[1].done():
+            return False
+
+        allowed_methods, fut, on_reply = waiter
+        if on_reply is not None:
+            try:
+                method = on_reply(method)
+            except Exception as exc:
+                fut.set_exception(exc)
+                return True
+        fut.set_result(method)
+        return True
+
+    def _fail_waiter(self, exc):
+        waiter = self._waiter
+        if waiter is not None and not waiter[1].done():
+            waiter[1].set_exception(exc)
+
+
+class Connection(_AbstractChannel):
+    """asyncio AMQP connection
+
+    Create an instance and call :meth:`connect()`, or use the :func:`connect()` shortcut.
+    """
+
+    def __init__(self, host='localhost', port=5672, ssl=None, connect_timeout=None,
+                 userid='guest', password='guest', login_method='AMQPLAIN', virtual_host='/',
+                 locale='en_US', channel_max=65535, frame_max=131072, heartbeat=0,
+                 client_properties=None, on_blocked=None, on_unblocked=None, loop=None):
+        """
+        :param str host: host
+        :param int port: port
+        :param ssl: :class:`ssl.SSLContext` (or True for a default context), None to disable SSL
+        :param float connect_timeout: connect timeout
+        :param str userid: username
+        :param str password: password
+        :param str login_method: login method (this is server-specific); default is for RabbitMQ
+        :param str virtual_host: virtual host
+        :param str locale: locale
+        :param int channel_max: maximum number of channels
+        :param int frame_max: maximum frame payload size in bytes
+        :param float heartbeat: heartbeat interval in seconds, 0 disables heartbeat
+        :param client_properties: dict of client properties
+        :param on_blocked: callback on connection blocked
+        :param on_unblocked: callback on connection unblocked
+        :param loop: event loop; defaults to the running event loop when connecting
+        :type connect_timeout: float or None
+        :type client_properties: dict or None
+        :type on_blocked: Callable or None
+        :type on_unblocked: Callable or None
+        :type loop: asyncio.AbstractEventLoop or None
+        """
+        self.loop = loop
+        self.channels = {}
+        super(Connection, self).__init__(self, 0)
+        self.channels[0] = self
+
+        self.protocol = None
+        self.method_writer = None
+
+        self.version_major = 0
+        self.version_minor = 0
+        self.server_properties = {}
+        self.mechanisms = []
+        self.locales = []
+
+        self.channel_max = channel_max
+        self.frame_max = frame_max
+        self.heartbeat = 0  # final heartbeat interval after negotiation
+
+        self._host = host
+        self._port = port
+        self._ssl = ssl
+        self._connect_timeout = connect_timeout
+        self._userid = userid
+        self._password = password
+        self._login_method = login_method
+        self._virtual_host = virtual_host
+        self._locale = locale
+        self._heartbeat_client = heartbeat
+        self._client_properties = client_properties
+
+        self.on_blocked = on_blocked
+        self.on_unblocked = on_unblocked
+
+        self._avail_channel_ids = None
+        self._heartbeat_handle = None
+        # methods received on channel 0 which nobody was waiting for yet
+        self._pending = deque()
+        self._closed = None  # exception the connection was closed with
+
+    async def connect(self):
+        """Connect to the server and perform the connection handshake
+        """
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+
+        self.protocol = _AMQPProtocol(self)
+        self.method_writer = MethodWriter(self.protocol, self.frame_max)
+        self._closed = None
+        self._pending.clear()
+
+        fut = self.loop.create_connection(lambda: self.protocol, self._host, self._port,
+                                          ssl=self._ssl)
+        await asyncio.wait_for(fut, self._connect_timeout)
+
+        method = await self._wait_pending([spec.Connection.Start])
+        (self.version_major, self.version_minor, self.server_properties, mechanisms,
+         locales) = unpack_args(method)
+        self.mechanisms = mechanisms.split(' ')
+        self.locales = locales.split(' ')
+
+        client_props = dict(LIBRARY_PROPERTIES, **self._client_properties or {})
+        capabilities = dict(client_props.get('capabilities') or {})
+        server_capabilities = self.server_properties.get('capabilities') or {}
+        for capability in ['consumer_cancel_notify', 'connection.blocked']:
+            if server_capabilities.get(capability):
+                capabilities[capability] = True
+        client_props['capabilities'] = capabilities
+
+        args = pack_args(spec.Connection.StartOk, client_props, self._login_method,
+                         login_responses[self._login_method](self._userid, self._password),
+                         self._locale)
+        self._send_method(Method(spec.Connection.StartOk, args))
+
+        method = await self._wait_pending([spec.Connection.Secure, spec.Connection.Tune])
+        while method.method_type == spec.Connection.Secure:
+            method = await self._wait_pending([spec.Connection.Secure, spec.Connection.Tune])
+
+        channel_max, frame_max, heartbeat_server = unpack_args(method)
+        self.channel_max = min(channel_max or self.channel_max, self.channel_max)
+        self.frame_max = min(frame_max or self.frame_max, self.frame_max)
+        self.method_writer.frame_max = self.frame_max
+        if not self._heartbeat_client:
+            self.heartbeat = 0
+        elif not heartbeat_server:
+            self.heartbeat = self._heartbeat_client
+        else:
+            self.heartbeat = min(heartbeat_server, self._heartbeat_client)
+        self._avail_channel_ids = array('H', range(self.channel_max, 0, -1))
+
+        args = pack_args(spec.Connection.TuneOk, self.channel_max, self.frame_max,
+                         int(self.heartbeat))
+        self._send_method(Method(spec.Connection.TuneOk, args))
+
+        args = pack_args(spec.Connection.Open, self._virtual_host, '', False)
+        self._send_method(Method(spec.Connection.Open, args))
+        await self._wait_pending([spec.Connection.OpenOk])
+
+        if self.heartbeat:
+            self._heartbeat_handle = self.loop.call_later(self.heartbeat / 2, self._heartbeat_tick)
+
+        return self
+
+    async def _wait_pending(self, allowed_methods):
+        """Wait for a method on channel 0, which may already have been received
+        """
+        for method in self._pending:
+            if method.method_type in allowed_methods:
+                self._pending.remove(method)
+                return method
+        return await self._wait(allowed_methods)
+
+    @property
+    def connected(self):
+        """Check if connection is connected
+
+        :rtype: bool
+        """
+        return self.protocol is not None and self.protocol.transport is not None \
+            and self._closed is None
+
+    @property
+    def server_capabilities(self):
+        return self.server_properties.get('capabilities') or {}
+
+    async def channel(self, channel_id=None, auto_decode=True):
+        """Create and open a new channel, or fetch the channel associated with `channel_id`
+
+        :param channel_id: channel ID number
+        :param auto_decode: enable auto decoding of message bodies
+        :type channel_id: int or None
+        :type auto_decode: bool
+        :rtype: Channel
+        """
+        if channel_id in self.channels:
+            return self.channels[channel_id]
+
+        self._check_open()
+        if channel_id:
+            try:
+                self._avail_channel_ids.remove(channel_id)
+            except ValueError:
+                raise AMQPConnectionError('Channel {} already open'.format(channel_id))
+        else:
+            try:
+                channel_id = self._avail_channel_ids.pop()
+            except IndexError:
+                raise ResourceError('No free channel ids, current={0}, channel_max={1}'.format(
+                    len(self.channels), self.channel_max), spec.Channel.Open)
+
+        ch = Channel(self, channel_id, auto_decode)
+        try:
+            await ch.open()
+        except BaseException:
+            # noinspection PyProtectedMember
+            ch._release()
+            raise
+        return ch
+
+    async def close(self, reply_code=0, reply_text='', method_type=method_t(0, 0)):
+        """Close connection to the server
+
+        :param int reply_code: the reply code
+        :param str reply_text: localized reply text
+        :param method_type: if close is triggered by a failing method, this is the method that
+            caused it
+        :type method_type: amqpy.spec.method_t
+        """
+        if not self.connected:
+            return
+
+        args = pack_args(spec.Connection.Close, reply_code, reply_text, method_type.class_id,
+                         method_type.method_id)
+        try:
+            await self._rpc(Method(spec.Connection.Close, args),
+                            [spec.Connection.CloseOk, spec.Connection.Close])
+        finally:
+            self._abort(RecoverableConnectionError('connection closed'))
+
+    async def __aenter__(self):
+        if not self.connected:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def send_heartbeat(self):
+        """Send a heartbeat to the server
+        """
+        self.protocol.write_frames([Frame(FrameType.HEARTBEAT).data])
+
+    def _heartbeat_tick(self):
+        """Send a heartbeat if nothing has been written recently, and close the connection if
+        nothing has been received for two heartbeat intervals
+        """
+        self._heartbeat_handle = None
+        if not self.connected:
+            return
+
+        now = time.monotonic()
+        if now - self.protocol.last_read > self.heartbeat * 2:
+            self._abort(AMQPConnectionError('missed heartbeats from server'))
+            return
+        if now - self.protocol.last_write >= self.heartbeat / 2:
+            self.send_heartbeat()
+        self._heartbeat_handle = self.loop.call_later(self.heartbeat / 2, self._heartbeat_tick)
+
+    def _check_open(self):
+        if self._closed is not None:
+            raise self._closed
+        if not self.connected:
+            raise RecoverableConnectionError('connection already closed')
+
+    def _dispatch(self, method):
+        """Deliver a received method to the channel it is destined for
+
+        :type method: amqpy.proto.Method or Exception
+        """
+        if isinstance(method, Exception):
+            channel = self.channels.get(getattr(method, 'channel_id', None) or 0)
+            if channel is None or channel is self:
+                self._abort(method)
+            else:
+                # noinspection PyProtectedMember
+                channel._fail(method)
+            return
+
+        log.debug('{:7} channel: {} {}'.format('Read:', method.channel_id, method.method_type))
+        if method.channel_id == 0:
+            self._handle_method(method)
+            return
+
+        channel = self.channels.get(method.channel_id)
+        if channel is not None:
+            # noinspection PyProtectedMember
+            channel._handle_method(method)
+        else:
+            log.warning('Received {} for unknown channel {}'.format(method.method_type,
+                                                                    method.channel_id))
+
+    def _handle_method(self, method):
+        m_type = method.method_type
+        if self._resolve_waiter(method):
+            return
+
+        if m_type == spec.Connection.Close:
+            reply_code, reply_text, class_id, method_id = unpack_args(method)
+            self._send_method(Method(spec.Connection.CloseOk))
+            self._abort(error_for_code(reply_code, reply_text, method_t(class_id, method_id),
+                                       AMQPConnectionError, 0))
+        elif m_type == spec.Connection.Blocked:
+            reason, = unpack_args(method)
+            if callable(self.on_blocked):
+                self.on_blocked(reason)
+        elif m_type == spec.Connection.Unblocked:
+            if callable(self.on_unblocked):
+                self.on_unblocked()
+        else:
+            method.detach()
+            self._pending.append(method)
+
+    def _abort(self, exc):
+        """Close the transport and fail all waiters on all channels with `exc`
+
+        :type exc: Exception
+        """
+        if self._closed is not None:
+            return
+        self._closed = exc
+
+        if self._heartbeat_handle is not None:
+            self._heartbeat_handle.cancel()
+            self._heartbeat_handle = None
+
+        self._fail_waiter(exc)
+        for channel in list(self.channels.values()):
+            if channel is not self:
+                # noinspection PyProtectedMember
+                channel._fail(exc)
+                # noinspection PyProtectedMember
+                channel._release()
+        self.channels = {0: self}
+
+        if self.protocol is not None and self.protocol.transport is not None:
+            self.protocol.transport.close()
+
+    def _connection_lost(self, exc):
+        self._abort(RecoverableConnectionError('connection lost: {}'.format(exc or 'closed')))
+
+
+class Consumer:
+    """Asynchronous iterator over the messages delivered to a consumer
+
+    Iteration ends when the consumer is cancelled. If the channel or connection is closed, the
+    exception is raised from the iterator.
+    """
+
+    def __init__(self, channel, consumer_tag, no_ack):
+        """
+        :type channel: Channel
+        :type consumer_tag: str
+        :type no_ack: bool
+        """
+        self.channel = channel
+        self.consumer_tag = consumer_tag
+        self.no_ack = no_ack
+        self._messages = deque()
+        self._waiter = None
+        self._done = False
+        self._exc = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._messages:
+            if self._exc is not None:
+                raise self._exc
+            if self._done:
+                raise StopAsyncIteration
+            self._waiter = self.channel.connection.loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._messages.popleft()
+
+    async def get(self):
+        """Wait for the next message
+
+        :rtype: amqpy.message.Message
+        :raise StopAsyncIteration: if the consumer has been cancelled and no messages are left
+        """
+        return await self.__anext__()
+
+    async def cancel(self):
+        """Cancel this consumer
+
+        Messages which were already delivered can still be read from the iterator.
+        """
+        await self.channel.basic_cancel(self.consumer_tag)
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _deliver(self, msg):
+        self._messages.append(msg)
+        self._wake()
+
+    def _end(self, exc=None):
+        self._done = True
+        if exc is not None and self._exc is None:
+            self._exc = exc
+        self._wake()
+
+
+class Channel(_AbstractChannel):
+    """asyncio AMQP channel
+
+    Channels are created with :meth:`Connection.channel()`. Methods which wait for a reply from the
+    server are coroutines. :meth:`basic_ack()` and :meth:`basic_reject()` have no reply and are
+    plain methods, so :meth:`amqpy.message.Message.ack()` works with messages received on this
+    channel.
+
+    If the server closes the channel due to an error, the exception is raised in the coroutine
+    waiting for a reply (if any), all consumers are ended with the exception, and the channel is
+    re-opened automatically, like :class:`amqpy.channel.Channel`.
+    """
+
+    def __init__(self, connection, channel_id, auto_decode=True):
+        """
+        :type connection: Connection
+        :type channel_id: int
+        :type auto_decode: bool
+        """
+        super(Channel, self).__init__(connection, channel_id)
+        connection.channels[channel_id] = self
+
+        # auto decode received messages
+        self.auto_decode = auto_decode
+
+        self.is_open = False
+        self.active = True
+
+        #: Returned messages that the server was unable to deliver
+        #:
+        #: :type: collections.deque[basic_return_t]
+        self.returned_messages = deque()
+
+        #: :type: dict[str, Consumer]
+        self.consumers = {}
+
+        self._open_fut = None
+        self._closing = False
+        self._confirm = False
+        self._publish_seq_no = 0
+        # OrderedDict[seq_no int: asyncio.Future]
+        self._unconfirmed = OrderedDict()
+
+    async def open(self):
+        """Open the channel on the server
+        """
+        self._send_open()
+        await self._open_fut
+
+    def _send_open(self):
+        self.is_open = False
+        self._open_fut = self.connection.loop.create_future()
+        args = pack_args(spec.Channel.Open, '')
+        self._send_method(Method(spec.Channel.Open, args))
+
+    async def _rpc(self, method, allowed_methods, on_reply=None):
+        await self._wait_open()
+        return await super(Channel, self)._rpc(method, allowed_methods, on_reply)
+
+    async def _wait_open(self):
+        if self.connection is None:
+            raise RecoverableConnectionError('channel already closed')
+        if not self.is_open:
+            await asyncio.shield(self._open_fut)
+
+    async def close(self, reply_code=0, reply_text='', method_type=method_t(0, 0)):
+        """Close the channel
+
+        :param int reply_code: the reply code
+        :param str reply_text: localized reply text
+        :param method_type: if close is triggered by a failing method, this is the method that
+            caused it
+        :type method_type: amqpy.spec.method_t
+        """
+        if self.connection is None or not self.connection.connected:
+            self._release()
+            return
+
+        args = pack_args(spec.Channel.Close, reply_code, reply_text, method_type.class_id,
+                         method_type.method_id)
+        self._closing = True
+        try:
+            await self._rpc(Method(spec.Channel.Close, args),
+                            [spec.Channel.CloseOk, spec.Channel.Close])
+        finally:
+            for consumer in self.consumers.values():
+                # noinspection PyProtectedMember
+                consumer._end()
+            self._fail(RecoverableConnectionError('channel closed'))
+            self._release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _release(self):
+        """Give the channel ID back to the connection
+        """
+        self.is_open = False
+        connection, self.connection = self.connection, None
+        if connection is not None and connection.channels.get(self.channel_id) is self:
+            del connection.channels[self.channel_id]
+            # noinspection PyProtectedMember
+            if connection._avail_channel_ids is not None:
+                # noinspection PyProtectedMember
+                connection._avail_channel_ids.append(self.channel_id)
+
+    def _fail(self, exc):
+        """Fail everything waiting on this channel with `exc`
+        """
+        self._fail_waiter(exc)
+        if self._open_fut is not None and not self._open_fut.done():
+            self._open_fut.set_exception(exc)
+            # the exception is also raised to the waiters, don't warn if nobody retrieves it
+            self._open_fut.exception()
+        for consumer in self.consumers.values():
+            # noinspection PyProtectedMember
+            consumer._end(exc)
+        self.consumers.clear()
+
+        unconfirmed, self._unconfirmed = self._unconfirmed, OrderedDict()
+        for fut in unconfirmed.values():
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def _handle_method(self, method):
+        m_type = method.method_type
+        content = method.content
+
+        if content and self.auto_decode:
+            # the body is decoded when the application first accesses it
+            content.defer_decode()
+
+        if m_type == spec.Basic.Deliver:
+            self._on_deliver(method)
+        elif m_type == spec.Basic.Ack or m_type == spec.Basic.Nack:
+            delivery_tag, multiple = unpack_args(method)[:2]
+            self._on_confirm(delivery_tag, multiple, m_type == spec.Basic.Ack)
+        elif m_type == spec.Channel.OpenOk:
+            self.is_open = True
+            if not self._open_fut.done():
+                self._open_fut.set_result(None)
+        elif self._resolve_waiter(method):
+            pass
+        elif m_type == spec.Channel.Close:
+            self._on_close(method)
+        elif m_type == spec.Basic.Return:
+            self.returned_messages.append(basic_return_t(*unpack_args(method) + (method.content,)))
+        elif m_type == spec.Basic.Cancel:
+            consumer_tag, = unpack_args(method)
+            consumer = self.consumers.pop(consumer_tag, None)
+            if consumer is not None:
+                # noinspection PyProtectedMember
+                consumer._end(ConsumerCancelled(consumer_tag, spec.Basic.Cancel))
+        elif m_type == spec.Channel.Flow:
+            self.active, = unpack_args(method)
+            args = pack_args(spec.Channel.FlowOk, self.active)
+            self._send_method(Method(spec.Channel.FlowOk, args))
+        else:
+            log.warning('Unexpected {} on channel {}'.format(m_type, self.channel_id))
+
+    def _on_close(self, method):
+        """Handle a channel close sent by the server: fail all waiters and re-open the channel
+        """
+        reply_code, reply_text, class_id, method_id = unpack_args(method)
+        exc = error_for_code(reply_code, reply_text, method_t(class_id, method_id), ChannelError,
+                             self.channel_id)
+
+        self._send_method(Method(spec.Channel.CloseOk))
+        self._fail(exc)
+        self._confirm = False
+        self._publish_seq_no = 0
+
+        if not self._closing:
+            # re-open the channel
+            self._send_open()
+
+    def _on_deliver(self, method):
+        msg = method.content
+        consumer_tag, delivery_tag, redelivered, exchange, routing_key = unpack_args(method)
+        msg.channel = self
+        msg.delivery_info = {
+            'consumer_tag': consumer_tag,
+            'delivery_tag': delivery_tag,
+            'redelivered': redelivered,
+            'exchange': exchange,
+            'routing_key': routing_key,
+        }
+        consumer = self.consumers.get(consumer_tag)
+        if consumer is not None:
+            # noinspection PyProtectedMember
+            consumer._deliver(msg)
+        else:
+            log.warning('No consumer for consumer tag: {}'.format(consumer_tag))
+
+    def _on_confirm(self, delivery_tag, multiple, acked):
+        unconfirmed = self._unconfirmed
+        if multiple:
+            while unconfirmed:
+                seq_no = next(iter(unconfirmed))
+                if seq_no > delivery_tag:
+                    break
+                unconfirmed.pop(seq_no).set_result(acked)
+        elif delivery_tag in unconfirmed:
+            unconfirmed.pop(delivery_tag).set_result(acked)
+
+    async def exchange_declare(self, exchange, exch_type, passive=False, durable=False,
+                               auto_delete=True, nowait=False, arguments=None):
+        """Declare exchange, create if needed
+
+        See :meth:`amqpy.channel.Channel.exchange_declare()`.
+        """
+        args = pack_args(spec.Exchange.Declare, 0, exchange, exch_type, passive, durable,
+                         auto_delete, False, nowait, arguments or {})
+        await self._call(Method(spec.Exchange.Declare, args), spec.Exchange.DeclareOk, nowait)
+
+    async def exchange_delete(self, exchange, if_unused=False, nowait=False):
+        """Delete an exchange
+
+        See :meth:`amqpy.channel.Channel.exchange_delete()`.
+        """
+        args = pack_args(spec.Exchange.Delete, 0, exchange, if_unused, nowait)
+        await self._call(Method(spec.Exchange.Delete, args), spec.Exchange.DeleteOk, nowait)
+
+    async def exchange_bind(self, dest_exch, source_exch='', routing_key='', nowait=False,
+                            arguments=None):
+        """Bind an exchange to an exchange
+
+        See :meth:`amqpy.channel.Channel.exchange_bind()`.
+        """
+        args = pack_args(spec.Exchange.Bind, 0, dest_exch, source_exch, routing_key, nowait,
+                         arguments or {})
+        await self._call(Method(spec.Exchange.Bind, args), spec.Exchange.BindOk, nowait)
+
+    async def exchange_unbind(self, dest_exch, source_exch='', routing_key='', nowait=False,
+                              arguments=None):
+        """Unbind an exchange from an exchange
+
+        See :meth:`amqpy.channel.Channel.exchange_unbind()`.
+        """
+        args = pack_args(spec.Exchange.Unbind, 0, dest_exch, source_exch, routing_key, nowait,
+                         arguments or {})
+        await self._call(Method(spec.Exchange.Unbind, args), spec.Exchange.UnbindOk, nowait)
+
+    async def queue_declare(self, queue='', passive=False, durable=False, exclusive=False,
+                            auto_delete=True, nowait=False, arguments=None):
+        """Declare queue, create if needed
+
+        See :meth:`amqpy.channel.Channel.queue_declare()`.
+
+        :return: queue_declare_ok_t(queue, message_count, consumer_count), or None if `nowait`
+        :rtype: queue_declare_ok_t or None
+        """
+        args = pack_args(spec.Queue.Declare, 0, queue, passive, durable, exclusive, auto_delete,
+                         nowait, arguments or {})
+        method = await self._call(Method(spec.Queue.Declare, args), spec.Queue.DeclareOk, nowait)
+        if method is not None:
+            return queue_declare_ok_t(*unpack_args(method))
+
+    async def queue_bind(self, queue, exchange='', routing_key='', nowait=False, arguments=None):
+        """Bind queue to an exchange
+
+        See :meth:`amqpy.channel.Channel.queue_bind()`.
+        """
+        args = pack_args(spec.Queue.Bind, 0, queue, exchange, routing_key, nowait, arguments or {})
+        await self._call(Method(spec.Queue.Bind, args), spec.Queue.BindOk, nowait)
+
+    async def queue_unbind(self, queue, exchange, routing_key='', arguments=None):
+        """Unbind a queue from an exchange
+
+        See :meth:`amqpy.channel.Channel.queue_unbind()`.
+        """
+        args = pack_args(spec.Queue.Unbind, 0, queue, exchange, routing_key, arguments or {})
+        await self._call(Method(spec.Queue.Unbind, args), spec.Queue.UnbindOk)
+
+    async def queue_purge(self, queue='', nowait=False):
+        """Purge a queue
+
+        See :meth:`amqpy.channel.Channel.queue_purge()`.
+
+        :return: number of messages purged, or None if `nowait`
+        :rtype: int or None
+        """
+        args = pack_args(spec.Queue.Purge, 0, queue, nowait)
+        method = await self._call(Method(spec.Queue.Purge, args), spec.Queue.PurgeOk, nowait)
+        if method is not None:
+            message_count, = unpack_args(method)
+            return message_count
+
+    async def queue_delete(self, queue='', if_unused=False, if_empty=False, nowait=False):
+        """Delete a queue
+
+        See :meth:`amqpy.channel.Channel.queue_delete()`.
+
+        :return: number of messages deleted, or None if `nowait`
+        :rtype: int or None
+        """
+        args = pack_args(spec.Queue.Delete, 0, queue, if_unused, if_empty, nowait)
+        method = await self._call(Method(spec.Queue.Delete, args), spec.Queue.DeleteOk, nowait)
+        if method is not None:
+            message_count, = unpack_args(method)
+            return message_count
+
+    async def basic_qos(self, prefetch_size=0, prefetch_count=0, a_global=False):
+        """Specify quality of service
+
+        See :meth:`amqpy.channel.Channel.basic_qos()`.
+        """
+        args = pack_args(spec.Basic.Qos, prefetch_size, prefetch_count, a_global)
+        await self._call(Method(spec.Basic.Qos, args), spec.Basic.QosOk)
+
+    async def basic_publish(self, msg, exchange='', routing_key='', mandatory=False,
+                            immediate=False):
+        """Publish a message
+
+        If the connection's write buffer is full, this waits for it to drain. If publisher confirms
+        are enabled with :meth:`confirm_select()`, this also waits for the server to confirm the
+        message; run several publishes concurrently to keep many confirms in flight.
+
+        :param msg: message
+        :param str exchange: exchange name, empty string means default exchange
+        :param str routing_key: routing key
+        :param bool mandatory: True: deliver to at least one queue, or return it; False: drop the
+            unroutable message
+        :param bool immediate: request immediate delivery
+        :type msg: amqpy.Message
+        :return: if publisher confirms are enabled, True if the message was acked, False if it was
+            nacked; otherwise None
+        :rtype: bool or None
+        """
+        await self._wait_open()
+        await self.connection.protocol.drain()
+
+        args = pack_args(spec.Basic.Publish, 0, exchange, routing_key, mandatory, immediate)
+        self._send_method(Method(spec.Basic.Publish, args, msg))
+
+        if self._confirm:
+            self._publish_seq_no += 1
+            fut = self.connection.loop.create_future()
+            self._unconfirmed[self._publish_seq_no] = fut
+            return await fut
+
+    async def basic_get(self, queue='', no_ack=False):
+        """Directly get a message from the `queue`
+
+        :param str queue: queue name; leave blank to refer to last declared queue for the channel
+        :param bool no_ack: if enabled, the server automatically acknowledges the message
+        :return: message, or None if no messages are available on the queue
+        :rtype: amqpy.message.Message or None
+        """
+        args = pack_args(spec.Basic.Get, 0, queue, no_ack)
+        method = await self._rpc(Method(spec.Basic.Get, args),
+                                 [spec.Basic.GetOk, spec.Basic.GetEmpty])
+        if method.method_type == spec.Basic.GetEmpty:
+            return None
+
+        msg = method.content
+        delivery_tag, redelivered, exchange, routing_key, message_count = unpack_args(method)
+        msg.channel = self
+        msg.delivery_info = {
+            'delivery_tag': delivery_tag,
+            'redelivered': redelivered,
+            'exchange': exchange,
+            'routing_key': routing_key,
+            'message_count': message_count,
+        }
+        return msg
+
+    async def basic_consume(self, queue='', consumer_tag='', no_local=False, no_ack=False,
+                            exclusive=False, arguments=None):
+        """Start a queue consumer
+
+        See :meth:`amqpy.channel.Channel.basic_consume()`.
+
+        :return: consumer, an asynchronous iterator of delivered messages
+        :rtype: Consumer
+        """
+        args = pack_args(spec.Basic.Consume, 0, queue, consumer_tag, no_local, no_ack, exclusive,
+                         False, arguments)
+
+        def on_consume_ok(method):
+            # register the consumer as soon as the reply is received, before any deliveries
+            tag, = unpack_args(method)
+            consumer = Consumer(self, tag, no_ack)
+            self.consumers[tag] = consumer
+            return consumer
+
+        return await self._rpc(Method(spec.Basic.Consume, args), [spec.Basic.ConsumeOk],
+                               on_consume_ok)
+
+    async def basic_cancel(self, consumer_tag):
+        """End a queue consumer
+
+        :param str consumer_tag: consumer tag
+        """
+        args = pack_args(spec.Basic.Cancel, consumer_tag, False)
+        await self._rpc(Method(spec.Basic.Cancel, args), [spec.Basic.CancelOk])
+        consumer = self.consumers.pop(consumer_tag, None)
+        if consumer is not None:
+            # noinspection PyProtectedMember
+            consumer._end()
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        """Acknowledge one or more messages
+
+        :param int delivery_tag: server-assigned delivery tag; 0 means "all messages received so
+            far"
+        :param bool multiple: if set, the `delivery_tag` is treated as "all messages up to and
+            including"
+        """
+        args = pack_args(spec.Basic.Ack, delivery_tag, multiple)
+        self._send_method(Method(spec.Basic.Ack, args))
+
+    def basic_reject(self, delivery_tag, requeue):
+        """Reject an incoming message
+
+        :param int delivery_tag: server-assigned channel-specific delivery tag
+        :param bool requeue: True: requeue the message; False: discard the message
+        """
+        args = pack_args(spec.Basic.Reject, delivery_tag, requeue)
+        self._send_method(Method(spec.Basic.Reject, args))
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        """Reject one or more messages (RabbitMQ extension)
+
+        :param int delivery_tag: server-assigned delivery tag; 0 means "all messages received so
+            far"
+        :param bool multiple: if set, the `delivery_tag` is treated as "all messages up to and
+            including"
+        :param bool requeue: True: requeue the messages; False: discard the messages
+        """
+        args = pack_args(spec.Basic.Nack, delivery_tag, multiple, requeue)
+        self._send_method(Method(spec.Basic.Nack, args))
+
+    async def basic_recover(self, requeue=False):
+        """Redeliver unacknowledged messages
+
+        :param bool requeue: if False, the message will be redelivered to the original recipient;
+            if True, the server will attempt to requeue the message
+        """
+        args = pack_args(spec.Basic.Recover, requeue)
+        await self._call(Method(spec.Basic.Recover, args), spec.Basic.RecoverOk)
+
+    async def confirm_select(self):
+        """Enable publisher confirms for this channel (RabbitMQ extension)
+
+        Once enabled, :meth:`basic_publish()` waits for the server to confirm each message.
+        """
+        args = pack_args(spec.Confirm.Select, False)
+        await self._call(Method(spec.Confirm.Select, args), spec.Confirm.SelectOk)
+        self._confirm = True
+
+    async def tx_select(self):
+        """Select standard transaction mode
+        """
+        await self._call(Method(spec.Tx.Select), spec.Tx.SelectOk)
+
+    async def tx_commit(self):
+        """Commit the current transaction
+        """
+        await self._call(Method(spec.Tx.Commit), spec.Tx.CommitOk)
+
+    async def tx_rollback(self):
+        """Abandon the current transaction
+        """
+        await self._call(Method(spec.Tx.Rollback), spec.Tx.RollbackOk)
+
+    async def _call(self, method, reply, nowait=False):
+        """Send a method and wait for `reply`, unless `nowait` is set
+
+        :rtype: amqpy.proto.Method or None
+        """
+        if nowait:
+            await self._wait_open()
+            self._send_method(method)
+            return None
+        return await self._rpc(method, [reply])
+
+
+async def connect(*args, **kwargs):
+    """Create a :class:`Connection` and connect to the server
+
+    Accepts the same arguments as :class:`Connection`.
+
+    :rtype: Connection
+    """
+    conn = Connection(*args, **kwargs)
+    return await conn.connect()
@@ -0,0 +1,233 @@
+"""Encoding and decoding of message bodies
+
+Message bodies are encoded according to two registries:
+
+- content types (the `content_type` property): serializers which convert objects such as dicts to
+  bytes and back, e.g. JSON
+- compressions (items of the `content_encoding` property): byte-level transformations such as gzip
+
+The `content_encoding` property is treated as a comma-separated list of the encodings which were
+applied to the body, in order, as for the HTTP `Content-Encoding` header. The first item may be a
+text charset such as `UTF-8`, which is how amqpy has always labeled `str` bodies; for example, a
+gzip-compressed `str` body is labeled `UTF-8, gzip`.
+
+The gzip, deflate and bzip2 compressions (and xz, where the :mod:`lzma` module is available) are
+registered by default. No content types are registered by default, since decoding a body which used
+to be received as `str` into an object would change what existing consumers receive. To decode JSON
+bodies::
+
+    from amqpy import body_codecs
+    body_codecs.register_content_type('application/json', body_codecs.json_encode,
+                                      body_codecs.json_decode)
+
+Other serializers, such as msgpack, can be registered the same way::
+
+    body_codecs.register_content_type('application/msgpack', msgpack.packb, msgpack.unpackb)
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import bz2
+import json
+import zlib
+import six
+
+__all__ = ['CONTENT_TYPES', 'COMPRESSIONS', 'register_content_type', 'register_compression',
+           'json_encode', 'json_decode', 'encode_body', 'decode_body']
+
+#: Registered content type codecs: `{content_type: (encode, decode)}`
+#:
+#: :type: dict[str, (Callable, Callable)]
+CONTENT_TYPES = {}
+
+#: Registered compressions: `{name: (compress, decompress)}`, with lowercase names
+#:
+#: :type: dict[str, (Callable, Callable)]
+COMPRESSIONS = {}
+
+# body types which are sent without being encoded by a content type codec
+_BINARY_TYPES = (bytes, bytearray, memoryview)
+
+
+def register_content_type(content_type, encode, decode):
+    """Register a codec for a content type
+
+    :param str content_type: MIME type, without parameters
+    :param encode: called as `encode(obj)` when publishing a body which is not `bytes` or `str`;
+        returns bytes
+    :param decode: called as `decode(data)` with the bytes-like body of a received message;
+        returns the decoded body
+    :type encode: Callable
+    :type decode: Callable
+    """
+    CONTENT_TYPES[content_type.lower()] = (encode, decode)
+
+
+def register_compression(name, compress, decompress):
+    """Register a compression which can be listed in the `content_encoding` property
+
+    :param str name: compression name, as it appears in `content_encoding`
+    :param compress: called as `compress(data)`; returns bytes
+    :param decompress: called as `decompress(data)` with bytes-like data; returns bytes
+    :type compress: Callable
+    :type decompress: Callable
+    """
+    COMPRESSIONS[name.lower()] = (compress, decompress)
+
+
+def json_encode(obj):
+    """Encode an object as compact UTF-8 JSON
+
+    :rtype: bytes
+    """
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def json_decode(data):
+    """Decode UTF-8 JSON
+
+    :param data: bytes-like JSON text
+    :type data: bytes or bytearray
+    """
+    return json.loads(bytes(data).decode('utf-8'))
+
+
+def _gzip_compress(data):
+    # `gzip.compress()` is not available in Python 2; a `wbits` of 16 + 15 selects the gzip format
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _gzip_decompress(data):
+    return zlib.decompress(bytes(data), 16 + zlib.MAX_WBITS)
+
+
+def _deflate_decompress(data):
+    return zlib.decompress(bytes(data))
+
+
+def _bz2_decompress(data):
+    return bz2.decompress(bytes(data))
+
+
+register_compression('gzip', _gzip_compress, _gzip_decompress)
+register_compression('deflate', zlib.compress, _deflate_decompress)
+register_compression('bzip2', bz2.compress, _bz2_decompress)
+
+try:
+    import lzma
+except ImportError:
+    pass
+else:
+    register_compression('xz', lzma.compress, lambda data: lzma.decompress(bytes(data)))
+
+
+def _media_type(content_type):
+    """Get the lowercase MIME type of a `content_type` property, without parameters
+
+    :type content_type: str or None
+    :rtype: str or None
+    """
+    if content_type is None:
+        return None
+    return content_type.split(';', 1)[0].strip().lower()
+
+
+def _split_encodings(content_encoding):
+    """Split a `content_encoding` property into the charset (if any) and the compressions
+
+    :return: `(charset, compressions)`
+    :rtype: (str or None, list[str])
+    """
+    if not content_encoding:
+        return None, []
+    codings = [c.strip() for c in content_encoding.split(',')]
+    if codings[0].lower() in COMPRESSIONS:
+        return None, codings
+    return codings[0], codings[1:]
+
+
+def encode_body(body, properties, compression=None, compress_threshold=0):
+    """Encode a message body for publishing
+
+    A `str` body is encoded with the charset in `content_encoding` (which is set to `UTF-8` if not
+    specified). A body which is neither `bytes` nor `str` is encoded with the codec registered for
+    its `content_type`. The result is compressed if `compression` is given and it is at least
+    `compress_threshold` bytes long, and `content_encoding` in `properties` is updated to list the
+    applied encodings.
+
+    :param body: message body
+    :param dict properties: message properties; `content_encoding` is updated in place
+    :param compression: name of a registered compression, or None
+    :param int compress_threshold: minimum size of the encoded body to compress, in bytes
+    :type body: bytes or str or object
+    :type compression: str or None
+    :return: encoded body
+    :rtype: bytes or bytearray or memoryview
+    :raise TypeError: if no codec is registered for the content type of an object body
+    """
+    encoding = properties.get('content_encoding')
+    if compression is not None and encoding:
+        # a message which was published before already lists the compression
+        codings = [c.strip() for c in encoding.split(',')]
+        if codings[-1].lower() == compression.lower():
+            encoding = ', '.join(codings[:-1]) or None
+
+    if isinstance(body, six.text_type):
+        encoding = encoding or 'UTF-8'
+        try:
+            body = body.encode(encoding.split(',')[0].strip())
+        except LookupError:
+            pass
+    elif not isinstance(body, _BINARY_TYPES):
+        content_type = properties.get('content_type')
+        codec = CONTENT_TYPES.get(_media_type(content_type))
+        if codec is None:
+            raise TypeError('No body codec registered for content type {!r}'.format(content_type))
+        body = codec[0](body)
+
+    if compression is not None and len(body) >= compress_threshold:
+        body = COMPRESSIONS[compression.lower()][0](body)
+        encoding = encoding + ', ' + compression if encoding else compression
+
+    if encoding:
+        properties['content_encoding'] = encoding
+    else:
+        properties.pop('content_encoding', None)
+    return body
+
+
+def decode_body(body, content_type=None, content_encoding=None):
+    """Decode a received message body
+
+    Compressions listed in `content_encoding` are undone, last applied first. The result is then
+    decoded with the codec registered for `content_type`, if any, or else decoded to `str` with the
+    charset in `content_encoding`, if any. A body whose charset is unknown or which is not valid in
+    its charset is returned as bytes.
+
+    :param body: received body
+    :param content_type: `content_type` property
+    :param content_encoding: `content_encoding` property
+    :type body: bytes or bytearray
+    :type content_type: str or None
+    :type content_encoding: str or None
+    :return: decoded body
+    """
+    charset, compressions = _split_encodings(content_encoding)
+    for name in reversed(compressions):
+        codec = COMPRESSIONS.get(name.lower())
+        if codec is None:
+            # an unknown encoding: leave the body as it is
+            return body
+        body = codec[1](body)
+
+    codec = CONTENT_TYPES.get(_media_type(content_type))
+    if codec is not None:
+        return codec[1](body)
+
+    if charset is not None:
+        try:
+            return body.decode(charset)
+        except (LookupError, UnicodeError):
+            pass
+    return body
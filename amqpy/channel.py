@@ -4,6 +4,9 @@ from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
 import logging
+import time
+from collections import OrderedDict
+from threading import Lock
 import six
 
 if six.PY2:
@@ -14,9 +17,9 @@ else:
 from .proto import Method
 from .concurrency import synchronized_connection
 from .abstract_channel import AbstractChannel
-from .exceptions import ChannelError, ConsumerCancelled, error_for_code
+from .exceptions import ChannelError, ConsumerCancelled, RecoverableConnectionError, error_for_code
 from .spec import basic_return_t, queue_declare_ok_t, method_t
-from .serialization import AMQPWriter
+from .method_codecs import pack_args, unpack_args
 from . import spec
 
 __all__ = ['Channel']
@@ -60,6 +63,12 @@ class Channel(AbstractChannel):
 
         super(Channel, self).__init__(connection, channel_id)
 
+        #: Metrics of this channel, or None if metrics are disabled on the connection
+        #:
+        #: :type: amqpy.metrics.ChannelMetrics or None
+        self.metrics = None if connection.metrics is None else connection.metrics.channel(
+            channel_id)
+
         # auto decode received messages
         self.auto_decode = auto_decode
 
@@ -85,6 +94,19 @@ class Channel(AbstractChannel):
         #: :type: queue.Queue
         self.returned_messages = Queue()
 
+        # publish sequence number of the last message published in publisher confirm mode
+        self._publish_seq_no = 0
+
+        # wait for each message to be confirmed in `basic_publish()` (publisher confirm mode)
+        self._confirm_blocking = True
+
+        # unconfirmed publish sequence numbers, in order, and their confirm callbacks
+        # OrderedDict[seq_no int: callable or None]
+        self._unconfirmed = OrderedDict()
+
+        # set when a message is nacked, cleared by `wait_for_confirms()`
+        self._nacked = False
+
         # consumer callbacks dict[consumer_tag str: callable]
         self.callbacks = {}
 
@@ -95,6 +117,38 @@ class Channel(AbstractChannel):
         # for delivered messages)
         self.no_ack_consumers = set()
 
+        # delivery tags of received messages which have not been acked or rejected yet, in order,
+        # and their body sizes: OrderedDict[delivery_tag int: body_size int]; guarded by
+        # `_settle_lock`, since messages may be settled by worker threads while the connection
+        # thread receives more
+        self._unsettled = OrderedDict()
+        self._settle_lock = Lock()
+
+        # ack coalescing limits `(max_count, max_bytes, max_delay)`, or None if disabled
+        self._coalescing = None
+        # acks, requeueing rejects and discarding rejects recorded by ack coalescing; guarded by
+        # `_settle_lock`
+        self._pending_acks = []
+        self._pending_rejects = []
+        self._pending_discards = []
+        self._pending_count = 0
+        self._pending_bytes = 0
+        # time by which the recorded acks and rejects must be sent
+        self._ack_deadline = None
+        # interval at which the thread draining events checks for acks and rejects recorded by
+        # other threads, if they are deferred to it, or None
+        self._drain_poll = None
+
+        # `no_ack` argument of the last `basic_get()` call
+        self._get_no_ack = False
+
+        # state restored by `_recover()` after the connection is recovered: the last declared
+        # queue, the `basic_qos()` arguments, and the `basic_consume()` arguments of each consumer
+        # dict[consumer_tag str: (queue, no_local, no_ack, exclusive, arguments)]
+        self._last_queue = ''
+        self._qos = None
+        self._consumers = {}
+
         # open the channel
         self._open()
 
@@ -109,9 +163,15 @@ class Channel(AbstractChannel):
             connection.channels.pop(channel_id, None)
             # noinspection PyProtectedMember
             connection._avail_channel_ids.append(channel_id)
+            connection._ack_deadlines.pop(channel_id, None)
         self.callbacks.clear()
         self.cancel_callbacks.clear()
         self.no_ack_consumers.clear()
+        self._consumers.clear()
+        self._take_pending()
+        self._forget_unsettled()
+        if self.metrics is not None:
+            self.metrics.reset()
 
     def _open(self):
         """Open the channel
@@ -122,10 +182,57 @@ class Channel(AbstractChannel):
         self._send_open()
 
     def _revive(self):
+        if self._unconfirmed:
+            # the server won't confirm the messages in flight anymore: nack them, so that their
+            # publishers know to publish them again
+            self._nacked = True
+            self._confirm(next(reversed(self._unconfirmed)), True, False)
         self.is_open = False
         self.mode = self.CH_MODE_NONE
+        self._publish_seq_no = 0
+        self._unconfirmed.clear()
+        if self.metrics is not None:
+            self.metrics.reset()
         self._send_open()
 
+    def _recover(self, renamed):
+        """Reopen this channel after the connection has been recovered, and restore its mode,
+        prefetch limits and consumers
+
+        Messages received before the connection was lost can no longer be acked, and are
+        forgotten. The consumers are declared again with their original consumer tags, with
+        `nowait` set, in a single write.
+
+        :param dict renamed: `{old_name: new_name}` of server-named queues which were declared
+            again
+        """
+        mode, blocking = self.mode, self._confirm_blocking
+        self.incoming_methods.clear()
+        self._take_pending()
+        self._forget_unsettled()
+        self._last_queue = renamed.get(self._last_queue, self._last_queue)
+
+        self._revive()
+        if mode == self.CH_MODE_CONFIRM:
+            self.confirm_select(blocking=blocking)
+        elif mode == self.CH_MODE_TX:
+            self.tx_select()
+        if self._qos is not None:
+            self.basic_qos(*self._qos)
+        if self._drain_poll is not None:
+            self.connection._ack_deadlines[self.channel_id] = self
+
+        methods = []
+        for consumer_tag, (queue, no_local, no_ack, exclusive, arguments) in list(
+                self._consumers.items()):
+            queue = renamed.get(queue, queue)
+            self._consumers[consumer_tag] = (queue, no_local, no_ack, exclusive, arguments)
+            args = pack_args(spec.Basic.Consume, 0, queue, consumer_tag, no_local, no_ack,
+                             exclusive, True, arguments)
+            methods.append(Method(spec.Basic.Consume, args, None, self.channel_id))
+        if methods:
+            self.connection.method_writer.write_methods(methods)
+
     @synchronized_connection()
     def close(self, reply_code=0, reply_text='', method_type=method_t(0, 0)):
         """Request a channel close
@@ -147,11 +254,9 @@ class Channel(AbstractChannel):
             if not self.is_open or self.connection is None:
                 return
 
-            args = AMQPWriter()
-            args.write_short(reply_code)
-            args.write_shortstr(reply_text)
-            args.write_short(method_type.class_id)
-            args.write_short(method_type.method_id)
+            self._send_settlements(*self._take_pending())
+            args = pack_args(spec.Channel.Close, reply_code, reply_text, method_type.class_id,
+                             method_type.method_id)
             self._send_method(Method(spec.Channel.Close, args))
             return self.wait_any([spec.Channel.Close, spec.Channel.CloseOk])
         finally:
@@ -167,11 +272,7 @@ class Channel(AbstractChannel):
 
         This method sends a "close-ok" to the server, then re-opens the channel.
         """
-        args = method.args
-        reply_code = args.read_short()
-        reply_text = args.read_shortstr()
-        class_id = args.read_short()
-        method_id = args.read_short()
+        reply_code, reply_text, class_id, method_id = unpack_args(method)
 
         self._send_method(Method(spec.Channel.CloseOk))
         self.is_open = False
@@ -207,8 +308,7 @@ class Channel(AbstractChannel):
             frames
         :type active: bool
         """
-        args = AMQPWriter()
-        args.write_bit(active)
+        args = pack_args(spec.Channel.Flow, active)
         self._send_method(Method(spec.Channel.Flow, args))
         return self.wait_any([spec.Channel.FlowOk, self._cb_flow_ok])
 
@@ -222,8 +322,7 @@ class Channel(AbstractChannel):
         should finish sending the current content, if any, and then wait until it receives a Flow
         restart method.
         """
-        args = method.args
-        self.active = args.read_bit()
+        self.active, = unpack_args(method)
         self._send_flow_ok(self.active)
 
     def _send_flow_ok(self, active):
@@ -235,8 +334,7 @@ class Channel(AbstractChannel):
             frames
         :type active: bool
         """
-        args = AMQPWriter()
-        args.write_bit(active)
+        args = pack_args(spec.Channel.FlowOk, active)
         self._send_method(Method(spec.Channel.FlowOk, args))
 
     def _cb_flow_ok(self, method):
@@ -244,16 +342,15 @@ class Channel(AbstractChannel):
 
         Confirms to the peer that a flow command was received and processed.
         """
-        args = method.args
-        return args.read_bit()
+        active, = unpack_args(method)
+        return active
 
     def _send_open(self):
         """Open a channel
 
         This method opens a channel.
         """
-        args = AMQPWriter()
-        args.write_shortstr('')  # reserved
+        args = pack_args(spec.Channel.Open, '')
         self._send_method(Method(spec.Channel.Open, args))
         return self.wait(spec.Channel.OpenOk)
 
@@ -296,20 +393,15 @@ class Channel(AbstractChannel):
         :return: None
         """
         arguments = arguments or {}
-        args = AMQPWriter()
-        args.write_short(0)  # reserved-1
-        args.write_shortstr(exchange)  # exchange name
-        args.write_shortstr(exch_type)  # exchange type
-        args.write_bit(passive)  # passive
-        args.write_bit(durable)  # durable
-        args.write_bit(auto_delete)  # auto-delete
-        args.write_bit(False)  # internal
-        args.write_bit(nowait)
-        args.write_table(arguments)
+        args = pack_args(spec.Exchange.Declare, 0, exchange, exch_type, passive, durable,
+                         auto_delete, False, nowait, arguments)
         self._send_method(Method(spec.Exchange.Declare, args))
 
         if not nowait:
-            return self.wait(spec.Exchange.DeclareOk)
+            self.wait(spec.Exchange.DeclareOk)
+        if not passive and self.connection.topology is not None:
+            self.connection.topology.declare_exchange(exchange, exch_type, durable, auto_delete,
+                                                      arguments)
 
     def _cb_exchange_declare_ok(self, method):
         """Confirms an exchange declaration
@@ -339,15 +431,13 @@ class Channel(AbstractChannel):
             set
         :return: None
         """
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(exchange)
-        args.write_bit(if_unused)
-        args.write_bit(nowait)
+        args = pack_args(spec.Exchange.Delete, 0, exchange, if_unused, nowait)
         self._send_method(Method(spec.Exchange.Delete, args))
 
         if not nowait:
-            return self.wait(spec.Exchange.DeleteOk)
+            self.wait(spec.Exchange.DeleteOk)
+        if self.connection.topology is not None:
+            self.connection.topology.delete_exchange(exchange)
 
     def _cb_exchange_delete_ok(self, method):
         """Confirm deletion of an exchange
@@ -380,17 +470,14 @@ class Channel(AbstractChannel):
         :param dict arguments: binding arguments, specific to the exchange class
         """
         arguments = {} if arguments is None else arguments
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(dest_exch)
-        args.write_shortstr(source_exch)
-        args.write_shortstr(routing_key)
-        args.write_bit(nowait)
-        args.write_table(arguments)
+        args = pack_args(spec.Exchange.Bind, 0, dest_exch, source_exch, routing_key, nowait,
+                         arguments)
         self._send_method(Method(spec.Exchange.Bind, args))
 
         if not nowait:
-            return self.wait(spec.Exchange.BindOk)
+            self.wait(spec.Exchange.BindOk)
+        if self.connection.topology is not None:
+            self.connection.topology.bind_exchange(dest_exch, source_exch, routing_key, arguments)
 
     @synchronized_connection()
     def exchange_unbind(self, dest_exch, source_exch='', routing_key='', nowait=False,
@@ -409,17 +496,14 @@ class Channel(AbstractChannel):
         :param dict arguments: binding arguments, specific to the exchange class
         """
         arguments = {} if arguments is None else arguments
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(dest_exch)
-        args.write_shortstr(source_exch)
-        args.write_shortstr(routing_key)
-        args.write_bit(nowait)
-        args.write_table(arguments)
+        args = pack_args(spec.Exchange.Unbind, 0, dest_exch, source_exch, routing_key, nowait,
+                         arguments)
         self._send_method(Method(spec.Exchange.Unbind, args))
 
         if not nowait:
-            return self.wait(spec.Exchange.UnbindOk)
+            self.wait(spec.Exchange.UnbindOk)
+        if self.connection.topology is not None:
+            self.connection.topology.unbind_exchange(dest_exch, source_exch, routing_key)
 
     def _cb_exchange_bind_ok(self, method):
         """Confirm bind successful
@@ -466,17 +550,14 @@ class Channel(AbstractChannel):
         :param dict arguments: binding arguments, specific to the exchange class
         """
         arguments = {} if arguments is None else arguments
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(queue)
-        args.write_shortstr(exchange)
-        args.write_shortstr(routing_key)
-        args.write_bit(nowait)
-        args.write_table(arguments)
+        args = pack_args(spec.Queue.Bind, 0, queue, exchange, routing_key, nowait, arguments)
         self._send_method(Method(spec.Queue.Bind, args))
 
         if not nowait:
-            return self.wait(spec.Queue.BindOk)
+            self.wait(spec.Queue.BindOk)
+        if self.connection.topology is not None:
+            self.connection.topology.bind_queue(queue or self._last_queue, exchange, routing_key,
+                                                arguments)
 
     def _cb_queue_bind_ok(self, method):
         """Confirm bind successful
@@ -502,17 +583,13 @@ class Channel(AbstractChannel):
         :param dict arguments: binding arguments, specific to the exchange class
         """
         arguments = {} if arguments is None else arguments
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(queue)
-        args.write_shortstr(exchange)
-        args.write_shortstr(routing_key)
-        # args.write_bit(nowait)
-        args.write_table(arguments)
+        args = pack_args(spec.Queue.Unbind, 0, queue, exchange, routing_key, arguments)
         self._send_method(Method(spec.Queue.Unbind, args))
 
         if not nowait:
-            return self.wait(spec.Queue.UnbindOk)
+            self.wait(spec.Queue.UnbindOk)
+        if self.connection.topology is not None:
+            self.connection.topology.unbind_queue(queue or self._last_queue, exchange, routing_key)
 
     def _cb_queue_unbind_ok(self, method):
         """Confirm unbind successful
@@ -570,19 +647,21 @@ class Channel(AbstractChannel):
         :rtype: queue_declare_ok_t or None
         """
         arguments = arguments or {}
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(queue)
-        args.write_bit(passive)
-        args.write_bit(durable)
-        args.write_bit(exclusive)
-        args.write_bit(auto_delete)
-        args.write_bit(nowait)
-        args.write_table(arguments)
+        args = pack_args(spec.Queue.Declare, 0, queue, passive, durable, exclusive, auto_delete,
+                         nowait, arguments)
         self._send_method(Method(spec.Queue.Declare, args))
 
+        result = None
         if not nowait:
-            return self.wait(spec.Queue.DeclareOk)
+            result = self.wait(spec.Queue.DeclareOk)
+        name = result.queue if result is not None else queue
+        if name:
+            # the server remembers the last declared queue on the channel
+            self._last_queue = name
+        if name and not passive and self.connection.topology is not None:
+            self.connection.topology.declare_queue(name, durable, exclusive, auto_delete, arguments,
+                                                   not queue)
+        return result
 
     def _cb_queue_declare_ok(self, method):
         """Confirm a queue declare
@@ -592,8 +671,7 @@ class Channel(AbstractChannel):
         :return: queue_declare_ok_t(queue, message_count, consumer_count), or None if `nowait`
         :rtype: queue_declare_ok_t or None
         """
-        args = method.args
-        return queue_declare_ok_t(args.read_shortstr(), args.read_long(), args.read_long())
+        return queue_declare_ok_t(*unpack_args(method))
 
     @synchronized_connection()
     def queue_delete(self, queue='', if_unused=False, if_empty=False, nowait=False):
@@ -615,16 +693,15 @@ class Channel(AbstractChannel):
         :return: number of messages deleted
         :rtype: int
         """
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(queue)
-        args.write_bit(if_unused)
-        args.write_bit(if_empty)
-        args.write_bit(nowait)
+        args = pack_args(spec.Queue.Delete, 0, queue, if_unused, if_empty, nowait)
         self._send_method(Method(spec.Queue.Delete, args))
 
+        result = None
         if not nowait:
-            return self.wait(spec.Queue.DeleteOk)
+            result = self.wait(spec.Queue.DeleteOk)
+        if self.connection.topology is not None:
+            self.connection.topology.delete_queue(queue or self._last_queue)
+        return result
 
     def _cb_queue_delete_ok(self, method):
         """Confirm deletion of a queue
@@ -638,8 +715,8 @@ class Channel(AbstractChannel):
 
                 Reports the number of messages purged.
         """
-        args = method.args
-        return args.read_long()
+        message_count, = unpack_args(method)
+        return message_count
 
     @synchronized_connection()
     def queue_purge(self, queue='', nowait=False):
@@ -659,10 +736,7 @@ class Channel(AbstractChannel):
         :return: message count (if nowait is False)
         :rtype: int or None
         """
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(queue)
-        args.write_bit(nowait)
+        args = pack_args(spec.Queue.Purge, 0, queue, nowait)
         self._send_method(Method(spec.Queue.Purge, args))
 
         if not nowait:
@@ -680,10 +754,9 @@ class Channel(AbstractChannel):
 
                 Reports the number of messages purged.
         """
-        args = method.args
-        return args.read_long()
+        message_count, = unpack_args(method)
+        return message_count
 
-    @synchronized_connection()
     def basic_ack(self, delivery_tag, multiple=False):
         """Acknowledge one or more messages
 
@@ -695,16 +768,278 @@ class Channel(AbstractChannel):
         * Set `delivery_tag` to `0` and `multiple` to `True` to acknowledge all outstanding
           messages.
         * If the `delivery_tag` is invalid, the server must raise a channel exception.
+        * If ack coalescing is enabled (see :meth:`coalesce_acks()`), a single ack is recorded and
+          sent later, together with others.
 
         :param int delivery_tag: server-assigned delivery tag; 0 means "all messages received so
             far"
         :param bool multiple: if set, the `delivery_tag` is treated as "all messages up to and
             including"
         """
-        args = AMQPWriter()
-        args.write_longlong(delivery_tag)
-        args.write_bit(multiple)
-        self._send_method(Method(spec.Basic.Ack, args))
+        if self._coalescing is not None and not multiple:
+            self._defer_settle(self._pending_acks, delivery_tag)
+        else:
+            self._send_ack(delivery_tag, multiple)
+
+    @synchronized_connection()
+    def _send_ack(self, delivery_tag, multiple):
+        # acks deferred so far are sent first, since a multiple ack would settle them anyway
+        self._send_settlements(*self._take_pending())
+        with self._settle_lock:
+            self._forget(delivery_tag, multiple)
+            self._send_method(Method(spec.Basic.Ack,
+                                     pack_args(spec.Basic.Ack, delivery_tag, multiple)))
+
+    def _forget(self, delivery_tag, multiple):
+        """Stop tracking settled delivery tags
+
+        Must be called with `_settle_lock` held.
+
+        :param int delivery_tag: settled delivery tag; 0 with `multiple` means all tags
+        :param bool multiple: if set, all tags up to and including `delivery_tag` are settled
+        """
+        if self.metrics is not None:
+            self.metrics.settled(delivery_tag, multiple)
+        unsettled = self._unsettled
+        if not multiple:
+            unsettled.pop(delivery_tag, None)
+        elif delivery_tag == 0:
+            unsettled.clear()
+        else:
+            while unsettled:
+                tag = next(iter(unsettled))
+                if tag > delivery_tag:
+                    break
+                del unsettled[tag]
+
+    def _forget_unsettled(self):
+        """Forget all unsettled deliveries, when they can no longer be settled
+        """
+        with self._settle_lock:
+            self._unsettled.clear()
+
+    def coalesce_acks(self, enable=True, max_count=100, max_bytes=None, max_delay=0.1,
+                      defer_to_drain=False):
+        """Enable or disable ack coalescing
+
+        While ack coalescing is enabled, :meth:`basic_ack()` and :meth:`basic_reject()` record
+        single acks and rejects without taking the connection lock or writing to the socket. The
+        recorded acks and rejects are sent as soon as any of the limits is reached, in a single
+        write and with as few methods as possible: acks of the oldest unsettled messages on the
+        channel are combined into one `Basic.Ack` with `multiple` set.
+
+        The `max_delay` limit is checked whenever an ack or reject is recorded, and by
+        :meth:`Connection.drain_events() <amqpy.connection.Connection.drain_events>`, which wakes up
+        in time to send acks which are due. Recorded acks and rejects are also sent before the
+        channel is closed, and when coalescing is disabled.
+
+        With `defer_to_drain`, the recorded acks and rejects are never sent by the thread which
+        records them, even when a limit is reached: they are sent by the thread draining events,
+        which checks for them every `max_delay` seconds while messages on the channel are
+        unsettled. This lets worker threads settle messages without ever taking the connection
+        lock or writing to the socket.
+
+        :param bool enable: True to enable coalescing, False to disable it and send the acks and
+            rejects recorded so far
+        :param max_count: maximum number of acks and rejects to record
+        :param max_bytes: maximum total body size of the messages to record acks and rejects for
+        :param max_delay: maximum time to hold back an ack or reject, in seconds
+        :param bool defer_to_drain: if set, only send the recorded acks and rejects from
+            :meth:`Connection.drain_events() <amqpy.connection.Connection.drain_events>`
+        :type max_count: int or None
+        :type max_bytes: int or None
+        :type max_delay: float or None
+        :raise ValueError: if `defer_to_drain` is set without `max_delay`
+        """
+        if enable:
+            if defer_to_drain and max_delay is None:
+                raise ValueError('`defer_to_drain` requires `max_delay`')
+            self._coalescing = (max_count, max_bytes, max_delay)
+            self._drain_poll = max_delay if defer_to_drain else None
+            if self.connection is not None:
+                if defer_to_drain:
+                    self.connection._ack_deadlines[self.channel_id] = self
+                elif self._ack_deadline is None:
+                    self.connection._ack_deadlines.pop(self.channel_id, None)
+        else:
+            self._coalescing = None
+            self._drain_poll = None
+            self.flush_acks()
+            if self.connection is not None:
+                self.connection._ack_deadlines.pop(self.channel_id, None)
+
+    def flush_acks(self):
+        """Send the acks and rejects recorded by ack coalescing (see :meth:`coalesce_acks()`)
+        """
+        acks, rejects, discards = self._take_pending()
+        if acks or rejects or discards:
+            self._settle_tags(acks, rejects, discards)
+
+    def _defer_settle(self, pending, delivery_tag):
+        """Record an ack or reject while ack coalescing is enabled, and send the recorded acks and
+        rejects if a limit is reached
+
+        :param list pending: `_pending_acks`, `_pending_rejects` or `_pending_discards`
+        :param int delivery_tag: delivery tag
+        """
+        max_count, max_bytes, max_delay = self._coalescing
+        now = time.monotonic()
+        with self._settle_lock:
+            pending.append(delivery_tag)
+            self._pending_count += 1
+            self._pending_bytes += self._unsettled.get(delivery_tag) or 0
+            if self._ack_deadline is None and max_delay is not None:
+                self._ack_deadline = now + max_delay
+                if self.connection is not None:
+                    self.connection._ack_deadlines[self.channel_id] = self
+            flush = ((max_count is not None and self._pending_count >= max_count) or
+                     (max_bytes is not None and self._pending_bytes >= max_bytes) or
+                     (self._ack_deadline is not None and now >= self._ack_deadline))
+            if flush and self._drain_poll is not None:
+                # due immediately, the thread draining events sends them when it next checks
+                self._ack_deadline = now
+                flush = False
+        if flush:
+            self.flush_acks()
+
+    def _take_pending(self):
+        """Take the acks and rejects recorded by ack coalescing
+
+        :return: `(acks, rejects, discards)`
+        :rtype: (list[int], list[int], list[int])
+        """
+        with self._settle_lock:
+            taken = self._pending_acks, self._pending_rejects, self._pending_discards
+            self._pending_acks, self._pending_rejects, self._pending_discards = [], [], []
+            self._pending_count = 0
+            self._pending_bytes = 0
+            if self._ack_deadline is not None:
+                self._ack_deadline = None
+                if self.connection is not None and self._drain_poll is None:
+                    self.connection._ack_deadlines.pop(self.channel_id, None)
+        return taken
+
+    @synchronized_connection()
+    def _settle_tags(self, acks, rejects=(), discards=()):
+        """Ack and reject several messages, coalescing acks and sending everything in one write
+
+        :param acks: delivery tags to ack
+        :param rejects: delivery tags to reject and requeue
+        :param discards: delivery tags to reject without requeueing
+        :type acks: list[int]
+        :type rejects: list[int]
+        :type discards: list[int]
+        """
+        self._send_settlements(acks, rejects, discards)
+
+    def _send_settlements(self, acks, rejects, discards):
+        """Send acks and rejects (see :meth:`_settle_tags()`); the connection lock must be held
+
+        The oldest unsettled messages on the channel are settled with as few methods as possible:
+        each run of consecutive messages with the same outcome is settled by a single `Basic.Ack`
+        or `Basic.Nack` (if the server supports it) with `multiple` set, which is only possible
+        because every message received before the run has been settled. The remaining messages are
+        acked and rejected individually.
+        """
+        # outcome of each message: None to ack, or the `requeue` flag to reject
+        outcomes = dict.fromkeys(acks)
+        outcomes.update(dict.fromkeys(rejects, True))
+        outcomes.update(dict.fromkeys(discards, False))
+        if not outcomes:
+            return
+        if self.connection is None:
+            raise RecoverableConnectionError('connection already closed')
+        can_nack = self.connection.server_capabilities.get('basic.nack', False)
+        if self.metrics is not None:
+            for tag in outcomes:
+                self.metrics.settled(tag)
+
+        methods = []
+
+        def settle(tags, requeue):
+            if requeue is None:
+                methods.append(Method(spec.Basic.Ack,
+                                      pack_args(spec.Basic.Ack, tags[-1], len(tags) > 1)))
+            elif len(tags) > 1 and can_nack:
+                methods.append(Method(spec.Basic.Nack,
+                                      pack_args(spec.Basic.Nack, tags[-1], True, requeue)))
+            else:
+                methods.extend(Method(spec.Basic.Reject, pack_args(spec.Basic.Reject, tag, requeue))
+                               for tag in tags)
+
+        with self._settle_lock:
+            unsettled = self._unsettled
+            run = []
+            run_outcome = None
+            while outcomes and unsettled:
+                tag = next(iter(unsettled))
+                if tag not in outcomes:
+                    break
+                del unsettled[tag]
+                outcome = outcomes.pop(tag)
+                if run and outcome is not run_outcome:
+                    settle(run, run_outcome)
+                    run = []
+                run.append(tag)
+                run_outcome = outcome
+            if run:
+                settle(run, run_outcome)
+
+            for tag in sorted(outcomes):
+                unsettled.pop(tag, None)
+                settle([tag], outcomes[tag])
+
+            for method in methods:
+                method.channel_id = self.channel_id
+            self.connection.method_writer.write_methods(methods)
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        """Reject one or more messages
+
+        This method is a RabbitMQ extension of :meth:`basic_reject()` which can reject several
+        messages at once: a set of messages up to and including a specific message. Check
+        `Connection.server_capabilities['basic.nack']` to find out if the server supports it.
+
+        * Set `delivery_tag` to `0` and `multiple` to `True` to reject all outstanding messages.
+        * If ack coalescing is enabled (see :meth:`coalesce_acks()`), a single nack is recorded
+          and sent later, together with other acks and rejects.
+
+        :param int delivery_tag: server-assigned delivery tag; 0 means "all messages received so
+            far"
+        :param bool multiple: if set, the `delivery_tag` is treated as "all messages up to and
+            including"
+        :param bool requeue: True: requeue the messages; False: discard the messages
+        """
+        if self._coalescing is not None and not multiple:
+            self._defer_settle(self._pending_rejects if requeue else self._pending_discards,
+                               delivery_tag)
+        else:
+            self._send_nack(delivery_tag, multiple, requeue)
+
+    @synchronized_connection()
+    def _send_nack(self, delivery_tag, multiple, requeue):
+        # acks and rejects deferred so far are sent first, since a multiple nack would settle them
+        self._send_settlements(*self._take_pending())
+        with self._settle_lock:
+            self._forget(delivery_tag, multiple)
+            self._send_method(Method(spec.Basic.Nack,
+                                     pack_args(spec.Basic.Nack, delivery_tag, multiple, requeue)))
+
+    def basic_reject_batch(self, delivery_tags, requeue=True):
+        """Reject several messages with as few methods as possible, in a single write
+
+        Runs of consecutive messages among the oldest unsettled messages on the channel are
+        rejected with a single `Basic.Nack` if the server supports it (see :meth:`basic_nack()`).
+        Other messages are rejected individually with `Basic.Reject`. Acks and rejects recorded by
+        ack coalescing (see :meth:`coalesce_acks()`) are sent in the same write.
+
+        :param delivery_tags: server-assigned channel-specific delivery tags
+        :param bool requeue: True: requeue the messages; False: discard the messages
+        :type delivery_tags: list[int]
+        """
+        acks, rejects, discards = self._take_pending()
+        (rejects if requeue else discards).extend(delivery_tags)
+        self._settle_tags(acks, rejects, discards)
 
     @synchronized_connection()
     def basic_cancel(self, consumer_tag, nowait=False):
@@ -724,10 +1059,8 @@ class Channel(AbstractChannel):
         """
         if self.connection is not None:
             self.no_ack_consumers.discard(consumer_tag)
-            args = AMQPWriter()
-            args.write_shortstr(consumer_tag)
-            args.write_bit(nowait)
-            self._send_method(Method(spec.Basic.Cancel, args))
+            self._send_method(Method(spec.Basic.Cancel,
+                                     pack_args(spec.Basic.Cancel, consumer_tag, nowait)))
             return self.wait(spec.Basic.CancelOk)
 
     def _cb_basic_cancel_notify(self, method):
@@ -735,8 +1068,7 @@ class Channel(AbstractChannel):
 
         Most likely the queue was deleted.
         """
-        args = method.args
-        consumer_tag = args.read_shortstr()
+        consumer_tag, = unpack_args(method)
         callback = self._on_cancel(consumer_tag)
         if callback:
             callback(consumer_tag)
@@ -760,8 +1092,7 @@ class Channel(AbstractChannel):
                     created. I.e. a client
                     MUST NOT create a consumer in one channel and then use it in another.
         """
-        args = method.args
-        consumer_tag = args.read_shortstr()
+        consumer_tag, = unpack_args(method)
         self._on_cancel(consumer_tag)
 
     def _on_cancel(self, consumer_tag):
@@ -771,6 +1102,7 @@ class Channel(AbstractChannel):
         :rtype: callable or None
         """
         self.callbacks.pop(consumer_tag, None)
+        self._consumers.pop(consumer_tag, None)
         return self.cancel_callbacks.pop(consumer_tag, None)
 
     @synchronized_connection()
@@ -807,15 +1139,8 @@ class Channel(AbstractChannel):
         :return: consumer tag
         :rtype: str
         """
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(queue)
-        args.write_shortstr(consumer_tag)
-        args.write_bit(no_local)
-        args.write_bit(no_ack)
-        args.write_bit(exclusive)
-        args.write_bit(nowait)
-        args.write_table(arguments or {})
+        args = pack_args(spec.Basic.Consume, 0, queue, consumer_tag, no_local, no_ack, exclusive,
+                         nowait, arguments)
         self._send_method(Method(spec.Basic.Consume, args))
 
         if not nowait:
@@ -829,6 +1154,8 @@ class Channel(AbstractChannel):
         if no_ack:
             self.no_ack_consumers.add(consumer_tag)
 
+        self._consumers[consumer_tag] = (queue or self._last_queue, no_local, no_ack, exclusive,
+                                         arguments)
         return consumer_tag
 
     def _cb_basic_consume_ok(self, method):
@@ -843,8 +1170,8 @@ class Channel(AbstractChannel):
 
                 Holds the consumer tag specified by the client or provided by the server.
         """
-        args = method.args
-        return args.read_shortstr()
+        consumer_tag, = unpack_args(method)
+        return consumer_tag
 
     def _cb_basic_deliver(self, method):
         """Notify the client of a consumer message
@@ -913,14 +1240,8 @@ class Channel(AbstractChannel):
 
                 Specifies the routing key name specified when the message was published.
         """
-        args = method.args
         msg = method.content
-
-        consumer_tag = args.read_shortstr()
-        delivery_tag = args.read_longlong()
-        redelivered = args.read_bit()
-        exchange = args.read_shortstr()
-        routing_key = args.read_shortstr()
+        consumer_tag, delivery_tag, redelivered, exchange, routing_key = unpack_args(method)
 
         msg.channel = self
         msg.delivery_info = {
@@ -930,6 +1251,11 @@ class Channel(AbstractChannel):
             'exchange': exchange,
             'routing_key': routing_key,
         }
+        if consumer_tag not in self.no_ack_consumers:
+            with self._settle_lock:
+                self._unsettled[delivery_tag] = method.body_size
+            if self.metrics is not None:
+                self.metrics.delivered(delivery_tag)
 
         callback = self.callbacks.get(consumer_tag)
         if callback:
@@ -948,21 +1274,101 @@ class Channel(AbstractChannel):
         :return: message, or None if no messages are available on the queue
         :rtype: amqpy.message.Message or None
         """
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(queue)
-        args.write_bit(no_ack)
-        self._send_method(Method(spec.Basic.Get, args))
+        self._get_no_ack = no_ack
+        self._send_method(Method(spec.Basic.Get, pack_args(spec.Basic.Get, 0, queue, no_ack)))
         return self.wait_any([spec.Basic.GetOk, spec.Basic.GetEmpty])
 
+    @synchronized_connection()
+    def _get_batch(self, queue, count, no_ack):
+        """Send `count` `Basic.Get` methods in one write and wait for all of the replies
+
+        :return: `(messages, empty)`: the received messages, in order, and whether the queue
+            was found to be empty
+        :rtype: (list[amqpy.message.Message], bool)
+        """
+        if self.connection is None:
+            raise RecoverableConnectionError('connection already closed')
+        self._get_no_ack = no_ack
+        args = pack_args(spec.Basic.Get, 0, queue, no_ack)
+        self.connection.method_writer.write_methods(
+            [Method(spec.Basic.Get, args, None, self.channel_id) for _ in range(count)])
+
+        messages = []
+        empty = False
+        for _ in range(count):
+            msg = self.wait_any([spec.Basic.GetOk, spec.Basic.GetEmpty])
+            if msg is None:
+                empty = True
+            else:
+                messages.append(msg)
+        return messages, empty
+
+    def drain_queue(self, queue='', max_messages=None, max_bytes=None, no_ack=False,
+                    batch_size=100):
+        """Get messages from the `queue` until it is empty or a limit is reached
+
+        This is a generator which yields messages in queue order. Rather than doing a round trip
+        for each message as :meth:`basic_get()` does, up to `batch_size` `Basic.Get` methods are
+        sent at a time, in a single write, and their replies are read together. No consumer is
+        created on the channel.
+
+        Messages are fetched a batch at a time, so messages which are fetched but not yielded
+        because the `max_bytes` limit was reached or because the generator was closed early are
+        rejected and requeued. With `no_ack`, such messages would be lost, so `max_bytes` may not
+        be combined with `no_ack`, and the generator should be iterated until it is exhausted.
+
+        Example::
+
+            for msg in ch.drain_queue('etl.input', max_messages=100000):
+                process(msg)
+                msg.ack()
+
+        :param str queue: queue name; leave blank to refer to last declared queue for the channel
+        :param max_messages: maximum number of messages to get
+        :param max_bytes: stop after getting messages with a total body size of at least this many
+            bytes
+        :param bool no_ack: if enabled, the server automatically acknowledges the messages
+        :param int batch_size: maximum number of `Basic.Get` methods to send at a time
+        :type max_messages: int or None
+        :type max_bytes: int or None
+        :rtype: Iterator[amqpy.message.Message]
+        :raise ValueError: if both `max_bytes` and `no_ack` are given
+        """
+        if max_bytes is not None and no_ack:
+            raise ValueError('`max_bytes` requires acks, so that messages fetched beyond the '
+                             'limit can be requeued')
+        count = 0
+        size = 0
+        while max_messages is None or count < max_messages:
+            n = batch_size if max_messages is None else min(batch_size, max_messages - count)
+            messages, empty = self._get_batch(queue, n, no_ack)
+            # body sizes are recorded by the unsettled tag tracker; take them before the messages
+            # are yielded and possibly acked
+            sizes = [self._unsettled.get(msg.delivery_tag) or 0 for msg in messages]
+
+            yielded = 0
+            try:
+                for msg, msg_size in zip(messages, sizes):
+                    if max_bytes is not None and size >= max_bytes:
+                        break
+                    yielded += 1
+                    yield msg
+                    count += 1
+                    size += msg_size
+            finally:
+                if yielded < len(messages) and not no_ack and self.is_open:
+                    self.basic_reject_batch([msg.delivery_tag for msg in messages[yielded:]])
+
+            if empty or (max_bytes is not None and size >= max_bytes):
+                return
+
     def _cb_basic_get_empty(self, method):
         """Indicate no messages available
 
         This method tells the client that the queue has no messages
         available for the client.
         """
-        args = method.args
-        args.read_shortstr()
+        unpack_args(method)
 
     def _cb_basic_get_ok(self, method):
         """Provide client with a message
@@ -1020,14 +1426,8 @@ class Channel(AbstractChannel):
                 messages are added to
                 the queue and removed by other clients.
         """
-        args = method.args
         msg = method.content
-
-        delivery_tag = args.read_longlong()
-        redelivered = args.read_bit()
-        exchange = args.read_shortstr()
-        routing_key = args.read_shortstr()
-        message_count = args.read_long()
+        delivery_tag, redelivered, exchange, routing_key, message_count = unpack_args(method)
 
         msg.channel = self
         msg.delivery_info = {
@@ -1037,20 +1437,27 @@ class Channel(AbstractChannel):
             'routing_key': routing_key,
             'message_count': message_count
         }
+        if not self._get_no_ack:
+            with self._settle_lock:
+                self._unsettled[delivery_tag] = method.body_size
+            if self.metrics is not None:
+                self.metrics.delivered(delivery_tag)
         return msg
 
-    def _basic_publish(self, msg, exchange='', routing_key='', mandatory=False, immediate=False):
-        args = AMQPWriter()
-        args.write_short(0)
-        args.write_shortstr(exchange)
-        args.write_shortstr(routing_key)
-        args.write_bit(mandatory)
-        args.write_bit(immediate)
-
+    def _basic_publish(self, msg, exchange='', routing_key='', mandatory=False, immediate=False,
+                       on_confirm=None):
+        args = pack_args(spec.Basic.Publish, 0, exchange, routing_key, mandatory, immediate)
         self._send_method(Method(spec.Basic.Publish, args, msg))
+        if self.mode == self.CH_MODE_CONFIRM:
+            self._publish_seq_no += 1
+            self._unconfirmed[self._publish_seq_no] = on_confirm
+            if self.metrics is not None:
+                self.metrics.published(self._publish_seq_no, time.monotonic())
+            return self._publish_seq_no
 
     @synchronized_connection()
-    def basic_publish(self, msg, exchange='', routing_key='', mandatory=False, immediate=False):
+    def basic_publish(self, msg, exchange='', routing_key='', mandatory=False, immediate=False,
+                      on_confirm=None):
         """Publish a message
 
         This method publishes a message to a specific exchange. The message will be routed to
@@ -1058,7 +1465,10 @@ class Channel(AbstractChannel):
         the transaction, if any, is committed.
 
         If publisher confirms are enabled, this method will automatically wait to receive an "ack"
-        from the server.
+        or "nack" from the server, unless confirms were enabled with
+        `confirm_select(blocking=False)`. In that case, this method returns immediately with the
+        message's publish sequence number, and the confirm is delivered to `on_confirm` when it
+        arrives. Use :meth:`wait_for_confirms()` to wait for all outstanding confirms.
 
         .. note::
 
@@ -1074,11 +1484,128 @@ class Channel(AbstractChannel):
         :param bool mandatory: True: deliver to at least one queue, or return it; False: drop the
             unroutable message
         :param bool immediate: request immediate delivery
+        :param on_confirm: callback called as `on_confirm(seq_no, acked)` when the server confirms
+            the message in publisher confirm mode; `acked` is `False` if the message was nacked
         :type msg: amqpy.Message
+        :type on_confirm: callable or None
+        :return: publish sequence number if publisher confirms are enabled, otherwise `None`
+        :rtype: int or None
+        """
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.monotonic()
+        seq_no = self._basic_publish(msg, exchange, routing_key, mandatory, immediate, on_confirm)
+        if seq_no is not None and self._confirm_blocking:
+            self._wait_confirmed(seq_no)
+        if metrics is not None:
+            metrics.publish_latency.observe(time.monotonic() - start)
+        return seq_no
+
+    def _wait_confirmed(self, seq_no, timeout=None):
+        """Wait until all messages up to and including `seq_no` have been acked or nacked
+
+        :param int seq_no: publish sequence number
+        :param timeout: maximum allowed time to wait, or `None` to wait indefinitely
+        :type timeout: float or None
+        :raise amqpy.exceptions.Timeout: if the operation times out
+        """
+        unconfirmed = self._unconfirmed
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while unconfirmed and next(iter(unconfirmed)) <= seq_no:
+            if deadline is None:
+                self.wait_any([spec.Basic.Ack, spec.Basic.Nack])
+            else:
+                self.wait_any([spec.Basic.Ack, spec.Basic.Nack],
+                              max(deadline - time.monotonic(), 0))
+
+    @synchronized_connection()
+    def wait_for_confirms(self, timeout=None):
+        """Wait until all messages published on this channel have been confirmed by the server
+
+        :param timeout: maximum allowed time to wait, or `None` to wait indefinitely
+        :type timeout: float or None
+        :return: True if all messages published since the last call were acked, False if any were
+            nacked
+        :rtype: bool
+        :raise amqpy.exceptions.Timeout: if the operation times out
         """
-        self._basic_publish(msg, exchange, routing_key, mandatory, immediate)
+        self._wait_confirmed(self._publish_seq_no, timeout)
+        nacked, self._nacked = self._nacked, False
+        return not nacked
+
+    @synchronized_connection()
+    def basic_publish_batch(self, messages, exchange='', routing_key='', mandatory=False,
+                            immediate=False, on_confirm=None):
+        """Publish several messages with a single write
+
+        This is equivalent to calling :meth:`basic_publish()` for each message, but all messages are
+        serialized into one contiguous outgoing buffer which is written to the connection at once,
+        so that locking, frame construction, and socket write overhead is paid once per batch
+        rather than once per message.
+
+        Each item in `messages` is either a :class:`Message`, which is published to `exchange`
+        with `routing_key`, or a tuple of `(msg, exchange, routing_key)` to override the defaults
+        for that message.
+
+        If publisher confirms are enabled, this method will automatically wait until all messages
+        in the batch have been confirmed by the server, unless confirms were enabled with
+        `confirm_select(blocking=False)`.
+
+        :param messages: messages to publish, in order
+        :param str exchange: default exchange name, empty string means default exchange
+        :param str routing_key: default routing key
+        :param bool mandatory: True: deliver to at least one queue, or return it; False: drop the
+            unroutable message
+        :param bool immediate: request immediate delivery
+        :param on_confirm: callback called as `on_confirm(seq_no, acked)` for each message when the
+            server confirms it in publisher confirm mode
+        :type messages: list[amqpy.Message or tuple(amqpy.Message, str, str)]
+        :type on_confirm: callable or None
+        :return: publish sequence numbers of the messages if publisher confirms are enabled,
+            otherwise `None`
+        :rtype: list[int] or None
+        """
+        if self.connection is None:
+            raise RecoverableConnectionError('connection already closed')
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.monotonic()
+
+        # the method arguments only depend on the exchange and routing key, so they only need to
+        # be encoded once for each destination in the batch
+        args_cache = {}
+        methods = []
+        for item in messages:
+            if isinstance(item, tuple):
+                msg, msg_exchange, msg_routing_key = item
+            else:
+                msg, msg_exchange, msg_routing_key = item, exchange, routing_key
+
+            key = (msg_exchange, msg_routing_key)
+            args = args_cache.get(key)
+            if args is None:
+                args = pack_args(spec.Basic.Publish, 0, msg_exchange, msg_routing_key, mandatory,
+                                 immediate)
+                args_cache[key] = args
+
+            methods.append(Method(spec.Basic.Publish, args, msg, self.channel_id))
+
+        self.connection.method_writer.write_methods(methods)
+
+        seq_nos = None
         if self.mode == self.CH_MODE_CONFIRM:
-            self.wait(spec.Basic.Ack)
+            seq_nos = list(range(self._publish_seq_no + 1, self._publish_seq_no + len(methods) + 1))
+            for seq_no in seq_nos:
+                self._unconfirmed[seq_no] = on_confirm
+                if metrics is not None:
+                    metrics.published(seq_no, start)
+            if seq_nos:
+                self._publish_seq_no = seq_nos[-1]
+                if self._confirm_blocking:
+                    self._wait_confirmed(self._publish_seq_no)
+        if metrics is not None:
+            metrics.publish_latency.observe(time.monotonic() - start)
+        return seq_nos
 
     @synchronized_connection()
     def basic_qos(self, prefetch_size=0, prefetch_count=0, a_global=False):
@@ -1113,12 +1640,10 @@ class Channel(AbstractChannel):
         :param int prefetch_count: prefetch window in messages
         :param bool a_global: apply to entire connection (default is for current channel only)
         """
-        args = AMQPWriter()
-        args.write_long(prefetch_size)
-        args.write_short(prefetch_count)
-        args.write_bit(a_global)
+        args = pack_args(spec.Basic.Qos, prefetch_size, prefetch_count, a_global)
         self._send_method(Method(spec.Basic.Qos, args))
-        return self.wait(spec.Basic.QosOk)
+        self.wait(spec.Basic.QosOk)
+        self._qos = (prefetch_size, prefetch_count, a_global)
 
     def _cb_basic_qos_ok(self, method):
         """Confirm the requested qos
@@ -1138,13 +1663,14 @@ class Channel(AbstractChannel):
 
         * The server MUST set the redelivered flag on all messages that are resent.
         * The server MUST raise a channel exception if this is called on a transacted channel.
+        * Acks and rejects recorded by ack coalescing (see :meth:`coalesce_acks()`) are sent first.
 
         :param bool requeue: if set, the server will attempt to requeue the message, potentially
             then delivering it to a different subscriber
         """
-        args = AMQPWriter()
-        args.write_bit(requeue)
-        self._send_method(Method(spec.Basic.Recover, args))
+        self._send_settlements(*self._take_pending())
+        self._forget_unsettled()
+        self._send_method(Method(spec.Basic.Recover, pack_args(spec.Basic.Recover, requeue)))
 
     @synchronized_connection()
     def basic_recover_async(self, requeue=False):
@@ -1156,20 +1682,21 @@ class Channel(AbstractChannel):
 
         * The server MUST set the redelivered flag on all messages that are resent.
         * The server MUST raise a channel exception if this is called on a transacted channel.
+        * Acks and rejects recorded by ack coalescing (see :meth:`coalesce_acks()`) are sent first.
 
         :param bool requeue: if set, the server will attempt to requeue the message, potentially
             then delivering it to a different subscriber
         """
-        args = AMQPWriter()
-        args.write_bit(requeue)
-        self._send_method(Method(spec.Basic.RecoverAsync, args))
+        self._send_settlements(*self._take_pending())
+        self._forget_unsettled()
+        self._send_method(Method(spec.Basic.RecoverAsync,
+                                 pack_args(spec.Basic.RecoverAsync, requeue)))
 
     def _cb_basic_recover_ok(self, method):
         """In 0-9-1 the deprecated recover solicits a response
         """
         pass
 
-    @synchronized_connection()
     def basic_reject(self, delivery_tag, requeue):
         """Reject an incoming message
 
@@ -1192,14 +1719,18 @@ class Channel(AbstractChannel):
           alternative consumer, and if that is not possible, to move the message to a dead-letter
           queue. The server MAY use more sophisticated tracking to hold the message on the queue and
           redeliver it to the same client at a later stage.
+        * If ack coalescing is enabled (see :meth:`coalesce_acks()`), the reject is recorded and
+          sent later, together with other acks and rejects.
 
         :param int delivery_tag: server-assigned channel-specific delivery tag
         :param bool requeue: True: requeue the message; False: discard the message
         """
-        args = AMQPWriter()
-        args.write_longlong(delivery_tag)
-        args.write_bit(requeue)
-        self._send_method(Method(spec.Basic.Reject, args))
+        if self._coalescing is not None:
+            self._defer_settle(self._pending_rejects if requeue else self._pending_discards,
+                               delivery_tag)
+        else:
+            self._settle_tags((), [delivery_tag] if requeue else (),
+                              () if requeue else [delivery_tag])
 
     def _cb_basic_return(self, method):
         """Return a failed message
@@ -1208,15 +1739,9 @@ class Channel(AbstractChannel):
         set, or an unroutable message published with the `mandatory` flag set. The reply code and
         text provide information about the reason that the message was undeliverable.
         """
-        args = method.args
-        msg = method.content
-        self.returned_messages.put(basic_return_t(
-            args.read_short(),
-            args.read_shortstr(),
-            args.read_shortstr(),
-            args.read_shortstr(),
-            msg,
-        ))
+        reply_code, reply_text, exchange, routing_key = unpack_args(method)
+        self.returned_messages.put(basic_return_t(reply_code, reply_text, exchange, routing_key,
+                                                  method.content))
 
     @synchronized_connection()
     def tx_commit(self):
@@ -1282,7 +1807,7 @@ class Channel(AbstractChannel):
         pass
 
     @synchronized_connection()
-    def confirm_select(self, nowait=False):
+    def confirm_select(self, nowait=False, blocking=True):
         """Enable publisher confirms for this channel (RabbitMQ extension)
 
         The channel must not be in transactional mode. If it is, the server raises a
@@ -1290,17 +1815,22 @@ class Channel(AbstractChannel):
         automatically reopen the channel, at which point this method can be called again
         successfully.
 
+        In blocking mode (default), :meth:`basic_publish()` waits for each message to be confirmed
+        before returning. In non-blocking mode, publishing does not wait; confirms are tracked by
+        publish sequence number and delivered to the `on_confirm` callback passed to
+        :meth:`basic_publish()` as they arrive, and :meth:`wait_for_confirms()` waits for all
+        outstanding confirms.
+
         :param bool nowait: if set, the server will not respond to the method and the client
             should not wait for a reply
+        :param bool blocking: wait for each published message to be confirmed
         :raise PreconditionFailed: if the channel is in transactional mode
         """
-        args = AMQPWriter()
-        args.write_bit(nowait)
-
-        self._send_method(Method(spec.Confirm.Select, args))
+        self._send_method(Method(spec.Confirm.Select, pack_args(spec.Confirm.Select, nowait)))
         if not nowait:
             self.wait(spec.Confirm.SelectOk)
         self.mode = self.CH_MODE_CONFIRM
+        self._confirm_blocking = blocking
 
     def _cb_confirm_select_ok(self, method):
         """With this method, the broker confirms to the client that the channel is now using
@@ -1313,9 +1843,44 @@ class Channel(AbstractChannel):
 
         This will be called when the server acknowledges a published message (RabbitMQ extension).
         """
-        # args = method.args
-        # delivery_tag = args.read_longlong()
-        # multiple = args.read_bit()
+        delivery_tag, multiple = unpack_args(method)
+        self._confirm(delivery_tag, multiple, True)
+
+    def _cb_basic_nack_recv(self, method):
+        """Callback for receiving a `spec.Basic.Nack`
+
+        This will be called when the server rejects a published message (RabbitMQ extension).
+        """
+        delivery_tag, multiple, _ = unpack_args(method)
+        self._nacked = True
+        self._confirm(delivery_tag, multiple, False)
+
+    def _confirm(self, delivery_tag, multiple, acked):
+        """Resolve unconfirmed published messages and call their confirm callbacks
+
+        :param int delivery_tag: publish sequence number being confirmed
+        :param bool multiple: if set, all messages up to and including `delivery_tag` are confirmed
+        :param bool acked: True for an ack, False for a nack
+        """
+        unconfirmed = self._unconfirmed
+        if multiple:
+            confirmed = []
+            while unconfirmed:
+                seq_no = next(iter(unconfirmed))
+                if seq_no > delivery_tag:
+                    break
+                confirmed.append((seq_no, unconfirmed.pop(seq_no)))
+        elif delivery_tag in unconfirmed:
+            confirmed = [(delivery_tag, unconfirmed.pop(delivery_tag))]
+        else:
+            return
+
+        metrics = self.metrics
+        for seq_no, callback in confirmed:
+            if metrics is not None:
+                metrics.confirmed(seq_no)
+            if callback is not None:
+                callback(seq_no, acked)
 
     METHOD_MAP = {
         spec.Channel.OpenOk: _cb_open_ok,
@@ -1341,6 +1906,7 @@ class Channel(AbstractChannel):
         spec.Basic.GetOk: _cb_basic_get_ok,
         spec.Basic.GetEmpty: _cb_basic_get_empty,
         spec.Basic.Ack: _cb_basic_ack_recv,
+        spec.Basic.Nack: _cb_basic_nack_recv,
         spec.Basic.RecoverOk: _cb_basic_recover_ok,
         spec.Confirm.SelectOk: _cb_confirm_select_ok,
         spec.Tx.SelectOk: _cb_tx_select_ok,
@@ -4,13 +4,203 @@ __metaclass__ = type
 import logging
 import time
 from functools import wraps
+from threading import Lock, current_thread
 
 from . import compat
+from .metrics import Histogram
 
 compat.patch()  # monkey-patch time.perf_counter
 
 log = logging.getLogger('amqpy')
 
+__all__ = ['synchronized', 'synchronized_connection', 'LockStats', 'LockProfiler',
+           'enable_lock_profiling', 'disable_lock_profiling', 'lock_profiler']
+
+# the active lock profiler, or None if lock profiling is disabled
+_profiler = None
+
+
+class LockStats:
+    """Lock contention statistics of a decorated function
+    """
+    __slots__ = ('name', 'lock_name', 'calls', 'contended', 'wait', 'hold', 'wait_max', 'hold_max',
+                 'threads', 'max_waiters')
+
+    def __init__(self, name, lock_name):
+        #: Qualified name of the decorated function
+        self.name = name
+        #: Name of the lock attribute
+        self.lock_name = lock_name
+        #: Number of calls
+        self.calls = 0
+        #: Number of calls which had to wait for the lock
+        self.contended = 0
+        #: Time spent waiting for the lock, in seconds, for calls which had to wait
+        #:
+        #: :type: amqpy.metrics.Histogram
+        self.wait = Histogram()
+        #: Time for which the lock was held, in seconds
+        #:
+        #: :type: amqpy.metrics.Histogram
+        self.hold = Histogram()
+        self.wait_max = 0.0
+        self.hold_max = 0.0
+        #: Names of the threads which had to wait for the lock
+        #:
+        #: :type: set[str]
+        self.threads = set()
+        #: Largest number of threads which were waiting for the lock at once
+        self.max_waiters = 0
+
+
+class LockProfiler:
+    """Collect lock contention statistics of the functions decorated with :func:`synchronized` and
+    :func:`synchronized_connection`
+
+    Use :func:`enable_lock_profiling()` to create and activate a profiler.
+    """
+
+    def __init__(self):
+        # dict[(name str, lock_name str): LockStats]
+        self._stats = {}
+        # number of threads waiting for each lock: dict[id(lock) int: int]
+        self._waiting = {}
+        self._lock = Lock()
+
+    def call(self, f, name, instance, lock, lock_name, args, kwargs):
+        """Call a decorated function with the lock held, and record the wait and hold times
+        """
+        wait_time = None
+        waiters = 0
+        if not lock.acquire(False):
+            key = id(lock)
+            with self._lock:
+                waiters = self._waiting[key] = self._waiting.get(key, 0) + 1
+            try:
+                wait_time = _wait(instance, name, lock, lock_name)
+            finally:
+                with self._lock:
+                    self._waiting[key] -= 1
+                    if not self._waiting[key]:
+                        del self._waiting[key]
+
+        start = time.perf_counter()
+        try:
+            return f(instance, *args, **kwargs)
+        finally:
+            hold_time = time.perf_counter() - start
+            lock.release()
+            self._record(name, lock_name, wait_time, hold_time, waiters)
+
+    def _record(self, name, lock_name, wait_time, hold_time, waiters):
+        with self._lock:
+            stats = self._stats.get((name, lock_name))
+            if stats is None:
+                stats = self._stats[(name, lock_name)] = LockStats(name, lock_name)
+            stats.calls += 1
+            stats.hold.observe(hold_time)
+            stats.hold_max = max(stats.hold_max, hold_time)
+            if wait_time is not None:
+                stats.contended += 1
+                stats.wait.observe(wait_time)
+                stats.wait_max = max(stats.wait_max, wait_time)
+                stats.threads.add(current_thread().name)
+                stats.max_waiters = max(stats.max_waiters, waiters)
+
+    def stats(self):
+        """Get the statistics of each decorated function which has been called, most time spent
+        waiting first
+
+        :rtype: list[LockStats]
+        """
+        with self._lock:
+            stats = list(self._stats.values())
+        return sorted(stats, key=lambda s: (-s.wait.sum, -s.hold.sum, s.name))
+
+    def reset(self):
+        """Discard the statistics collected so far
+        """
+        with self._lock:
+            self._stats.clear()
+
+    def report(self):
+        """Format the statistics as a table
+
+        :rtype: str
+        """
+        header = ('function', 'lock', 'calls', 'waited', 'threads', 'max waiters', 'wait total',
+                  'wait max', 'hold mean', 'hold max')
+        rows = [header]
+        for s in self.stats():
+            rows.append((s.name, s.lock_name, str(s.calls), str(s.contended), str(len(s.threads)),
+                         str(s.max_waiters), '{:.6f}'.format(s.wait.sum),
+                         '{:.6f}'.format(s.wait_max), '{:.6f}'.format(s.hold.sum / s.calls),
+                         '{:.6f}'.format(s.hold_max)))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = []
+        for row in rows:
+            cells = [row[0].ljust(widths[0]), row[1].ljust(widths[1])]
+            cells.extend(cell.rjust(width) for cell, width in zip(row[2:], widths[2:]))
+            lines.append('  '.join(cells).rstrip())
+        return '\n'.join(lines) + '\n'
+
+
+def enable_lock_profiling():
+    """Start recording lock contention statistics
+
+    Lock profiling adds a few microseconds to each call of a decorated function, and should only be
+    enabled while investigating contention.
+
+    :return: the active profiler; if profiling is already enabled, the existing profiler
+    :rtype: LockProfiler
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = LockProfiler()
+    return _profiler
+
+
+def disable_lock_profiling():
+    """Stop recording lock contention statistics
+
+    :return: the profiler which was active, with the statistics collected so far, or None
+    :rtype: LockProfiler or None
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def lock_profiler():
+    """Get the active lock profiler
+
+    :rtype: LockProfiler or None
+    """
+    return _profiler
+
+
+def _qualname(f):
+    return getattr(f, '__qualname__', f.__name__)
+
+
+def _wait(instance, name, lock, lock_name):
+    """Wait for a lock which is held by another thread
+
+    :return: wait time in seconds
+    :rtype: float
+    """
+    # log.debug('> Wait to acquire lock for [{}]'.format(name))
+    start_time = time.perf_counter()
+    lock.acquire()
+    tot_time = time.perf_counter() - start_time
+    if tot_time > 5:
+        # only log if waited for more than 10s to acquire lock
+        log.warn('Acquired lock for [{}] in: {:.3f}s'.format(name, tot_time))
+    metrics = getattr(instance, 'metrics', None)
+    if metrics is not None:
+        metrics.lock_waited(lock_name, tot_time)
+    return tot_time
+
 
 def synchronized(lock_name):
     """Decorator for automatically acquiring and releasing lock for method call
@@ -22,22 +212,27 @@ def synchronized(lock_name):
     Decorated methods should not be long-running operations, since the lock is held for the duration
     of the method's execution.
 
+    If the instance has a `metrics` attribute which is not None (see :mod:`amqpy.metrics`), the
+    time spent waiting for the lock is recorded when another thread holds it. While lock profiling
+    is enabled (see :func:`enable_lock_profiling()`), wait and hold times are recorded for each
+    decorated function.
+
     :param lock_name: name of :class:`threading.Lock` object
     """
 
     def decorator(f):
+        name = _qualname(f)
+
         @wraps(f)
         def wrapper(self, *args, **kwargs):
             lock = getattr(self, lock_name)
+            profiler = _profiler
+            if profiler is not None:
+                return profiler.call(f, name, self, lock, lock_name, args, kwargs)
+
             acquired = lock.acquire(False)
             if not acquired:
-                # log.debug('> Wait to acquire lock for [{}]'.format(f.__qualname__))
-                start_time = time.perf_counter()
-                lock.acquire()
-                tot_time = time.perf_counter() - start_time
-                if tot_time > 5:
-                    # only log if waited for more than 10s to acquire lock
-                    log.warn('Acquired lock for [{}] in: {:.3f}s'.format(f.__qualname__, tot_time))
+                _wait(self, name, lock, lock_name)
             try:
                 retval = f(self, *args, **kwargs)
             finally:
@@ -52,27 +247,34 @@ def synchronized(lock_name):
 def synchronized_connection():
     """Decorator for automatically acquiring and releasing a connection-level
     lock for method call
+
+    If the connection's reader thread is enabled, each channel receives its own methods, so
+    channels only need to be locked individually: the channel-level `lock` is used instead.
     """
 
     def decorator(f):
+        name = _qualname(f)
+
         @wraps(f)
         def wrapper(self, *args, **kwargs):
             if hasattr(self, 'connection'):
-                lock = self.connection.conn_lock
+                connection = self.connection
+                if connection is not self and connection.reader_thread:
+                    lock_name, lock = 'lock', self.lock
+                else:
+                    lock_name, lock = 'conn_lock', connection.conn_lock
             elif hasattr(self, 'conn_lock'):
-                lock = self.conn_lock
+                lock_name, lock = 'conn_lock', self.conn_lock
             else:
                 raise Exception('Unable to find `lock` attribute')
 
+            profiler = _profiler
+            if profiler is not None:
+                return profiler.call(f, name, self, lock, lock_name, args, kwargs)
+
             acquired = lock.acquire(False)
             if not acquired:
-                # log.debug('> Wait to acquire lock for [{}]'.format(f.__qualname__))
-                start_time = time.perf_counter()
-                lock.acquire()
-                tot_time = time.perf_counter() - start_time
-                if tot_time > 5:
-                    # only log if waited for more than 10s to acquire lock
-                    log.warn('Acquired lock for [{}] in: {:.3f}s'.format(f.__qualname__, tot_time))
+                _wait(self, name, lock, lock_name)
             try:
                 retval = f(self, *args, **kwargs)
             finally:
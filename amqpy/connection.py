@@ -4,19 +4,27 @@ from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
 import logging
+import random
 import socket
 from array import array
 import pprint
+from collections import OrderedDict
+from itertools import chain
 import six
-from threading import Event, Thread, Lock
+from threading import Thread, Lock, Condition, current_thread
+import time
 
 from . import __version__, compat
 from .proto import Method
 from .method_io import MethodReader, MethodWriter
-from .serialization import AMQPWriter
+from .method_codecs import pack_args, unpack_args
 from .abstract_channel import AbstractChannel
 from .channel import Channel
-from .exceptions import ResourceError, AMQPConnectionError, Timeout, error_for_code
+from .heartbeat import scheduler
+from .metrics import Metrics
+from .exceptions import (ResourceError, AMQPConnectionError, RecoverableConnectionError, Timeout,
+                         error_for_code)
+from .recovery import Topology, RECOVERABLE_CLOSE_CODES
 from .transport import create_transport
 from . import spec
 from .spec import method_t
@@ -49,7 +57,9 @@ class Connection(AbstractChannel):
                  channel_max=65535, frame_max=131072,
                  heartbeat=0,
                  client_properties=None,
-                 on_blocked=None, on_unblocked=None):
+                 on_blocked=None, on_unblocked=None,
+                 reader_thread=False, body_spool_threshold=None,
+                 auto_recover=False, recovery_delay=1.0, recovery_max_delay=30.0, metrics=None):
         """Create a connection to the specified host
 
         If you are using SSL, make sure the correct port number is specified (usually 5671), as the
@@ -70,15 +80,36 @@ class Connection(AbstractChannel):
         :param client_properties: dict of client properties
         :param on_blocked: callback on connection blocked
         :param on_unblocked: callback on connection unblocked
+        :param bool reader_thread: read from the socket in a dedicated background thread which
+            places incoming methods in per-channel queues; this allows channels to be used from
+            different threads in parallel
+        :param body_spool_threshold: received message bodies larger than this many bytes are
+            written to a temporary file as they arrive, and :attr:`Message.body` is the file object;
+            None to always assemble bodies in memory
+        :param bool auto_recover: record the topology declared on this connection's channels, and
+            recover the connection when it is lost (see :meth:`recover()`)
+        :param float recovery_delay: initial delay between reconnection attempts, in seconds
+        :param float recovery_max_delay: maximum delay between reconnection attempts, in seconds
+        :param metrics: collect metrics of this connection and its channels: True, or a
+            :class:`~amqpy.metrics.Metrics` instance with sinks to export to; None to disable
+        :type body_spool_threshold: int or None
         :type connect_timeout: float or None
         :type client_properties: dict or None
         :type ssl: dict or None
         :type on_blocked: Callable or None
         :type on_unblocked: Callable or None
+        :type metrics: amqpy.metrics.Metrics or bool or None
         """
         log.debug('amqpy {} Connection.__init__()'.format(__version__))
         self.conn_lock = Lock()
 
+        #: Metrics of this connection, or None if metrics are disabled
+        #:
+        #: :type: amqpy.metrics.Metrics or None
+        self.metrics = Metrics() if metrics is True else metrics or None
+        if self.metrics is not None:
+            self.metrics.bind(self)
+
         #: Map of `{channel_id: Channel}` for all active channels
         #:
         #: :type: dict[int, Channel]
@@ -123,14 +154,35 @@ class Connection(AbstractChannel):
         self._locale = locale
         self._heartbeat_client = heartbeat  # original heartbeat interval value proposed by client
         self._client_properties = client_properties
+        self._body_spool_threshold = body_spool_threshold
+        self._recovery_delay = recovery_delay
+        self._recovery_max_delay = recovery_max_delay
 
         # callbacks
         self.on_blocked = on_blocked
         self.on_unblocked = on_unblocked
 
-        # heartbeat
-        self._close_event = Event()
-        self._heartbeat_thread = None
+        #: Whether incoming methods are read by a dedicated reader thread
+        #:
+        #: :type: bool
+        self.reader_thread = reader_thread
+        self._reader_thread = None
+        # notified by the reader thread whenever a method is queued for any channel
+        self._drain_cond = Condition()
+        # ids of channels which may have methods in their queues, in the order they became ready
+        # OrderedDict[channel_id int: None]
+        self._ready_channels = OrderedDict()
+        # channels which have coalesced acks to send by a deadline: dict[channel_id int: Channel]
+        self._ack_deadlines = {}
+
+        #: Topology declared on this connection's channels, recorded for recovery if
+        #: `auto_recover` is enabled
+        #:
+        #: :type: amqpy.recovery.Topology or None
+        self.topology = Topology() if auto_recover else None
+        self._recovery_lock = Lock()
+        # set while the connection is lost and hasn't been recovered yet
+        self._lost = False
 
         self.connect()
 
@@ -145,13 +197,19 @@ class Connection(AbstractChannel):
         """
         # start the connection; this also sends the connection protocol header
         self.connection = self  # AbstractChannel.connection
+        self.incoming_methods.clear()
+        self._ready_channels.clear()
         self.transport = create_transport(self._host, self._port, self._connect_timeout,
                                           self.frame_max, self._ssl)
 
         # create global instances of `MethodReader` and `MethodWriter` which can be used by all
         # channels
-        self.method_reader = MethodReader(self.transport)
+        self.method_reader = MethodReader(self.transport, self._body_spool_threshold)
         self.method_writer = MethodWriter(self.transport, self.frame_max)
+        if self.metrics is not None:
+            self.transport.metrics = self.metrics
+            self.method_reader.metrics = self.metrics
+            self.method_writer.metrics = self.metrics
 
         # wait for server to send the 'start' method
         self.wait(spec.Connection.Start)
@@ -170,24 +228,48 @@ class Connection(AbstractChannel):
 
         self._send_open(self._virtual_host)
 
-        # set up automatic heartbeats, if requested for:
+        # set up automatic heartbeats, if requested for; the scheduler's thread is shared by all
+        # connections
         if self._heartbeat_final:
-            self._close_event.clear()
-            log.debug('Start automatic heartbeat thread')
-            thr = Thread(target=self._heartbeat_run,
-                         name='amqp-HeartBeatThread-%s' % id(self))
+            scheduler.schedule(self, self._heartbeat_final / 2)
+
+        if self.reader_thread:
+            log.debug('Start reader thread')
+            thr = Thread(target=self._reader_run, name='amqp-ReaderThread-%s' % id(self))
             thr.daemon = True
+            self._reader_thread = thr
             thr.start()
-            self._heartbeat_thread = thr
 
     @property
     def last_heartbeat_recv(self):
+        """Wall-clock time at which the last heartbeat was received
+
+        :rtype: datetime.datetime or None
+        """
         return self.transport.last_heartbeat_received
 
     @property
     def last_heartbeat_sent(self):
+        """Wall-clock time at which the last heartbeat was sent
+
+        :rtype: datetime.datetime or None
+        """
         return self.transport.last_heartbeat_sent
 
+    def stats(self):
+        """Get a snapshot of the activity of the connection's transport
+
+        The times are cheap :func:`time.monotonic` floats, which are updated for every frame; see
+        :class:`amqpy.transport.TransportStats`.
+
+        :return: transport stats, or None if the connection is closed
+        :rtype: amqpy.transport.TransportStats or None
+        """
+        transport = self.transport
+        if transport is None:
+            return None
+        return transport.stats()
+
     @property
     def connected(self):
         """Check if connection is connected
@@ -263,26 +345,214 @@ class Connection(AbstractChannel):
         :return: method
         :rtype: amqpy.proto.Method
         """
-        # check the method queue of each channel
-        for ch_id, channel in self.channels.items():
-            if channel.incoming_methods:
-                return channel.incoming_methods.pop(0)
+        if self._reader_thread is not None:
+            return self._wait_queued_any(timeout)
+
+        # check the method queues of channels which have methods queued
+        ready = self._ready_channels
+        while ready:
+            channel_id = next(iter(ready))
+            channel = self.channels.get(channel_id)
+            method = channel.incoming_methods.pop() if channel is not None else None
+            if method is None or not channel.incoming_methods:
+                del ready[channel_id]
+            if method is not None:
+                return method
 
         # do a blocking read for any incoming method
         method = self.method_reader.read_method(timeout)
         return method
 
+    def _wait_flushing_acks(self, timeout=None):
+        """Wait for any event on the connection, sending coalesced acks when they are due
+
+        See :meth:`amqpy.channel.Channel.coalesce_acks()`.
+
+        :param float timeout: timeout
+        :return: method
+        :rtype: amqpy.proto.Method
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            flush_at = None
+            for channel in list(self._ack_deadlines.values()):
+                due = channel._ack_deadline
+                if due is None and channel._drain_poll is not None and channel._unsettled:
+                    # acks and rejects may be recorded by other threads at any time
+                    due = now + channel._drain_poll
+                if due is not None and due <= now:
+                    channel.flush_acks()
+                elif due is not None and (flush_at is None or due < flush_at):
+                    flush_at = due
+
+            if flush_at is None or (deadline is not None and deadline <= flush_at):
+                return self._wait_any(None if deadline is None else max(deadline - now, 0))
+            try:
+                return self._wait_any(flush_at - now)
+            except Timeout:
+                pass
+
+    def _wait_queued_any(self, timeout=None):
+        """Wait for the reader thread to queue a method for any channel
+
+        Methods which a thread is currently waiting for on their channel are left in the queue for
+        that thread.
+
+        :param float timeout: timeout
+        :return: method
+        :rtype: amqpy.proto.Method
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ready = self._ready_channels
+        with self._drain_cond:
+            while True:
+                for channel_id in list(ready):
+                    channel = self.channels.get(channel_id)
+                    if channel is None:
+                        ready.pop(channel_id, None)
+                        continue
+                    with channel.incoming_cond:
+                        waiting_for = channel.waiting_for
+                        if None in waiting_for:
+                            # a thread is waiting for any method on this channel
+                            continue
+                        method = channel.incoming_methods.pop(None, set(chain(*waiting_for)))
+                        if not channel.incoming_methods:
+                            ready.pop(channel_id, None)
+                    if method is not None:
+                        return method
+
+                if deadline is None:
+                    self._drain_cond.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Timeout()
+                    self._drain_cond.wait(remaining)
+
+    def _notify_drain(self):
+        """Wake up threads waiting in :meth:`drain_events`
+        """
+        with self._drain_cond:
+            self._drain_cond.notify_all()
+
+    def _queue_method(self, channel, method):
+        """Place a method in a channel's queue and mark the channel as ready
+
+        If the reader thread is enabled, threads waiting on the channel or in
+        :meth:`drain_events()` are woken up.
+
+        :type channel: AbstractChannel
+        :type method: amqpy.proto.Method
+        """
+        if self._reader_thread is None:
+            channel.incoming_methods.append(method)
+            self._ready_channels[channel.channel_id] = None
+            return
+
+        with channel.incoming_cond:
+            channel.incoming_methods.append(method)
+            channel.incoming_cond.notify_all()
+        with self._drain_cond:
+            self._ready_channels[channel.channel_id] = None
+            self._drain_cond.notify_all()
+
+    def _reader_run(self):
+        """Reader thread: read methods and place them in the queues of their channels
+
+        `Connection.Close` is handled immediately, and the resulting exception is placed in the
+        queue of every channel. The thread exits after the connection is closed.
+        """
+        method_reader = self.method_reader
+        while True:
+            try:
+                method = method_reader.read_method()
+            except Exception as exc:
+                if self.transport is None:
+                    # the connection was closed by `close()`
+                    return
+                log.debug('Reader thread error: {!r}'.format(exc))
+                self._broadcast(exc)
+                return
+
+            if method.method_type == spec.Connection.Close:
+                channels = list(self.channels.values())
+                try:
+                    self._cb_close(method)
+                except Exception as exc:
+                    self._broadcast(exc, channels)
+                return
+
+            # the method stays in the queue for a while, don't keep the receive buffer alive
+            method.detach()
+            channel = self.channels.get(method.channel_id)
+            if channel is None:
+                log.debug('Discard method for closed channel {}: {}'
+                          .format(method.channel_id, method.method_type))
+                continue
+
+            self._queue_method(channel, method)
+
+            if method.method_type == spec.Connection.CloseOk:
+                return
+
+    def _broadcast(self, exc, channels=None):
+        """Place an exception in the queue of every channel
+
+        :param Exception exc: exception to be raised in all waiting threads
+        :param channels: channels, defaults to all channels of this connection
+        :type channels: list[AbstractChannel] or None
+        """
+        channels = channels or list(self.channels.values())
+        for channel in channels:
+            with channel.incoming_cond:
+                channel.incoming_methods.set_error(exc)
+                channel.incoming_cond.notify_all()
+        with self._drain_cond:
+            for channel in channels:
+                self._ready_channels[channel.channel_id] = None
+            self._drain_cond.notify_all()
+
     def drain_events(self, timeout=None):
         """Wait for an event on all channels
 
         This method should be called after creating consumers in order to
         receive delivered messages and execute consumer callbacks.
 
+        If `auto_recover` is enabled and the connection is lost, or closed by the server with one
+        of the :data:`~amqpy.recovery.RECOVERABLE_CLOSE_CODES`, the connection is recovered (see
+        :meth:`recover()`) and this method returns None. The recovery counts towards the
+        `timeout`; if the connection can't be recovered in time, :class:`Timeout` is raised, and
+        the recovery is resumed by the next call.
+
         :param timeout: maximum allowed time to wait for an event
         :type timeout: float or None
         :raise amqpy.exceptions.Timeout: if the operation times out
         """
-        method = self._wait_any(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self._lost:
+            # a previous recovery didn't finish in time
+            self._recover(timeout)
+            return None
+
+        try:
+            if self._ack_deadlines:
+                method = self._wait_flushing_acks(timeout)
+            else:
+                method = self._wait_any(timeout)
+            if method.channel_id == 0:
+                # e.g. `Connection.Close`, which raises an error
+                return self.handle_method(method)
+        except Timeout:
+            raise
+        except (socket.error, IOError, AMQPConnectionError) as exc:
+            if self.topology is None or (isinstance(exc, AMQPConnectionError) and
+                                         exc.reply_code not in RECOVERABLE_CLOSE_CODES):
+                raise
+            log.warning('Connection lost: {!r}'.format(exc))
+            self._recover(None if deadline is None else max(deadline - time.monotonic(), 0))
+            return None
 
         assert isinstance(method, Method)
         #: :type: amqpy.Channel
@@ -319,32 +589,159 @@ class Connection(AbstractChannel):
             caused it
         :type method_type: amqpy.spec.method_t
         """
+        scheduler.cancel(self)
         if not self.is_alive():
             # already closed
             log.debug('Already closed')
             return
 
-        # signal to the heartbeat thread to stop sending heartbeats
-        if self._heartbeat_final:
-            self._close_event.set()
-            self._heartbeat_thread.join()
-            self._heartbeat_thread = None
-
-        args = AMQPWriter()
-        args.write_short(reply_code)
-        args.write_shortstr(reply_text)
-        args.write_short(method_type.class_id)
-        args.write_short(method_type.method_id)
+        args = pack_args(spec.Connection.Close, reply_code, reply_text, method_type.class_id,
+                         method_type.method_id)
         self._send_method(Method(spec.Connection.Close, args))
-        return self.wait_any([spec.Connection.Close, spec.Connection.CloseOk])
-
-    def _heartbeat_run(self):
-        # `is_alive()` sends heartbeats if the connection is alive
-        while self.is_alive():
-            # `close` is set to true if the `close_event` is signalled
-            close = self._close_event.wait(self._heartbeat_final / 1.5)
-            if close:
-                break
+        try:
+            return self.wait_any([spec.Connection.Close, spec.Connection.CloseOk])
+        finally:
+            reader_thread, self._reader_thread = self._reader_thread, None
+            if reader_thread is not None and reader_thread is not current_thread():
+                reader_thread.join()
+
+    def recover(self, timeout=None):
+        """Reconnect, and restore the recorded topology, channels and consumers
+
+        This method is called automatically by :meth:`drain_events()` when the connection is lost,
+        if `auto_recover` is enabled. It may also be called after an operation such as
+        :meth:`Channel.basic_publish() <amqpy.channel.Channel.basic_publish>` fails with a
+        connection error; nothing is done if the connection is still alive.
+
+        Reconnection is attempted with exponential backoff, starting at `recovery_delay` seconds
+        and doubling up to `recovery_max_delay` seconds, with full jitter so that many clients do
+        not reconnect at the same time. Then:
+
+        1. the recorded exchanges, queues and bindings are declared again (see
+           :meth:`amqpy.recovery.Topology.replay()`)
+        2. every channel which was open is reopened with its original channel ID, so that existing
+           :class:`~amqpy.channel.Channel` objects remain valid
+        3. the mode and prefetch limits of each channel are restored, and its consumers are
+           declared again with their original consumer tags and callbacks
+
+        Messages received before the connection was lost can no longer be acked.
+
+        :param timeout: maximum time to keep trying to reconnect, or None to keep trying
+            indefinitely
+        :type timeout: float or None
+        :raise AMQPConnectionError: if `auto_recover` is not enabled
+        :raise amqpy.exceptions.Timeout: if the connection couldn't be recovered in time; calling
+            this method again resumes the recovery
+        """
+        if self.topology is None:
+            raise AMQPConnectionError('Connection recovery is not enabled')
+        if self._lost or not self.is_alive():
+            self._recover(timeout)
+
+    def _recover(self, timeout=None):
+        """Recover the connection (see :meth:`recover()`)
+
+        :param timeout: maximum time to keep trying to reconnect, or None to keep trying
+            indefinitely
+        :type timeout: float or None
+        :raise amqpy.exceptions.Timeout: if the connection couldn't be recovered in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._recovery_lock.acquire(False):
+            # another thread is recovering the connection; wait for it to finish
+            with self._recovery_lock:
+                return
+
+        try:
+            # the channels stay in `self.channels` until the connection is reestablished, so that
+            # a recovery which timed out can be resumed
+            channels = [ch for ch in self.channels.values() if ch is not self and ch.is_open]
+            self._lost = True
+            self._shutdown()
+
+            attempt = 0
+            while True:
+                try:
+                    self.connect()
+                    break
+                except (socket.error, IOError, RecoverableConnectionError) as exc:
+                    delay = random.uniform(0, min(self._recovery_max_delay,
+                                                  self._recovery_delay * 2 ** attempt))
+                    attempt += 1
+                    self._shutdown()
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            log.warning('Reconnection attempt {} failed ({!r}), giving up for now'
+                                        .format(attempt, exc))
+                            raise Timeout()
+                        delay = min(delay, remaining)
+                    log.warning('Reconnection attempt {} failed ({!r}), retrying in {:.2f}s'
+                                .format(attempt, exc, delay))
+                    time.sleep(delay)
+
+            # reserve the IDs of the channels being recovered before opening any other channel
+            self.channels = {0: self}
+            self._avail_channel_ids = array(self._avail_channel_ids.typecode,
+                                            range(self.channel_max, 0, -1))
+            self._ack_deadlines.clear()
+            for channel in channels:
+                self._claim_channel_id(channel.channel_id)
+                self.channels[channel.channel_id] = channel
+
+            replay_channel = Channel(self)
+            try:
+                renamed = self.topology.replay(replay_channel)
+            finally:
+                replay_channel.close()
+
+            for channel in channels:
+                channel._recover(renamed)
+            self._lost = False
+            log.info('Recovered connection with {} channels'.format(len(channels)))
+        finally:
+            self._recovery_lock.release()
+
+    def _shutdown(self):
+        """Close the transport of a lost connection and stop its background threads, without a
+        close handshake
+        """
+        scheduler.cancel(self)
+        transport, self.transport = self.transport, None
+        if transport is not None:
+            try:
+                transport.close()
+            except (socket.error, IOError):
+                pass
+
+        reader_thread, self._reader_thread = self._reader_thread, None
+        if reader_thread is not None and reader_thread is not current_thread():
+            reader_thread.join()
+
+    def _heartbeat_tick(self):
+        """Send a heartbeat if nothing has been written recently, and shut the connection down if
+        nothing has been received for two heartbeat intervals
+
+        This method is called by the heartbeat scheduler every half heartbeat interval. Shutting
+        the connection down makes threads waiting for methods fail with a connection error (or,
+        if `auto_recover` is enabled, makes :meth:`drain_events()` recover the connection).
+
+        :return: False if the connection is no longer alive, which stops the ticks
+        :rtype: bool
+        """
+        transport = self.transport
+        if transport is None or not transport.connected:
+            return False
+
+        if transport.heartbeat_expired(self._heartbeat_final * 2):
+            log.warning('Missed heartbeats from server, shutting down connection')
+            transport.abort()
+            return False
+        try:
+            transport.send_heartbeat_if_idle(self._heartbeat_final / 2)
+        except socket.error:
+            return False
+        return True
 
     def _close(self):
         try:
@@ -391,14 +788,18 @@ class Connection(AbstractChannel):
         method, i.e. an exception. When a close is due to an exception, the sender provides the
         class and method id of the method which caused the exception.
         """
-        args = method.args
-        reply_code = args.read_short()  # the AMQP reply code
-        reply_text = args.read_shortstr()  # the localized reply text
-        class_id = args.read_short()  # class_id of method
-        method_id = args.read_short()  # method_id of method
+        reply_code, reply_text, class_id, method_id = unpack_args(method)
 
-        self._send_close_ok()  # send a close-ok to the server, to confirm that we've
-        # acknowledged the close request
+        if self.topology is None or reply_code not in RECOVERABLE_CLOSE_CODES:
+            self._send_close_ok()  # send a close-ok to the server, to confirm that we've
+            # acknowledged the close request
+        else:
+            # keep the channels and their consumers, so that `recover()` can restore them
+            try:
+                self._send_method(Method(spec.Connection.CloseOk))
+            except socket.error:
+                pass
+            self._shutdown()
 
         method_type = method_t(class_id, method_id)
         raise error_for_code(reply_code, reply_text, method_type, AMQPConnectionError,
@@ -407,7 +808,7 @@ class Connection(AbstractChannel):
     def _cb_blocked(self, method):
         """RabbitMQ Extension
         """
-        reason = method.args.read_shortstr()
+        reason, = unpack_args(method)
         if callable(self.on_blocked):
             # noinspection PyCallingNonCallable
             return self.on_blocked(reason)
@@ -449,10 +850,7 @@ class Connection(AbstractChannel):
         :type virtual_host: str
         :type capabilities: str
         """
-        args = AMQPWriter()
-        args.write_shortstr(virtual_host)
-        args.write_shortstr(capabilities)
-        args.write_bit(False)
+        args = pack_args(spec.Connection.Open, virtual_host, capabilities, False)
         self._send_method(Method(spec.Connection.Open, args))
         return self.wait(spec.Connection.OpenOk)
 
@@ -477,7 +875,7 @@ class Connection(AbstractChannel):
                 Challenge information, a block of opaque binary data passed to the security
                 mechanism.
         """
-        challenge = method.args.read_longstr()
+        challenge, = unpack_args(method)
         assert challenge
 
     def _send_secure_ok(self, response):
@@ -492,8 +890,7 @@ class Connection(AbstractChannel):
                 A block of opaque data passed to the security mechanism. The contents of this data
                 are defined by the SASL security mechanism.
         """
-        args = AMQPWriter()
-        args.write_longstr(response)
+        args = pack_args(spec.Connection.SecureOk, response)
         self._send_method(Method(spec.Connection.SecureOk, args))
 
     def _cb_start(self, method):
@@ -532,12 +929,10 @@ class Connection(AbstractChannel):
                 RULE:
                     All servers MUST support at least the en_US locale.
         """
-        args = method.args
-        self.version_major = args.read_octet()
-        self.version_minor = args.read_octet()
-        self.server_properties = args.read_table()
-        self.mechanisms = args.read_longstr().split(' ')
-        self.locales = args.read_longstr().split(' ')
+        (self.version_major, self.version_minor, self.server_properties, mechanisms,
+         locales) = unpack_args(method)
+        self.mechanisms = mechanisms.split(' ')
+        self.locales = locales.split(' ')
 
         properties = pprint.pformat(self.server_properties)
         log.debug('Start from server')
@@ -587,11 +982,7 @@ class Connection(AbstractChannel):
             if 'capabilities' not in client_properties:
                 client_properties['capabilities'] = {}
             client_properties['capabilities']['connection.blocked'] = True
-        args = AMQPWriter()
-        args.write_table(client_properties)
-        args.write_shortstr(mechanism)
-        args.write_longstr(response)
-        args.write_shortstr(locale)
+        args = pack_args(spec.Connection.StartOk, client_properties, mechanism, response, locale)
         self._send_method(Method(spec.Connection.StartOk, args))
 
     def _cb_tune(self, method):
@@ -626,15 +1017,15 @@ class Connection(AbstractChannel):
                 means the server does
                 not want a heartbeat.
         """
-        args = method.args
+        channel_max, frame_max, heartbeat = unpack_args(method)
         client_heartbeat = self._heartbeat_client or 0
         # maximum number of channels that the server supports
-        self.channel_max = min(args.read_short(), self.channel_max)
+        self.channel_max = min(channel_max, self.channel_max)
         # largest frame size the server proposes for the connection
-        self.frame_max = min(args.read_long(), self.frame_max)
+        self.frame_max = min(frame_max, self.frame_max)
         self.method_writer.frame_max = self.frame_max
         # heartbeat interval proposed by server
-        self._heartbeat_server = args.read_short() or 0
+        self._heartbeat_server = heartbeat or 0
 
         # negotiate the heartbeat interval to the smaller of the specified values
         if self._heartbeat_server == 0 or client_heartbeat == 0:
@@ -682,10 +1073,7 @@ class Connection(AbstractChannel):
                 means the client does not
                 want a heartbeat.
         """
-        args = AMQPWriter()
-        args.write_short(channel_max)
-        args.write_long(frame_max)
-        args.write_short(heartbeat or 0)
+        args = pack_args(spec.Connection.TuneOk, channel_max, frame_max, heartbeat or 0)
         self._send_method(Method(spec.Connection.TuneOk, args))
         self._wait_tune_ok = False
 
@@ -1,7 +1,12 @@
 from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
+import logging
 from abc import ABCMeta, abstractmethod
+from functools import partial
+from threading import Lock
+
+log = logging.getLogger('amqpy')
 
 
 class AbstractConsumer:
@@ -23,10 +28,29 @@ class AbstractConsumer:
         c1.declare()
 
         conn.drain_events()
+
+    If an `executor` is given, such as a :class:`concurrent.futures.ThreadPoolExecutor`, messages
+    are handed to it and :meth:`run` is called on its worker threads, so that a slow consumer does
+    not hold up the thread which drains events for the whole connection. In this mode :meth:`run`
+    must not ack or reject the message: the consumer acks each message after :meth:`run` returns,
+    or rejects it if :meth:`run` raises (see :attr:`requeue_failed`). The acks and rejects are
+    recorded with the channel's ack coalescing (see
+    :meth:`~amqpy.channel.Channel.coalesce_acks()`), and sent by the thread which drains events in
+    a single write, with a single `Basic.Ack` covering all contiguous delivery tags where possible;
+    the worker threads never write to the socket. Since the channel is shared with the worker
+    threads, only executors which run tasks in the same process are supported.
     """
 
+    #: Requeue messages for which :meth:`run` raised an exception (executor mode only); if False,
+    #: they are discarded or dead-lettered
+    requeue_failed = True
+
+    #: Maximum time to hold back the acks and rejects of processed messages, in seconds (executor
+    #: mode only)
+    ack_delay = 0.05
+
     def __init__(self, channel, queue, consumer_tag='', no_local=False,
-                 no_ack=False, exclusive=False):
+                 no_ack=False, exclusive=False, executor=None, prefetch_count=None):
         """
         :param channel: channel
         :type channel: amqpy.channel.Channel
@@ -36,17 +60,37 @@ class AbstractConsumer:
         :param bool no_local: if True: do not deliver own messages
         :param bool no_ack: server will not expect an ack for each message
         :param bool exclusive: request exclusive access
+        :param executor: executor to call :meth:`run` on, or None to call it on the thread which
+            drains events
+        :param prefetch_count: prefetch limit to set on the channel when an executor is used;
+            defaults to twice the number of workers of a :mod:`concurrent.futures` executor, read
+            from its `_max_workers` attribute, and required for other executors
+        :type executor: concurrent.futures.Executor or None
+        :type prefetch_count: int or None
+        :raise ValueError: if `prefetch_count` is required but not given
         """
+        if executor is not None and prefetch_count is None:
+            max_workers = getattr(executor, '_max_workers', None)
+            if max_workers is None:
+                raise ValueError('`prefetch_count` is required for executors without a '
+                                 '`_max_workers` attribute')
+            prefetch_count = 2 * max_workers
+
         self.channel = channel
         self.queue = queue
         self.consumer_tag = consumer_tag
         self.no_local = no_local
         self.no_ack = no_ack
         self.exclusive = exclusive
+        self.executor = executor
+        self.prefetch_count = prefetch_count
 
         #: Number of messages consumed (incremented automatically)
         self.consume_count = 0
 
+        # guards `consume_count`, which is incremented by the executor's worker threads
+        self._count_lock = Lock()
+
     def declare(self):
         """Declare the consumer
 
@@ -56,7 +100,17 @@ class AbstractConsumer:
         After the queue consumer is created, :attr:`self.consumer_tag` is
         set to the server-assigned consumer tag if a tag was not specified
         initially.
+
+        If an executor is used, the channel's prefetch limit is set first, and ack coalescing is
+        enabled on the channel, with the acks and rejects deferred to the thread which drains
+        events.
         """
+        if self.executor is not None:
+            self.channel.basic_qos(0, self.prefetch_count, False)
+            if not self.no_ack:
+                # settle before the server may hold back messages for the prefetch limit
+                self.channel.coalesce_acks(max_count=max(self.prefetch_count // 2, 1),
+                                           max_delay=self.ack_delay, defer_to_drain=True)
         self.consumer_tag = self.channel.basic_consume(
             self.queue, self.consumer_tag, self.no_local, self.no_ack, self.exclusive,
             callback=self.start, on_cancel=self.cancel_cb)
@@ -89,5 +143,36 @@ class AbstractConsumer:
         pass
 
     def start(self, msg):
-        self.run(msg)
-        self.consume_count += 1
+        if self.executor is None:
+            self.run(msg)
+            self.consume_count += 1
+            return
+
+        future = self.executor.submit(self.run, msg)
+        future.add_done_callback(partial(self._done, msg))
+
+    def _done(self, msg, future):
+        """Record the outcome of processing a message on the executor
+        """
+        error = future.exception()
+        if error is not None:
+            log.error('Consumer {} failed to process message: {!r}'.format(self.consumer_tag,
+                                                                          error))
+
+        with self._count_lock:
+            self.consume_count += 1
+        if not self.no_ack:
+            # recorded by ack coalescing, and sent by the thread which drains events
+            if error is None:
+                msg.ack()
+            else:
+                msg.reject(self.requeue_failed)
+
+    def flush(self):
+        """Send the acks and rejects of the messages processed by the executor so far
+
+        This is done automatically by
+        :meth:`Connection.drain_events() <amqpy.connection.Connection.drain_events>`, and must be
+        called from the thread which drains events.
+        """
+        self.channel.flush_acks()
@@ -0,0 +1,125 @@
+"""Heartbeat scheduling
+
+Connections which negotiate a heartbeat interval share a single daemon thread, the
+:data:`scheduler`, instead of running a thread each. Every half heartbeat interval, the scheduler
+calls the connection's `_heartbeat_tick()` method, which sends a heartbeat only if no other frame
+was written during that time, and shuts the connection down if nothing was received from the
+server for two heartbeat intervals.
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import heapq
+import logging
+import time
+import weakref
+from itertools import count
+from threading import Condition, Thread
+
+from . import compat
+
+compat.patch()  # monkey-patch time.monotonic
+
+log = logging.getLogger('amqpy')
+
+__all__ = ['HeartbeatScheduler', 'scheduler']
+
+
+class HeartbeatScheduler:
+    """Run the periodic heartbeat ticks of many connections on one thread
+
+    The thread is started when the first connection is scheduled, and exits when no connections
+    are left. Scheduled connections are referenced weakly, so a connection which is dropped without
+    being closed is not kept alive by the scheduler.
+    """
+
+    def __init__(self):
+        self._cond = Condition()
+        # scheduled ticks: heap of `[due, seq, ref, period]`, where `ref` is a weak reference to the
+        # connection, or None if the tick was cancelled
+        self._heap = []
+        # the entries of scheduled connections: WeakKeyDictionary[connection: entry list]
+        self._entries = weakref.WeakKeyDictionary()
+        self._seq = count()
+        self._thread = None
+
+    def schedule(self, connection, period):
+        """Call `connection._heartbeat_tick()` every `period` seconds
+
+        The ticks continue until :meth:`cancel()` is called or the tick returns False. Scheduling a
+        connection again replaces its previous schedule.
+
+        :param connection: object with a `_heartbeat_tick()` method
+        :param float period: time between ticks, in seconds
+        :type connection: amqpy.connection.Connection
+        """
+        with self._cond:
+            self._cancel(connection)
+            entry = [time.monotonic() + period, next(self._seq), weakref.ref(connection), period]
+            self._entries[connection] = entry
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                thr = Thread(target=self._run, name='amqp-HeartbeatScheduler')
+                thr.daemon = True
+                self._thread = thr
+                thr.start()
+            self._cond.notify()
+
+    def cancel(self, connection):
+        """Stop calling the heartbeat tick of `connection`
+
+        :type connection: amqpy.connection.Connection
+        """
+        with self._cond:
+            self._cancel(connection)
+
+    def _cancel(self, connection):
+        """Must be called with `_cond` held
+        """
+        entry = self._entries.pop(connection, None)
+        if entry is not None:
+            # the entry is dropped when it reaches the top of the heap
+            entry[2] = None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    while self._heap and self._heap[0][2] is None:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._thread = None
+                        return
+                    delay = self._heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+                entry = heapq.heappop(self._heap)
+                connection = entry[2]()
+                if connection is None:
+                    continue
+
+            # the tick runs without `_cond` held, so that it can schedule or cancel connections
+            try:
+                keep = connection._heartbeat_tick()
+            except Exception as exc:
+                log.exception('Heartbeat tick failed: {!r}'.format(exc))
+                keep = False
+
+            with self._cond:
+                if entry[2] is None:
+                    # cancelled or rescheduled during the tick
+                    continue
+                if keep:
+                    # don't fire a burst of ticks to catch up after a delay
+                    entry[0] = max(entry[0] + entry[3], time.monotonic())
+                    heapq.heappush(self._heap, entry)
+                else:
+                    self._cancel(connection)
+            del connection
+
+
+#: The scheduler which is shared by all connections
+#:
+#: :type: HeartbeatScheduler
+scheduler = HeartbeatScheduler()
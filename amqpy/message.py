@@ -3,22 +3,44 @@
 from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
+import struct
 import six
-from . import spec
+from . import spec, body_codecs
+from .exceptions import FrameSyntaxError
 from amqpy.serialization import AMQPReader, AMQPWriter
 import logging
 
 log = logging.getLogger('amqpy')
 
-__all__ = ['Message']
+__all__ = ['Message', 'MessageTemplate']
+
+# property types which can be used in :attr:`GenericContent.PROPERTIES`
+_PROPERTY_TYPES = ['octet', 'short', 'long', 'longlong', 'shortstr', 'longstr', 'table',
+                   'timestamp']
+
+# unbound reader and writer methods of each property type, to avoid looking up `'read_' + type`
+# and `'write_' + type` for every property of every message
+_PROPERTY_READERS = dict((t, getattr(AMQPReader, 'read_' + t)) for t in _PROPERTY_TYPES)
+_PROPERTY_WRITERS = dict((t, getattr(AMQPWriter, 'write_' + t)) for t in _PROPERTY_TYPES)
+
+# sizes of the fixed-size property types; strings and tables are prefixed by their length
+_FIXED_PROPERTY_SIZES = {'octet': 1, 'short': 2, 'long': 4, 'longlong': 8, 'timestamp': 8}
+
+
+_octet = struct.Struct('B')
+_long = struct.Struct('>I')
+_property_flags = struct.Struct('>H')
 
 
 class GenericContent:
     """Base class for AMQP content
 
     Subclasses should override :attr:`PROPERTIES`.
+
+    Properties loaded from a received header frame with :meth:`load_properties` are kept in their
+    encoded form, and are only decoded when they are accessed.
     """
-    __slots__ = ['properties']
+    __slots__ = ['_properties', '_raw_properties', '_property_offsets']
     PROPERTIES = []
 
     def __init__(self, properties):
@@ -26,23 +48,76 @@ class GenericContent:
 
         :param dict properties: content properties
         """
-        #: Content properties
-        #:
-        #: :type: dict[str|unicode, str|dict]
         self.properties = properties
 
+    @property
+    def properties(self):
+        """Content properties
+
+        Accessing this attribute decodes all properties which were loaded with
+        :meth:`load_properties` and haven't been decoded yet.
+
+        :rtype: dict[str|unicode, str|dict]
+        """
+        if self._raw_properties is not None:
+            self._decode_properties()
+        return self._properties
+
+    @properties.setter
+    def properties(self, properties):
+        self._properties = properties
+        self._raw_properties = None
+        self._property_offsets = None
+
     def __eq__(self, other):
         """Check if this object has the same properties as another content object
         """
         return self.properties == other.properties
 
+    def get_property(self, name, default=None):
+        """Get a single property, without decoding any other loaded properties
+
+        :param str name: property name
+        :param default: value to return if the property is not set
+        :return: property value
+        """
+        properties = self._properties
+        if self._raw_properties is None or name in properties:
+            return properties.get(name, default)
+
+        offset = self._property_offsets.get(name)
+        if offset is None:
+            return default
+        reader = AMQPReader(self._raw_properties)
+        reader.pos, data_type = offset
+        value = properties[name] = _PROPERTY_READERS[data_type](reader)
+        return value
+
+    def _decode_properties(self):
+        """Decode all loaded properties which haven't been decoded yet
+        """
+        properties = self._properties
+        reader = AMQPReader(self._raw_properties)
+        for name, (pos, data_type) in self._property_offsets.items():
+            if name not in properties:
+                reader.pos = pos
+                properties[name] = _PROPERTY_READERS[data_type](reader)
+        self._raw_properties = None
+        self._property_offsets = None
+
     def load_properties(self, raw_bytes):
         """Load raw bytes into :attr:`self.properties`
 
         The `raw_bytes` are the payload of a `FrameType.HEADER` frame, starting at a byte-offset
-        of 12.
+        of 12. They are copied and indexed, but the property values are only decoded when they are
+        accessed through :attr:`properties` or :meth:`get_property`.
         """
+        if isinstance(raw_bytes, memoryview):
+            raw_bytes = raw_bytes.tobytes()
+        else:
+            raw_bytes = bytes(raw_bytes)
         reader = AMQPReader(raw_bytes)
+        buf = reader.buf
 
         # read 16-bit shorts until we get one with a low bit set to zero
         flags = []
@@ -52,9 +127,11 @@ class GenericContent:
             if flag_bits & 1 == 0:
                 break
 
+        # find the offset of each property value, skipping over the values without decoding them
         shift = 0
-        d = {}
+        offsets = {}
         flag_bits = None
+        pos = reader.pos
         for prop_name, data_type in self.PROPERTIES:
             if shift == 0:
                 if not flags:
@@ -62,22 +139,38 @@ class GenericContent:
                 flag_bits, flags = flags[0], flags[1:]
                 shift = 15
             if flag_bits & (1 << shift):
-                d[prop_name] = getattr(reader, 'read_' + data_type)()
+                offsets[prop_name] = (pos, data_type)
+                size = _FIXED_PROPERTY_SIZES.get(data_type)
+                if size is None:
+                    length_codec = _octet if data_type == 'shortstr' else _long
+                    size = length_codec.size + length_codec.unpack_from(buf, pos)[0]
+                pos += size
             shift -= 1
 
-        self.properties = d
+        if pos > len(raw_bytes):
+            raise FrameSyntaxError('Content header properties are truncated')
+
+        self._properties = {}
+        self._raw_properties = raw_bytes
+        self._property_offsets = offsets
 
     def serialize_properties(self):
         """Serialize :attr:`self.properties` into raw bytes suitable to append
         to the payload of `FrameType.HEADER` frames
         """
-        # write
+        if self._raw_properties is not None and not any(
+                isinstance(v, dict) for v in self._properties.values()):
+            # the loaded properties can only have been modified by changing a decoded table in
+            # place, so they can be sent as they were received
+            return self._raw_properties
+
+        properties = self.properties
         shift = 15
         flag_bits = 0
         flags = []
-        prop_writer = AMQPWriter()
+        values = []
         for prop_name, data_type in self.PROPERTIES:
-            val = self.properties.get(prop_name)
+            val = properties.get(prop_name)
             if val is not None:
                 if shift == 0:
                     flags.append(flag_bits)
@@ -86,15 +179,18 @@ class GenericContent:
 
                 flag_bits |= (1 << shift)
                 if data_type != 'bit':
-                    getattr(prop_writer, 'write_' + data_type)(val)
+                    values.append((data_type, val))
             shift -= 1
         flags.append(flag_bits)
 
-        # write final data
+        # write the flags, with the continuation bit set on all but the last, followed by the
+        # property values into a single buffer
         writer = AMQPWriter()
-        for flag_bits in flags:
-            writer.write_short(flag_bits)
-        writer.write(prop_writer.getvalue())
+        for flag_bits in flags[:-1]:
+            writer.write_short(flag_bits | 1)
+        writer.write_short(flags[-1])
+        for data_type, val in values:
+            _PROPERTY_WRITERS[data_type](writer, val)
 
         return writer.getvalue()
 
@@ -102,7 +198,8 @@ class GenericContent:
 class Message(GenericContent):
     """A Message for use with the `Channel.basic_*` methods
     """
-    __slots__ = ['body', 'channel', 'delivery_info']
+    __slots__ = ['_body', '_undecoded', 'body_size', 'compression', 'compress_threshold', 'channel',
+                 'delivery_info', 'template']
 
     CLASS_ID = spec.Basic.CLASS_ID
 
@@ -125,19 +222,38 @@ class Message(GenericContent):
         ('cluster_id', 'shortstr')
     ]
 
-    def __init__(self, body='', channel=None, **properties):
+    def __init__(self, body='', channel=None, body_size=None, compression=None,
+                 compress_threshold=0, **properties):
         """
         If `body` is a `str`, then `content_encoding` will automatically be set to 'UTF-8', unless
         explicitly specified.
 
+        If `body` is any other object, it is encoded with the codec registered for its
+        `content_type` in :mod:`amqpy.body_codecs` when the message is published. If `compression`
+        is given, the encoded body is compressed if it is at least `compress_threshold` bytes long,
+        and the compression is added to `content_encoding`.
+
+        The body may also be a binary file object or an iterator of bytes chunks, in which case it
+        is streamed: it is read in frame-sized chunks while the message is being sent, and is never
+        held in memory as a whole. The size of a streamed body must be known before it is sent, and
+        must be given as `body_size` unless `body` is a seekable file object, in which case the
+        size of the data between the current position and the end of the file is used.
+
         Example::
 
             msg = Message('hello world', content_type='text/plain', application_headers={'foo': 7})
+            msg = Message(open('backup.tar', 'rb'), content_type='application/x-tar')
 
         :param body: message body
-        :type body: bytes or str or unicode
+        :type body: bytes or str or unicode or object or file or Iterator[bytes]
         :param channel: associated channel
         :type channel: amqpy.channel.Channel
+        :param body_size: size of a streamed body in bytes
+        :type body_size: int or None
+        :param compression: name of a compression registered in :mod:`amqpy.body_codecs`, such as
+            'gzip'; not applied to streamed bodies
+        :type compression: str or None
+        :param int compress_threshold: minimum size of the encoded body to compress, in bytes
         :param properties:
             * content_type (shortstr): MIME content type
             * content_encoding (shortstr): MIME content encoding
@@ -157,15 +273,36 @@ class Message(GenericContent):
         """
         super(Message, self).__init__(properties)
 
-        #: Message body (bytes or str or unicode)
         self.body = body
 
+        if body_size is None and self.body_is_stream:
+            try:
+                pos = body.tell()
+                body.seek(0, 2)
+                body_size = body.tell() - pos
+                body.seek(pos)
+            except (AttributeError, IOError, OSError):
+                raise ValueError('`body_size` must be specified for streamed bodies which are not '
+                                 'seekable file objects')
+
+        #: Size of a streamed body in bytes; None if the body is held in memory (int or None)
+        self.body_size = body_size
+
+        #: Compression applied when publishing (str or None)
+        self.compression = compression
+
+        #: Minimum size of the encoded body to compress, in bytes (int)
+        self.compress_threshold = compress_threshold
+
         #: Associated channel, set after receiving a message (amqpy.channel.Channel)
         self.channel = channel
 
         #: Delivery info, set after receiving a message (dict)
         self.delivery_info = {}
 
+        #: Template this message was created from, if any (MessageTemplate or None)
+        self.template = None
+
         if isinstance(body, six.string_types):
             # if the `body` is a string, automatically set the content_encoding
             # to UTF-8 if it hasn't already been set
@@ -181,6 +318,71 @@ class Message(GenericContent):
         except AttributeError:
             return False
 
+    @property
+    def body(self):
+        """Message body
+
+        The bodies of messages received on a channel with `auto_decode` enabled are decoded when
+        this attribute is first accessed (see :func:`amqpy.body_codecs.decode_body`). Received
+        binary bodies which spanned several frames are the `bytearray` they were assembled in,
+        rather than `bytes`. The bodies of received messages which are larger than the
+        connection's `body_spool_threshold` are spooled to a temporary file, and this is the file
+        object, positioned at the start of the body.
+
+        :rtype: bytes or bytearray or str or unicode or object or file or Iterator[bytes]
+        """
+        if self._undecoded:
+            self._undecoded = False
+            self._body = body_codecs.decode_body(self._body, self.get_property('content_type'),
+                                                 self.get_property('content_encoding'))
+        return self._body
+
+    @body.setter
+    def body(self, body):
+        self._body = body
+        self._undecoded = False
+
+    @property
+    def body_is_stream(self):
+        """Check if the body is streamed, i.e. it is a file object or an iterator of chunks
+
+        :rtype: bool
+        """
+        body = self._body
+        return hasattr(body, 'read') or hasattr(body, '__next__') or hasattr(body, 'next')
+
+    def defer_decode(self):
+        """Decode the received body when :attr:`body` is first accessed
+
+        Streamed (spooled) bodies are not decoded.
+        """
+        if not self.body_is_stream:
+            self._undecoded = True
+
+    def encode_body(self):
+        """Encode the body for publishing (see :func:`amqpy.body_codecs.encode_body`)
+
+        This may update the `content_encoding` property.
+
+        :return: encoded body
+        :rtype: bytes or bytearray or memoryview
+        """
+        return body_codecs.encode_body(self.body, self.properties, self.compression,
+                                       self.compress_threshold)
+
+    def serialize_properties(self):
+        """Serialize :attr:`self.properties` into raw bytes suitable to append
+        to the payload of `FrameType.HEADER` frames
+
+        Messages created with :meth:`MessageTemplate.message` reuse the property bytes encoded by
+        the template, as long as only the template's variable properties have been changed.
+        """
+        if self.template is not None:
+            data = self.template.serialize_properties(self.properties)
+            if data is not None:
+                return data
+        return super(Message, self).serialize_properties()
+
     @property
     def application_headers(self):
         """Get application headers
@@ -188,7 +390,7 @@ class Message(GenericContent):
         :return: application headers
         :rtype: dict
         """
-        return self.properties.get('application_headers')
+        return self.get_property('application_headers')
 
     @property
     def delivery_tag(self):
@@ -222,3 +424,147 @@ class Message(GenericContent):
             self.channel.basic_reject(dt, requeue)
         else:
             raise Exception('No delivery tag')
+
+    def nack(self, requeue=True, multiple=False):
+        """Reject message, or all messages received so far up to and including this one
+
+        This is a convenience method which calls :meth:`self.channel.basic_nack()`
+
+        :param bool requeue: requeue if True else discard the messages
+        :param bool multiple: if True, also reject all unsettled messages received before this one
+        """
+        dt = self.delivery_tag
+        if dt is not None:
+            self.channel.basic_nack(dt, multiple, requeue)
+        else:
+            raise Exception('No delivery tag')
+
+
+class MessageTemplate:
+    """Template for publishing many messages which share most of their properties
+
+    The properties of the template are encoded once, when the template is created. Messages
+    created with :meth:`message` only need the variable properties (by default `message_id`,
+    `timestamp` and `correlation_id`) to be encoded when they are published; the rest of the
+    header frame is copied from the cached bytes.
+
+    Example::
+
+        template = MessageTemplate(content_type='application/json', delivery_mode=2,
+                                   application_headers={'source': 'billing'})
+        for i, body in enumerate(bodies):
+            ch.basic_publish(template.message(body, message_id=str(i)), routing_key='orders')
+
+    The property values of the template are shared by all messages created from it and must not
+    be modified in place. Properties of a message may still be changed by assigning to
+    :attr:`Message.properties`, in which case the message falls back to encoding all of its
+    properties.
+    """
+    __slots__ = ['properties', 'variable', '_fixed', '_segments', '_slots', '_flags',
+                 '_text_template']
+
+    def __init__(self, variable=('message_id', 'timestamp', 'correlation_id'), **properties):
+        """
+        :param variable: names of properties which may differ for each message
+        :param properties: properties shared by all messages, as accepted by :class:`Message`
+        :type variable: tuple[str] or list[str]
+        """
+        prop_types = dict(Message.PROPERTIES)
+        for name in list(variable) + list(properties):
+            if name not in prop_types:
+                raise ValueError('Unknown message property: {}'.format(name))
+
+        #: Properties shared by all messages created from this template
+        #:
+        #: :type: dict[str, str|int|dict|datetime]
+        self.properties = dict((k, v) for k, v in properties.items() if v is not None)
+
+        #: Names of properties which may differ for each message
+        #:
+        #: :type: tuple[str]
+        self.variable = tuple(variable)
+
+        # `(name, value)` of each template property which is not variable
+        self._fixed = [(k, v) for k, v in self.properties.items() if k not in self.variable]
+
+        # the encoded fixed properties are split into segments around the variable properties:
+        # `segments[i]` precedes the variable property `slots[i]`, and the last segment follows
+        # the last variable property
+        self._segments = []
+        self._slots = []
+        self._flags = 0
+        writer = AMQPWriter()
+        shift = 15
+        for prop_name, data_type in Message.PROPERTIES:
+            if prop_name in self.variable:
+                self._segments.append(writer.getvalue())
+                self._slots.append((prop_name, _PROPERTY_WRITERS[data_type], 1 << shift))
+                writer = AMQPWriter()
+            elif prop_name in self.properties:
+                self._flags |= 1 << shift
+                _PROPERTY_WRITERS[data_type](writer, self.properties[prop_name])
+            shift -= 1
+        self._segments.append(writer.getvalue())
+
+        # template used for messages with a text body if `content_encoding` is not specified
+        self._text_template = None
+
+    def message(self, body='', channel=None, **properties):
+        """Create a message from this template
+
+        :param body: message body
+        :param channel: associated channel
+        :param properties: message properties, usually the variable properties of this template;
+            these override the template's properties
+        :type body: bytes or str or unicode
+        :type channel: amqpy.channel.Channel
+        :return: new message
+        :rtype: amqpy.Message
+        """
+        template = self
+        if isinstance(body, six.string_types) and 'content_encoding' not in self.properties:
+            # `Message` sets the content encoding of text bodies, so use a template which
+            # includes it in the cached bytes
+            if self._text_template is None:
+                props = dict(self.properties, content_encoding='UTF-8')
+                self._text_template = MessageTemplate(self.variable, **props)
+            template = self._text_template
+
+        props = template.properties.copy()
+        props.update(properties)
+        msg = Message(body, channel, **props)
+        msg.template = template
+        return msg
+
+    def serialize_properties(self, properties):
+        """Serialize message properties using the cached bytes of this template
+
+        :param dict properties: message properties
+        :return: serialized properties, or None if `properties` differ from the template's in a
+            property which is not variable
+        :rtype: bytes or None
+        """
+        fixed = self._fixed
+        for name, value in fixed:
+            if properties.get(name) is not value:
+                return None
+
+        segments = self._segments
+        flags = self._flags
+        count = len(fixed)
+        writer = AMQPWriter(bytearray(2))
+        out = writer.out
+        for i, (name, write, flag) in enumerate(self._slots):
+            out += segments[i]
+            value = properties.get(name)
+            if value is not None:
+                write(writer, value)
+                flags |= flag
+                count += 1
+        out += segments[-1]
+
+        if len(properties) != count:
+            # a property which isn't part of the template was added
+            return None
+        _property_flags.pack_into(out, 0, flags)
+        return bytes(out)
@@ -0,0 +1,258 @@
+"""Method argument codecs generated from the argument definitions in :data:`amqpy.spec.METHOD_ARGS`
+
+One encode and one decode function is generated per method at import time. Consecutive fixed-width
+arguments (including the length prefixes of strings and packed bits) are encoded and decoded with a
+single precompiled :class:`struct.Struct`, so that encoding or decoding the arguments of a method
+such as `Basic.Deliver` only takes a few calls.
+
+Encoders are called as ``encoder(out, *args)`` and append the encoded arguments to the bytearray
+`out`. Decoders are called as ``decoder(reader)``, read the arguments from the current position of
+the :class:`~amqpy.serialization.AMQPReader`, and return them as a tuple.
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import struct
+import six
+
+from . import spec
+from .exceptions import FrameSyntaxError
+from .serialization import AMQPReader, AMQPWriter
+
+__all__ = ['ENCODERS', 'DECODERS', 'pack_args', 'unpack_args']
+
+# struct format characters of the fixed-width argument types
+_FIXED_FORMATS = {
+    'octet': 'B',
+    'short': 'H',
+    'long': 'I',
+    'longlong': 'Q',
+}
+
+# struct format characters of the length prefixes of the string argument types
+_LENGTH_FORMATS = {
+    'shortstr': 'B',
+    'longstr': 'I',
+}
+
+
+def _method_names():
+    """Get the names of all methods defined in :mod:`amqpy.spec`
+
+    :return: `{method_t: name}`, where names are of the form `basic_publish`
+    :rtype: dict[method_t, str]
+    """
+    names = {}
+    for cls in (spec.Connection, spec.Channel, spec.Exchange, spec.Queue, spec.Basic,
+                spec.Confirm, spec.Tx):
+        for attr, value in vars(cls).items():
+            if isinstance(value, spec.method_t):
+                names[value] = '{}_{}'.format(cls.__name__, attr).lower()
+    return names
+
+
+def _group_bits(fields):
+    """Group consecutive bit arguments, which are packed into a single octet
+
+    :return: list of `(type, names)`, where `names` has more than one item only for bits
+    :rtype: list[(str, list[str])]
+    """
+    groups = []
+    for name, arg_type in fields:
+        if arg_type == 'bit' and groups and groups[-1][0] == 'bit' and len(groups[-1][1]) < 8:
+            groups[-1][1].append(name)
+        else:
+            groups.append((arg_type, [name]))
+    return groups
+
+
+class _Generator:
+    """Generate the source code of the codec functions of one method
+    """
+
+    def __init__(self, name, fields, namespace):
+        """
+        :param str name: method name
+        :param fields: argument definitions
+        :param dict namespace: namespace that the generated code is executed in; `Struct` objects
+            used by the generated code are added to it
+        """
+        self.name = name
+        self.fields = fields
+        self.namespace = namespace
+        self.struct_count = 0
+
+    def _struct(self, fmt):
+        """Add a precompiled `Struct` to the namespace
+
+        :return: name of the `Struct`
+        :rtype: str
+        """
+        struct_name = '_{}_{}'.format(self.name, self.struct_count)
+        self.struct_count += 1
+        self.namespace[struct_name] = struct.Struct('>' + fmt)
+        return struct_name
+
+    def encoder(self):
+        params = ''.join(', ' + name for name, _ in self.fields)
+        lines = ['def encode_{}(out{}):'.format(self.name, params)]
+        body = []
+        fmt = ''
+        values = []
+
+        def flush():
+            if fmt:
+                body.append('out += {}.pack({})'.format(self._struct(fmt), ', '.join(values)))
+
+        for arg_type, names in _group_bits(self.fields):
+            name = names[0]
+            if arg_type in _FIXED_FORMATS:
+                fmt += _FIXED_FORMATS[arg_type]
+                values.append(name)
+            elif arg_type == 'bit':
+                fmt += 'B'
+                values.append(' | '.join('({} if {} else 0)'.format(1 << i, bit_name)
+                                         for i, bit_name in enumerate(names)))
+            elif arg_type in _LENGTH_FORMATS:
+                lines.append('    if isinstance({0}, text_type):'.format(name))
+                lines.append("        {0} = {0}.encode('utf-8')".format(name))
+                if arg_type == 'shortstr':
+                    lines.append('    if len({}) > 255:'.format(name))
+                    lines.append("        raise FrameSyntaxError('Shortstring overflow "
+                                 "({{0}} > 255)'.format(len({})))".format(name))
+                fmt += _LENGTH_FORMATS[arg_type]
+                values.append('len({})'.format(name))
+                flush()
+                fmt, values = '', []
+                body.append('out += {}'.format(name))
+            elif arg_type == 'table':
+                flush()
+                fmt, values = '', []
+                body.append('AMQPWriter(out).write_table({} or {{}})'.format(name))
+            else:
+                raise ValueError('Unknown argument type: {}'.format(arg_type))
+        flush()
+
+        if body:
+            lines.append('    try:')
+            lines.extend('        ' + line for line in body)
+            lines.append('    except struct_error as exc:')
+            lines.append('        raise FrameSyntaxError(str(exc))')
+        else:
+            lines.append('    pass')
+        return '\n'.join(lines) + '\n'
+
+    def decoder(self):
+        lines = ['def decode_{}(reader):'.format(self.name),
+                 '    buf = reader.buf',
+                 '    pos = reader.pos']
+        fmt = ''
+        targets = []
+        after = []  # statements to run after unpacking the current run of fixed-width values
+
+        def flush():
+            if fmt:
+                lines.append('    {}, = {}.unpack_from(buf, pos)'.format(', '.join(targets),
+                                                                       self._struct(fmt)))
+                lines.append('    pos += {}'.format(struct.calcsize('>' + fmt)))
+                lines.extend(after)
+
+        for arg_type, names in _group_bits(self.fields):
+            name = names[0]
+            if arg_type in _FIXED_FORMATS:
+                fmt += _FIXED_FORMATS[arg_type]
+                targets.append(name)
+            elif arg_type == 'bit':
+                fmt += 'B'
+                targets.append('_bits_' + name)
+                for i, bit_name in enumerate(names):
+                    after.append('    {} = (_bits_{} & {}) != 0'.format(bit_name, name, 1 << i))
+            elif arg_type in _LENGTH_FORMATS:
+                fmt += _LENGTH_FORMATS[arg_type]
+                targets.append('_len_' + name)
+                flush()
+                lines.append("    {0} = buf[pos:pos + _len_{0}].tobytes().decode('utf-8')"
+                             .format(name))
+                lines.append('    pos += _len_{}'.format(name))
+                fmt, targets, after = '', [], []
+            elif arg_type == 'table':
+                flush()
+                lines.append('    reader.pos = pos')
+                lines.append('    {} = reader.read_table()'.format(name))
+                lines.append('    pos = reader.pos')
+                fmt, targets, after = '', [], []
+            else:
+                raise ValueError('Unknown argument type: {}'.format(arg_type))
+        flush()
+
+        lines.append('    reader.pos = pos')
+        lines.append('    reader.bit_count = reader.bits = 0')
+        names = [name for name, _ in self.fields]
+        lines.append('    return ({})'.format(''.join(name + ', ' for name in names)))
+        return '\n'.join(lines) + '\n'
+
+
+def _generate():
+    """Generate the encoder and decoder of each method in :data:`amqpy.spec.METHOD_ARGS`
+
+    :return: `(encoders, decoders)`
+    :rtype: (dict[method_t, Callable], dict[method_t, Callable])
+    """
+    names = _method_names()
+    encoders = {}
+    decoders = {}
+    for method_type, fields in spec.METHOD_ARGS.items():
+        name = names[method_type]
+        namespace = {
+            'text_type': six.text_type,
+            'struct_error': struct.error,
+            'FrameSyntaxError': FrameSyntaxError,
+            'AMQPWriter': AMQPWriter,
+        }
+        generator = _Generator(name, fields, namespace)
+        six.exec_(generator.encoder() + generator.decoder(), namespace)
+        encoders[method_type] = namespace['encode_' + name]
+        decoders[method_type] = namespace['decode_' + name]
+    return encoders, decoders
+
+
+#: Argument encoder of each method: `{method_t: encoder(out, *args)}`
+#:
+#: :type: dict[method_t, Callable]
+ENCODERS = None
+
+#: Argument decoder of each method: `{method_t: decoder(reader) -> tuple}`
+#:
+#: :type: dict[method_t, Callable]
+DECODERS = None
+
+ENCODERS, DECODERS = _generate()
+
+
+def pack_args(method_type, *args):
+    """Encode method arguments
+
+    :param method_type: method type
+    :param args: arguments, in the order defined in :data:`amqpy.spec.METHOD_ARGS`
+    :type method_type: method_t
+    :return: writer holding the encoded arguments, suitable for passing to
+        :class:`~amqpy.proto.Method`
+    :rtype: amqpy.serialization.AMQPWriter
+    """
+    writer = AMQPWriter()
+    ENCODERS[method_type](writer.out, *args)
+    return writer
+
+
+def unpack_args(method):
+    """Decode the arguments of a received method
+
+    :param method: method
+    :type method: amqpy.proto.Method
+    :return: arguments, in the order defined in :data:`amqpy.spec.METHOD_ARGS`
+    :rtype: tuple
+    """
+    args = method.args
+    if not isinstance(args, AMQPReader):
+        args = AMQPReader(args.getvalue())
+    return DECODERS[method.method_type](args)
@@ -4,17 +4,13 @@ __metaclass__ = type
 from threading import Lock
 import sys
 from collections import defaultdict, deque
+from itertools import count
 import six
 import logging
 import socket
 import errno
 from .utils import get_errno
 
-if six.PY2:
-    from Queue import Queue
-else:
-    from queue import Queue
-
 from .concurrency import synchronized
 from .exceptions import UnexpectedFrame, Timeout, METHOD_NAME_MAP
 from .proto import Method
@@ -23,7 +19,7 @@ from .spec import FrameType
 
 log = logging.getLogger('amqpy')
 
-__all__ = ['MethodReader']
+__all__ = ['MethodReader', 'MethodWriter', 'MethodQueue']
 
 # these received methods are followed by content headers and bodies
 _CONTENT_METHODS = [
@@ -42,12 +38,22 @@ class MethodReader:
     In the case of unexpected frames, an :exc:`ChannelError` is placed in the queue.
     """
 
-    def __init__(self, transport):
+    #: Connection metrics, or None if disabled
+    #:
+    #: :type: amqpy.metrics.Metrics or None
+    metrics = None
+
+    def __init__(self, transport, spool_threshold=None):
         """
         :param transport: transport to read from
+        :param spool_threshold: message bodies larger than this many bytes are spooled to a
+            temporary file as they are received, rather than being assembled in memory; None to
+            assemble all bodies in memory
         :type transport: amqpy.transport.Transport
+        :type spool_threshold: int or None
         """
         self.transport = transport
+        self.spool_threshold = spool_threshold
         self.sock = transport.sock
 
         # deque[Method or Exception]
@@ -74,7 +80,7 @@ class MethodReader:
         while not self.method_queue:
             # keep reading frames until we have at least one complete method in the queue
             try:
-                frame = self.transport.read_frame()
+                frame = self.transport.read_frame(self._body_dest)
             except Exception as exc:
                 # connection was closed? framing error?
                 if six.PY2:
@@ -83,18 +89,41 @@ class MethodReader:
                 self.method_queue.append(exc)
                 break
 
-            self.frames_recv += 1
+            self.process_frame(frame)
+
+    def _body_dest(self, channel_id, payload_size):
+        """Get the destination of the payload of a body frame, for :meth:`Transport.read_frame()`
+
+        :return: view of the body buffer of the partial method on the channel, or None
+        :rtype: memoryview or None
+        """
+        method = self.partial_methods.get(channel_id)
+        if method is None or self.expected_types.get(channel_id) != FrameType.BODY:
+            return None
+        return method.body_buffer(payload_size)
 
-            if frame.frame_type not in (self.expected_types[frame.channel], 8):
-                msg = 'Received frame type {} while expecting type: {}' \
-                    .format(frame.frame_type, self.expected_types[frame.channel])
-                self.method_queue.append(UnexpectedFrame(msg, channel_id=frame.channel))
-            elif frame.frame_type == FrameType.METHOD:
-                self._process_method_frame(frame)
-            elif frame.frame_type == FrameType.HEADER:
-                self._process_content_header(frame)
-            elif frame.frame_type == FrameType.BODY:
-                self._process_content_body(frame)
+    def process_frame(self, frame):
+        """Process a received frame
+
+        If the frame completes a method, the method is placed in the internal queue.
+
+        :param frame: incoming frame
+        :type frame: amqpy.proto.Frame
+        """
+        self.frames_recv += 1
+        if self.metrics is not None:
+            self.metrics.frame_in(frame.frame_type, frame.payload_size + 8)
+
+        if frame.frame_type not in (self.expected_types[frame.channel], 8):
+            msg = 'Received frame type {} while expecting type: {}' \
+                .format(frame.frame_type, self.expected_types[frame.channel])
+            self.method_queue.append(UnexpectedFrame(msg, channel_id=frame.channel))
+        elif frame.frame_type == FrameType.METHOD:
+            self._process_method_frame(frame)
+        elif frame.frame_type == FrameType.HEADER:
+            self._process_content_header(frame)
+        elif frame.frame_type == FrameType.BODY:
+            self._process_content_body(frame)
 
     def _process_method_frame(self, frame):
         """Process method frame
@@ -122,7 +151,7 @@ class MethodReader:
         """
         #: :type: amqpy.proto.Method
         method = self.partial_methods[frame.channel]
-        method.load_header_frame(frame)
+        method.load_header_frame(frame, self.spool_threshold)
 
         if method.complete:
             # a bodyless message, we're done
@@ -163,6 +192,8 @@ class MethodReader:
         if isinstance(method, Exception):
             raise method
 
+        if self.metrics is not None:
+            self.metrics.method_in(method)
         log.debug('{:7} channel: {} {} {}'
                   .format('Read:', method.channel_id,
                           method.method_type, METHOD_NAME_MAP[method.method_type]))
@@ -203,8 +234,17 @@ class MethodWriter:
     There should be one `MethodWriter` instance per connection, and all channels share that
     instance. This class is thread-safe. Any thread may call :meth:`write_method()` as long as no
     more than one thread is writing to any given `channel_id` at a time.
+
+    All frames of a method are packed into a list of buffers up front and written to the transport
+    in a single call (one vectored `sendmsg()` where supported). Methods carrying a streamed body
+    are written in batches of frames instead, as the body is read.
     """
 
+    #: Connection metrics, or None if disabled
+    #:
+    #: :type: amqpy.metrics.Metrics or None
+    metrics = None
+
     def __init__(self, transport, frame_max):
         """
         :param transport: transport to write to
@@ -219,8 +259,8 @@ class MethodWriter:
     def write_method(self, method):
         """Write method to connection, destined for the channel as set in `method.channel_id`
 
-        This implementation uses a queue internally to prepare all frames before writing in order
-        to detect issues.
+        All frames are prepared before writing in order to detect issues, then written to the
+        transport in a single call.
 
         This method is thread safe only if the `channel_id` parameter is unique across concurrent
         invocations. The AMQP protocol allows interleaving frames destined for different channels,
@@ -230,25 +270,143 @@ class MethodWriter:
         :param method: method to write
         :type method: amqpy.proto.Method
         """
-        transport = self.transport
         log.debug('{:7} channel: {} {} {}'
                   .format('Write:', method.channel_id,
                           method.method_type, METHOD_NAME_MAP[method.method_type]))
-        frames = Queue()
 
-        # construct a method frame
-        frames.put(method.dump_method_frame())
+        chunk_size = self.frame_max - 8
+        if method.content and method.content.body_is_stream:
+            for buffers in method.pack_frame_batches(chunk_size):
+                self.transport.write_frames(buffers)
+        else:
+            # construct the method frame, and the header and body frames if the method carries
+            # content
+            self.transport.write_frames(method.pack_frames(chunk_size))
 
-        if method.content:
-            # construct a header frame
-            frames.put(method.dump_header_frame())
+        self.methods_sent += 1
+        if self.metrics is not None:
+            self.metrics.method_out(method, chunk_size)
 
-            # construct one or more body frames, which contain the body of the `Message`
-            chunk_size = self.frame_max - 8
-            for frame in method.dump_body_frame(chunk_size):
-                frames.put(frame)
+    def write_methods(self, methods):
+        """Write several methods to connection in a single write
 
-        while not frames.empty():
-            transport.write_frame(frames.get())
+        The frames of all methods are packed into one contiguous outgoing buffer (large message
+        bodies excepted, which are not copied) and written with a single call to the transport.
 
-        self.methods_sent += 1
+        The same thread safety rules as :meth:`write_method()` apply.
+
+        :param methods: methods to write, in order
+        :type methods: list[amqpy.proto.Method]
+        """
+        chunk_size = self.frame_max - 8
+        buffers = []
+        for method in methods:
+            if method.content and method.content.body_is_stream:
+                # write what has been packed so far, then stream the body
+                if buffers:
+                    self.transport.write_frames(buffers)
+                    buffers = []
+                for batch in method.pack_frame_batches(chunk_size):
+                    self.transport.write_frames(batch)
+            else:
+                method.pack_frames(chunk_size, buffers)
+
+        if buffers:
+            log.debug('{:7} {} methods'.format('Write:', len(methods)))
+            self.transport.write_frames(buffers)
+
+        self.methods_sent += len(methods)
+        if self.metrics is not None:
+            for method in methods:
+                self.metrics.method_out(method, chunk_size)
+
+
+class MethodQueue:
+    """Queue of received methods waiting to be handled by a channel
+
+    Methods are indexed by method type, so that taking the oldest method of one of a few types
+    (such as the reply to an RPC) from a large backlog of other methods (such as deliveries) takes
+    constant time, rather than a scan through the whole queue.
+
+    This class is not thread-safe; the channel's `incoming_cond` guards access when the connection's
+    reader thread is enabled.
+    """
+
+    def __init__(self):
+        # dict[method_type method_t: deque[(seq int, Method)]]
+        self._by_type = {}
+        self._seq = count()
+        self._len = 0
+
+        #: Exception to be raised by :meth:`pop()`, as set by :meth:`set_error()`
+        #:
+        #: :type: Exception or None
+        self.error = None
+
+    def __len__(self):
+        return self._len
+
+    def __bool__(self):
+        return self._len > 0
+
+    __nonzero__ = __bool__
+
+    def append(self, method):
+        """Add a method to the end of the queue
+
+        :type method: amqpy.proto.Method
+        """
+        method_type = method.method_type
+        try:
+            self._by_type[method_type].append((next(self._seq), method))
+        except KeyError:
+            self._by_type[method_type] = deque([(next(self._seq), method)])
+        self._len += 1
+
+    def pop(self, allowed_methods=None, exclude=()):
+        """Remove and return the oldest method of one of the `allowed_methods` types
+
+        :param allowed_methods: method types to look for, or `None` for any type
+        :param exclude: method types to skip
+        :type allowed_methods: list[method_t] or None
+        :type exclude: collection[method_t]
+        :return: method, or `None` if there is no such method in the queue
+        :rtype: amqpy.proto.Method or None
+        :raise Exception: the exception set by :meth:`set_error()`, if any
+        """
+        if self.error is not None:
+            raise self.error
+
+        by_type = self._by_type
+        if allowed_methods is None:
+            allowed_methods = by_type
+
+        oldest = None
+        for method_type in allowed_methods:
+            entries = by_type.get(method_type)
+            if entries and method_type not in exclude:
+                if oldest is None or entries[0][0] < oldest[0][0]:
+                    oldest = entries
+
+        if oldest is None:
+            return None
+
+        _, method = oldest.popleft()
+        if not oldest:
+            del by_type[method.method_type]
+        self._len -= 1
+        return method
+
+    def set_error(self, exc):
+        """Make all subsequent calls to :meth:`pop()` raise `exc`
+
+        :param Exception exc: exception
+        """
+        self.error = exc
+
+    def clear(self):
+        """Remove all methods and any error from the queue
+        """
+        self._by_type.clear()
+        self._len = 0
+        self.error = None
@@ -0,0 +1,518 @@
+"""Connection and channel metrics
+
+Metrics are disabled by default. A connection created with `metrics=True` (or with a
+:class:`Metrics` instance) counts frames, bytes and methods, and measures latencies and lock wait
+times on the connection and each of its channels::
+
+    metrics = Metrics(sinks=[StatsdSink()])
+    conn = Connection(metrics=metrics)
+    ...
+    metrics.export()  # e.g. every 10 seconds
+
+While metrics are disabled, the instrumented code paths only check that the `metrics` attribute of
+the connection, channel or transport is None.
+
+Collected metrics are exported as lists of :class:`Sample` objects, which are passed to sinks. A
+sink is any callable which accepts such a list; :class:`StatsdSink` and :class:`PrometheusSink`
+are provided, and :func:`prometheus_text` formats samples for a Prometheus scrape endpoint.
+
+The counters are updated without locking, so concurrent updates from several threads may
+occasionally be lost.
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import logging
+import os
+import socket
+import time
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict, namedtuple
+
+from . import compat
+from .exceptions import METHOD_NAME_MAP
+from .spec import FrameType
+
+compat.patch()  # monkey-patch time.monotonic
+
+log = logging.getLogger('amqpy')
+
+__all__ = ['Sample', 'Histogram', 'Metrics', 'ChannelMetrics', 'prometheus_text', 'StatsdSink',
+           'PrometheusSink']
+
+#: Upper bounds of the default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+
+FRAME_TYPE_NAMES = {
+    FrameType.METHOD: 'method',
+    FrameType.HEADER: 'header',
+    FrameType.BODY: 'body',
+    FrameType.HEARTBEAT: 'heartbeat',
+}
+
+# metric families and their types, in export order
+_FAMILIES = OrderedDict([
+    ('amqpy_frames_received_total', 'counter'),
+    ('amqpy_frame_bytes_received_total', 'counter'),
+    ('amqpy_frames_sent_total', 'counter'),
+    ('amqpy_frame_bytes_sent_total', 'counter'),
+    ('amqpy_methods_received_total', 'counter'),
+    ('amqpy_methods_sent_total', 'counter'),
+    ('amqpy_incoming_methods', 'gauge'),
+    ('amqpy_publish_latency_seconds', 'histogram'),
+    ('amqpy_confirm_latency_seconds', 'histogram'),
+    ('amqpy_ack_latency_seconds', 'histogram'),
+    ('amqpy_lock_wait_seconds', 'histogram'),
+])
+
+
+class Sample(namedtuple('Sample', ['name', 'labels', 'value'])):
+    """A single exported value
+
+    Fields:
+
+    * name (str): metric name, e.g. `amqpy_frames_received_total`; histograms are exported as
+      `<name>_bucket`, `<name>_sum` and `<name>_count` samples, as in Prometheus
+    * labels (tuple): `((label, value), ...)` pairs
+    * value (int or float): value
+    """
+    __slots__ = ()
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets
+    """
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        """
+        :param bounds: upper bounds of the buckets, in increasing order; values larger than the
+            last bound are only included in the total count
+        :type bounds: tuple[float]
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Record a value
+
+        :param float value: value
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        """Get the cumulative bucket counts, sum and count as samples
+
+        :param str name: metric name
+        :param tuple labels: labels of all samples
+        :rtype: list[Sample]
+        """
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            samples.append(Sample(name + '_bucket', labels + (('le', repr(float(bound))),),
+                                  cumulative))
+        samples.append(Sample(name + '_bucket', labels + (('le', '+Inf'),), self.count))
+        samples.append(Sample(name + '_sum', labels, self.sum))
+        samples.append(Sample(name + '_count', labels, self.count))
+        return samples
+
+
+class _LockWaits:
+    """Lock wait time histograms, recorded by the `synchronized` decorators"""
+
+    def __init__(self):
+        #: Time spent waiting for locks which were held by another thread: `{lock_name: Histogram}`
+        #:
+        #: Calls which acquire a lock without waiting are not recorded.
+        #:
+        #: :type: dict[str, Histogram]
+        self.lock_wait = {}
+
+    def lock_waited(self, lock_name, seconds):
+        """Record the time spent waiting for a lock
+
+        :param str lock_name: name of the lock attribute
+        :param float seconds: wait time
+        """
+        hist = self.lock_wait.get(lock_name)
+        if hist is None:
+            hist = self.lock_wait.setdefault(lock_name, Histogram())
+        hist.observe(seconds)
+
+
+class ChannelMetrics(_LockWaits):
+    """Metrics of a channel
+
+    Instances are created by :meth:`Metrics.channel()`.
+    """
+
+    def __init__(self, channel_id):
+        super(ChannelMetrics, self).__init__()
+        self.channel_id = channel_id
+
+        #: Methods received: `{method_type: count}`
+        #:
+        #: :type: dict[amqpy.spec.method_t, int]
+        self.methods_in = defaultdict(int)
+        #: Methods sent: `{method_type: count}`
+        #:
+        #: :type: dict[amqpy.spec.method_t, int]
+        self.methods_out = defaultdict(int)
+
+        #: Duration of `basic_publish()` and `basic_publish_batch()` calls, including the wait for
+        #: publisher confirms in blocking confirm mode
+        #:
+        #: :type: Histogram
+        self.publish_latency = Histogram()
+        #: Time from publishing a message to receiving its publisher confirm (ack or nack)
+        #:
+        #: :type: Histogram
+        self.confirm_latency = Histogram()
+        #: Time from receiving a message to sending its ack, nack or reject
+        #:
+        #: :type: Histogram
+        self.ack_latency = Histogram()
+
+        # publish times of unconfirmed messages: dict[seq_no int: float]
+        self._published = {}
+        # receive times of unsettled messages, in order: OrderedDict[delivery_tag int: float]
+        self._delivered = OrderedDict()
+
+    def published(self, seq_no, t):
+        """Record the publish time of a message in publisher confirm mode
+
+        :param int seq_no: publish sequence number
+        :param float t: monotonic time
+        """
+        self._published[seq_no] = t
+
+    def confirmed(self, seq_no):
+        """Record the publisher confirm of a message
+
+        :param int seq_no: publish sequence number
+        """
+        t = self._published.pop(seq_no, None)
+        if t is not None:
+            self.confirm_latency.observe(time.monotonic() - t)
+
+    def delivered(self, delivery_tag):
+        """Record the receipt of a message which must be acked
+
+        :param int delivery_tag: delivery tag
+        """
+        self._delivered[delivery_tag] = time.monotonic()
+
+    def settled(self, delivery_tag, multiple=False):
+        """Record the ack, nack or reject of one or more messages
+
+        :param int delivery_tag: delivery tag; 0 with `multiple` means all messages
+        :param bool multiple: if set, all messages up to and including `delivery_tag` are settled
+        """
+        delivered = self._delivered
+        now = time.monotonic()
+        if not multiple:
+            t = delivered.pop(delivery_tag, None)
+            if t is not None:
+                self.ack_latency.observe(now - t)
+            return
+        while delivered:
+            tag = next(iter(delivered))
+            if delivery_tag and tag > delivery_tag:
+                break
+            self.ack_latency.observe(now - delivered.pop(tag))
+
+    def reset(self):
+        """Forget unconfirmed and unsettled messages, e.g. when the channel is closed
+        """
+        self._published.clear()
+        self._delivered.clear()
+
+    def collect(self):
+        """Get the metrics of this channel as samples
+
+        :rtype: list[Sample]
+        """
+        labels = (('channel', str(self.channel_id)),)
+        samples = []
+        for name, counts in (('amqpy_methods_received_total', self.methods_in),
+                             ('amqpy_methods_sent_total', self.methods_out)):
+            for method_type, count in list(counts.items()):
+                method_name = METHOD_NAME_MAP.get(method_type, str(tuple(method_type)))
+                samples.append(Sample(name, labels + (('method', method_name),), count))
+        for name, hist in (('amqpy_publish_latency_seconds', self.publish_latency),
+                           ('amqpy_confirm_latency_seconds', self.confirm_latency),
+                           ('amqpy_ack_latency_seconds', self.ack_latency)):
+            if hist.count:
+                samples.extend(hist.samples(name, labels))
+        for lock_name, hist in list(self.lock_wait.items()):
+            samples.extend(hist.samples('amqpy_lock_wait_seconds',
+                                        labels + (('lock', lock_name),)))
+        return samples
+
+
+class Metrics(_LockWaits):
+    """Metrics of a connection and its channels
+
+    An instance may only be used by a single connection.
+    """
+
+    def __init__(self, sinks=()):
+        """
+        :param sinks: callables which are called as `sink(samples)` by :meth:`export()`
+        :type sinks: list[Callable]
+        """
+        super(Metrics, self).__init__()
+        #: Sinks which collected metrics are exported to
+        #:
+        #: :type: list[Callable]
+        self.sinks = list(sinks)
+
+        #: Frames received: `{frame_type: count}`
+        #:
+        #: :type: dict[int, int]
+        self.frames_in = defaultdict(int)
+        #: Bytes received, including frame headers: `{frame_type: count}`
+        #:
+        #: :type: dict[int, int]
+        self.bytes_in = defaultdict(int)
+        #: Frames sent: `{frame_type: count}`
+        #:
+        #: :type: dict[int, int]
+        self.frames_out = defaultdict(int)
+        #: Bytes sent, including frame headers: `{frame_type: count}`
+        #:
+        #: :type: dict[int, int]
+        self.bytes_out = defaultdict(int)
+
+        # dict[channel_id int: ChannelMetrics]
+        self._channels = {}
+        self._connection = None
+
+    def bind(self, connection):
+        """Attach these metrics to a connection, whose channel queues are reported as gauges
+
+        This is called by the connection.
+
+        :type connection: amqpy.connection.Connection
+        """
+        self._connection = weakref.ref(connection)
+
+    def channel(self, channel_id):
+        """Get the metrics of a channel
+
+        :param int channel_id: channel ID
+        :rtype: ChannelMetrics
+        """
+        metrics = self._channels.get(channel_id)
+        if metrics is None:
+            metrics = self._channels.setdefault(channel_id, ChannelMetrics(channel_id))
+        return metrics
+
+    def frame_in(self, frame_type, size):
+        """Record a received frame
+
+        :param int frame_type: frame type
+        :param int size: frame size in bytes, including the frame header and end byte
+        """
+        self.frames_in[frame_type] += 1
+        self.bytes_in[frame_type] += size
+
+    def frame_out(self, frame_type, size, count=1):
+        """Record sent frames
+
+        :param int frame_type: frame type
+        :param int size: total size in bytes, including the frame headers and end bytes
+        :param int count: number of frames
+        """
+        self.frames_out[frame_type] += count
+        self.bytes_out[frame_type] += size
+
+    def method_in(self, method):
+        """Record a received method
+
+        :type method: amqpy.proto.Method
+        """
+        self.channel(method.channel_id).methods_in[method.method_type] += 1
+
+    def method_out(self, method, chunk_size):
+        """Record the frames of a sent method
+
+        :param method: method which has been packed and written
+        :param int chunk_size: maximum body frame payload size
+        :type method: amqpy.proto.Method
+        """
+        self.frame_out(FrameType.METHOD, method._method_size + 8)
+        if method.content:
+            self.frame_out(FrameType.HEADER, method._header_size + 8)
+            body_size = (method.content.body_size if method._body_bytes is None
+                         else len(method._body_bytes))
+            frames = -(-body_size // chunk_size)
+            if frames:
+                self.frame_out(FrameType.BODY, body_size + 8 * frames, frames)
+        self.channel(method.channel_id).methods_out[method.method_type] += 1
+
+    def collect(self):
+        """Get all metrics as samples
+
+        :rtype: list[Sample]
+        """
+        samples = []
+        for name, counts in (('amqpy_frames_received_total', self.frames_in),
+                             ('amqpy_frame_bytes_received_total', self.bytes_in),
+                             ('amqpy_frames_sent_total', self.frames_out),
+                             ('amqpy_frame_bytes_sent_total', self.bytes_out)):
+            for frame_type, count in sorted(counts.items()):
+                label = FRAME_TYPE_NAMES.get(frame_type, str(frame_type))
+                samples.append(Sample(name, (('frame_type', label),), count))
+        for lock_name, hist in list(self.lock_wait.items()):
+            samples.extend(hist.samples('amqpy_lock_wait_seconds', (('lock', lock_name),)))
+
+        connection = self._connection() if self._connection is not None else None
+        if connection is not None:
+            for channel_id, channel in sorted(list(connection.channels.items())):
+                samples.append(Sample('amqpy_incoming_methods', (('channel', str(channel_id)),),
+                                      len(channel.incoming_methods)))
+
+        for channel_id in sorted(list(self._channels)):
+            samples.extend(self._channels[channel_id].collect())
+        return samples
+
+    def export(self):
+        """Collect all metrics and pass them to each sink
+
+        Errors raised by sinks are logged.
+        """
+        samples = self.collect()
+        for sink in self.sinks:
+            try:
+                sink(samples)
+            except Exception as exc:
+                log.warning('Failed to export metrics to {!r}: {!r}'.format(sink, exc))
+
+
+def _family(name):
+    """Get the metric family of a sample name
+    """
+    if name not in _FAMILIES:
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in _FAMILIES:
+                return name[:-len(suffix)]
+    return name
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def prometheus_text(samples):
+    """Format samples in the Prometheus text exposition format
+
+    :type samples: list[Sample]
+    :rtype: str
+    """
+    # the samples of each family must be listed together, while collected samples are grouped by
+    # channel
+    order = dict((name, i) for i, name in enumerate(_FAMILIES))
+    samples = sorted(samples, key=lambda sample: order.get(_family(sample.name), len(order)))
+
+    lines = []
+    family = None
+    for sample in samples:
+        if _family(sample.name) != family:
+            family = _family(sample.name)
+            lines.append('# TYPE {} {}'.format(family, _FAMILIES.get(family, 'untyped')))
+        if sample.labels:
+            labels = ','.join('{}="{}"'.format(k, _escape(v)) for k, v in sample.labels)
+            lines.append('{}{{{}}} {}'.format(sample.name, labels, sample.value))
+        else:
+            lines.append('{} {}'.format(sample.name, sample.value))
+    return '\n'.join(lines) + '\n'
+
+
+class StatsdSink:
+    """Send samples to a statsd server over UDP, as gauges
+
+    Label values are appended to the metric name, e.g. `amqpy.frames_received_total.method`.
+    Histograms are sent as their `_count` and `_sum` only.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8125, prefix='amqpy', max_packet_size=1400):
+        """
+        :param str host: statsd host
+        :param int port: statsd port
+        :param str prefix: prefix of metric names
+        :param int max_packet_size: maximum size of a UDP packet in bytes
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+        self.max_packet_size = max_packet_size
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def format(self, samples):
+        """Format samples as statsd gauge lines
+
+        :type samples: list[Sample]
+        :rtype: list[str]
+        """
+        lines = []
+        for sample in samples:
+            if sample.name.endswith('_bucket'):
+                continue
+            parts = [self.prefix, sample.name[len('amqpy_'):]]
+            parts.extend(_statsd_escape(v) for k, v in sample.labels)
+            lines.append('{}:{}|g'.format('.'.join(parts), sample.value))
+        return lines
+
+    def __call__(self, samples):
+        packet = []
+        size = 0
+        for line in self.format(samples):
+            if packet and size + len(line) + 1 > self.max_packet_size:
+                self._send(packet)
+                packet = []
+                size = 0
+            packet.append(line)
+            size += len(line) + 1
+        if packet:
+            self._send(packet)
+
+    def _send(self, lines):
+        self._sock.sendto('\n'.join(lines).encode('utf-8'), self.address)
+
+    def close(self):
+        self._sock.close()
+
+
+def _statsd_escape(value):
+    value = str(value)
+    for c in '.:|@# ':
+        value = value.replace(c, '_')
+    return value
+
+
+class PrometheusSink:
+    """Write samples to a file in the Prometheus text format, e.g. for the node exporter's textfile
+    collector
+
+    The file is replaced atomically.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: path of the file to write
+        """
+        self.path = path
+
+    def __call__(self, samples):
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(prometheus_text(samples))
+        os.rename(tmp_path, self.path)
@@ -0,0 +1,416 @@
+"""Connection and channel pools
+
+Opening a connection takes a TCP (and possibly TLS) handshake followed by the AMQP Start, Tune and
+Open exchange, and opening a channel takes another round trip. Applications which publish a few
+messages per request, such as web workers, can keep connections and channels open in a pool and
+lease them for each request instead.
+
+Example::
+
+    pool = ConnectionPool(max_size=4, host='localhost', userid='guest', password='guest')
+
+    with pool.channel(Channel.CH_MODE_CONFIRM) as ch:
+        ch.basic_publish(Message('Hello, world!'), 'amq.topic', 'greetings')
+
+A leased connection is used by one thread at a time. To share a single connection between
+threads, use a :class:`ChannelPool` directly.
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import logging
+import socket
+import time
+from collections import deque
+from contextlib import contextmanager
+from threading import Condition
+
+from . import compat
+from .channel import Channel
+from .connection import Connection
+from .exceptions import AMQPConnectionError, Timeout
+
+compat.patch()  # monkey-patch time.monotonic
+
+log = logging.getLogger('amqpy')
+
+__all__ = ['ChannelPool', 'ConnectionPool']
+
+
+def _close_quietly(obj):
+    """Close a connection or channel which is being discarded, ignoring errors
+
+    :type obj: amqpy.connection.Connection or amqpy.channel.Channel
+    """
+    try:
+        obj.close()
+    except Exception as exc:
+        log.debug('Error closing pooled {}: {!r}'.format(type(obj).__name__, exc))
+
+
+def _remaining(deadline):
+    """Get the time left until `deadline`
+
+    :raise amqpy.exceptions.Timeout: if the deadline has passed
+    """
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise Timeout()
+    return remaining
+
+
+class ChannelPool:
+    """Thread-safe pool of open channels on a connection
+
+    Idle channels are kept separately for each channel mode (:attr:`Channel.mode
+    <amqpy.channel.Channel.mode>`), so that a channel in publisher confirm or transaction mode is
+    only leased to a caller which asks for that mode. A channel which is released in a different
+    mode than it was leased in is pooled under its new mode.
+
+    Channels which have been closed are discarded on release. A channel which the server closes
+    with a channel error is reopened in the default mode, and is pooled under that mode.
+    """
+
+    def __init__(self, connection, max_size=None, max_idle_time=None):
+        """
+        :param connection: connection to open channels on
+        :param max_size: maximum number of open channels, leased and idle; defaults to the
+            connection's `channel_max`
+        :param max_idle_time: close channels which have been idle for longer than this, in seconds
+        :type connection: amqpy.connection.Connection
+        :type max_size: int or None
+        :type max_idle_time: float or None
+        """
+        self.connection = connection
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+
+        # idle channels for each mode, most recently released last
+        # dict[mode int: deque[(Channel, released_at float)]]
+        self._idle = {}
+        # number of open channels, leased and idle
+        self._size = 0
+        self._closed = False
+        self._cond = Condition()
+
+    def acquire(self, mode=Channel.CH_MODE_NONE, timeout=None):
+        """Lease a channel
+
+        :param int mode: channel mode: :attr:`Channel.CH_MODE_NONE`,
+            :attr:`Channel.CH_MODE_CONFIRM` or :attr:`Channel.CH_MODE_TX`
+        :param timeout: maximum time to wait for a channel if the pool is at its maximum size
+        :type timeout: float or None
+        :return: open channel in the requested mode
+        :rtype: amqpy.channel.Channel
+        :raise amqpy.exceptions.Timeout: if no channel becomes available in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        max_size = self.max_size or self.connection.channel_max
+        discard = []
+        try:
+            with self._cond:
+                while True:
+                    discard.extend(self._evict_idle())
+                    idle = self._idle.get(mode)
+                    while idle:
+                        channel, _ = idle.pop()
+                        if channel.is_open and channel.connection is not None:
+                            return channel
+                        self._size -= 1
+
+                    if self._size < max_size:
+                        self._size += 1
+                        break
+
+                    # make room by closing the least recently used idle channel of another mode
+                    oldest = None
+                    for idle in self._idle.values():
+                        if idle and (oldest is None or idle[0][1] < oldest[0][1]):
+                            oldest = idle
+                    if oldest is not None:
+                        discard.append(oldest.popleft()[0])
+                        self._size -= 1
+                        continue
+
+                    self._cond.wait(_remaining(deadline))
+        finally:
+            for channel in discard:
+                _close_quietly(channel)
+
+        try:
+            return self._open(mode)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _open(self, mode):
+        """Open a new channel in `mode`
+
+        :rtype: amqpy.channel.Channel
+        """
+        channel = self.connection.channel()
+        if mode == Channel.CH_MODE_CONFIRM:
+            channel.confirm_select()
+        elif mode == Channel.CH_MODE_TX:
+            channel.tx_select()
+        return channel
+
+    def release(self, channel, discard=False):
+        """Return a leased channel to the pool
+
+        :param channel: channel leased from this pool
+        :param bool discard: close the channel instead of keeping it in the pool
+        :type channel: amqpy.channel.Channel
+        """
+        with self._cond:
+            usable = (not discard and not self._closed and channel.is_open and
+                      channel.connection is not None)
+            if usable:
+                self._idle.setdefault(channel.mode, deque()).append((channel, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+        if not usable:
+            _close_quietly(channel)
+
+    @contextmanager
+    def channel(self, mode=Channel.CH_MODE_NONE, timeout=None):
+        """Lease a channel for the duration of a `with` block
+
+        The channel is discarded if the block raises a connection error.
+
+        :param int mode: channel mode
+        :param timeout: maximum time to wait for a channel
+        :type timeout: float or None
+        """
+        channel = self.acquire(mode, timeout)
+        try:
+            yield channel
+        except (AMQPConnectionError, socket.error):
+            self.release(channel, discard=True)
+            raise
+        except BaseException:
+            self.release(channel)
+            raise
+        else:
+            self.release(channel)
+
+    def _evict_idle(self):
+        """Remove channels which have been idle for longer than `max_idle_time`
+
+        Must be called with `_cond` held.
+
+        :return: evicted channels, to be closed after releasing the lock
+        :rtype: list[amqpy.channel.Channel]
+        """
+        if self.max_idle_time is None:
+            return []
+        expired = time.monotonic() - self.max_idle_time
+        evicted = []
+        for idle in self._idle.values():
+            while idle and idle[0][1] < expired:
+                evicted.append(idle.popleft()[0])
+        self._size -= len(evicted)
+        return evicted
+
+    def close(self):
+        """Close all idle channels
+
+        Leased channels are closed when they are released. Channels can still be leased
+        afterwards, but they are not kept in the pool.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [channel for channels in self._idle.values() for channel, _ in channels]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for channel in idle:
+            _close_quietly(channel)
+
+
+class ConnectionPool:
+    """Thread-safe pool of connections
+
+    Idle connections are checked with :meth:`Connection.is_alive()
+    <amqpy.connection.Connection.is_alive>` before they are leased, and connections which are dead
+    or which were released after a connection error are discarded. Each pooled connection has a
+    :class:`ChannelPool`, so that its channels are kept open as well.
+    """
+
+    def __init__(self, max_size=10, max_idle_time=None, max_channels=None, **kwargs):
+        """
+        :param int max_size: maximum number of open connections, leased and idle
+        :param max_idle_time: close connections and channels which have been idle for longer than
+            this, in seconds
+        :param max_channels: maximum number of open channels on each connection
+        :param kwargs: arguments for :class:`~amqpy.connection.Connection`
+        :type max_idle_time: float or None
+        :type max_channels: int or None
+        """
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.max_channels = max_channels
+        self.connection_args = kwargs
+
+        # idle connections, most recently released last: deque[(Connection, released_at float)]
+        self._idle = deque()
+        # number of open connections, leased and idle
+        self._size = 0
+        # channel pools of open connections: dict[Connection: ChannelPool]
+        self._channel_pools = {}
+        self._closed = False
+        self._cond = Condition()
+
+    def acquire(self, timeout=None):
+        """Lease a connection
+
+        :param timeout: maximum time to wait for a connection if the pool is at its maximum size
+        :type timeout: float or None
+        :return: connected connection
+        :rtype: amqpy.connection.Connection
+        :raise amqpy.exceptions.Timeout: if no connection becomes available in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            discard = []
+            connection = None
+            try:
+                with self._cond:
+                    while True:
+                        discard.extend(self._evict_idle())
+                        if self._idle:
+                            connection, _ = self._idle.pop()
+                            break
+                        if self._size < self.max_size:
+                            self._size += 1
+                            break
+                        self._cond.wait(_remaining(deadline))
+            finally:
+                for conn in discard:
+                    self._discard(conn)
+
+            if connection is None:
+                break
+            # check the connection outside the lock, since it may send a heartbeat
+            if connection.is_alive():
+                return connection
+            log.debug('Discard dead pooled connection')
+            with self._cond:
+                self._size -= 1
+            self._discard(connection)
+
+        try:
+            connection = Connection(**self.connection_args)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._channel_pools[connection] = ChannelPool(connection, self.max_channels,
+                                                          self.max_idle_time)
+        return connection
+
+    def release(self, connection, discard=False):
+        """Return a leased connection to the pool
+
+        :param connection: connection leased from this pool
+        :param bool discard: close the connection instead of keeping it in the pool
+        :type connection: amqpy.connection.Connection
+        """
+        with self._cond:
+            usable = not discard and not self._closed and connection.connected
+            if usable:
+                self._idle.append((connection, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+        if not usable:
+            self._discard(connection)
+
+    def channel_pool(self, connection):
+        """Get the channel pool of a connection leased from this pool
+
+        :type connection: amqpy.connection.Connection
+        :rtype: ChannelPool
+        """
+        with self._cond:
+            return self._channel_pools[connection]
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Lease a connection for the duration of a `with` block
+
+        The connection is discarded if the block raises a connection error.
+
+        :param timeout: maximum time to wait for a connection
+        :type timeout: float or None
+        """
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        except (AMQPConnectionError, socket.error):
+            self.release(connection, discard=True)
+            raise
+        except BaseException:
+            self.release(connection)
+            raise
+        else:
+            self.release(connection)
+
+    @contextmanager
+    def channel(self, mode=Channel.CH_MODE_NONE, timeout=None):
+        """Lease a connection and one of its pooled channels for the duration of a `with` block
+
+        :param int mode: channel mode: :attr:`Channel.CH_MODE_NONE`,
+            :attr:`Channel.CH_MODE_CONFIRM` or :attr:`Channel.CH_MODE_TX`
+        :param timeout: maximum time to wait for a connection
+        :type timeout: float or None
+        """
+        with self.connection(timeout) as connection:
+            with self.channel_pool(connection).channel(mode) as channel:
+                yield channel
+
+    def _evict_idle(self):
+        """Remove connections which have been idle for longer than `max_idle_time`
+
+        Must be called with `_cond` held.
+
+        :return: evicted connections, to be closed after releasing the lock
+        :rtype: list[amqpy.connection.Connection]
+        """
+        if self.max_idle_time is None:
+            return []
+        expired = time.monotonic() - self.max_idle_time
+        evicted = []
+        while self._idle and self._idle[0][1] < expired:
+            evicted.append(self._idle.popleft()[0])
+        self._size -= len(evicted)
+        return evicted
+
+    def _discard(self, connection):
+        """Close a connection which has been removed from the pool
+        """
+        with self._cond:
+            self._channel_pools.pop(connection, None)
+        _close_quietly(connection)
+
+    def close(self):
+        """Close all idle connections
+
+        Leased connections are closed when they are released. Connections can still be leased
+        afterwards, but they are not kept in the pool.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for connection in idle:
+            self._discard(connection)
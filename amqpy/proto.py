@@ -3,16 +3,70 @@
 from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
-import six
 import struct
 import logging
+import tempfile
 
 from .serialization import AMQPReader, AMQPWriter
 from .spec import FrameType, method_t
 from .message import Message
+from .exceptions import UnexpectedFrame
 
 log = logging.getLogger('amqpy')
 
+# frame type, channel, payload size
+_frame_header = struct.Struct('>BHI')
+_frame_end = struct.pack('B', FrameType.END)
+# body chunks up to this size are copied into the surrounding frame data when packing frames for
+# writing, rather than being written as separate buffers
+_COALESCE_MAX = 4096
+
+# approximate number of bytes of frames packed per write when sending a streamed body
+_STREAM_BATCH = 256 * 1024
+
+# class-id, method-id
+_method_header = struct.Struct('>HH')
+# class-id, weight, body size
+_content_header = struct.Struct('>HHQ')
+
+
+def _read_chunks(source, chunk_size, size):
+    """Split a streamed message body into chunks
+
+    :param source: binary file object or iterable of bytes
+    :param int chunk_size: maximum chunk size in bytes
+    :param int size: declared body size in bytes
+    :return: generator of chunks
+    :rtype: generator[bytes]
+    :raise ValueError: if the size of the data doesn't match `size`; the frames of the chunks
+        produced so far have already been sent at that point
+    """
+    remaining = size
+    if hasattr(source, 'read'):
+        while remaining > 0:
+            chunk = source.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    else:
+        pending = bytearray()
+        for data in source:
+            pending += data
+            remaining -= len(data)
+            if remaining < 0:
+                break
+            if len(pending) >= chunk_size:
+                n = len(pending) - len(pending) % chunk_size
+                for i in range(0, n, chunk_size):
+                    yield bytes(pending[i:i + chunk_size])
+                del pending[:n]
+        if pending and remaining == 0:
+            yield bytes(pending)
+
+    if remaining != 0:
+        raise ValueError('Streamed message body size does not match `body_size` ({})'.format(size))
+
 
 class Frame:
     """AMQP frame
@@ -30,7 +84,7 @@ class Frame:
         size (bytes)        1       2         4             size             1
     """
 
-    __slots__ = ['data', '_frame_type', '_channel', '_payload_size']
+    __slots__ = ['data', '_frame_type', '_channel', '_payload_size', '_payload']
 
     def __init__(self, frame_type=None, channel=0, payload=bytes()):
         """Create new Frame
@@ -47,21 +101,43 @@ class Frame:
         """
         #: raw frame data; can be manually manipulated at any time
         #:
-        #: :type: bytearray
+        #: Frames read by a buffered transport hold a `memoryview` of the transport's receive
+        #: buffer.
+        #:
+        #: :type: bytearray or bytes or memoryview
         self.data = bytearray()
 
         self._frame_type = None
         self._channel = None
         self._payload_size = None
+        self._payload = None  # payload which was received separately from `data`
 
         # create bytearray from provided data
         if frame_type is not None:
             self._frame_type = frame_type
             self._channel = channel
             self._payload_size = len(payload)
-            frame_format = '>BHI{}sB'.format(self._payload_size)
-            self.data = struct.pack(frame_format, frame_type, channel, self._payload_size, payload,
-                                    FrameType.END)
+            self.data = b''.join((_frame_header.pack(frame_type, channel, self._payload_size),
+                                  payload, _frame_end))
+
+    @classmethod
+    def with_payload(cls, frame_type, channel, payload):
+        """Create a received frame whose payload was read directly into a separate buffer
+
+        The frame's `data` is left empty, and :attr:`payload` is `payload` itself.
+
+        :param int frame_type: frame type
+        :param int channel: channel number
+        :param memoryview payload: view that the payload was (or will be) received into
+        :return: frame
+        :rtype: amqpy.proto.Frame
+        """
+        frame = cls()
+        frame._frame_type = frame_type
+        frame._channel = channel
+        frame._payload_size = len(payload)
+        frame._payload = payload
+        return frame
 
     @property
     def frame_type(self):
@@ -106,10 +182,14 @@ class Frame:
     def payload(self):
         """Get frame payload
 
+        The payload is a view of the frame data, not a copy.
+
         :return: payload
-        :rtype: bytearray
+        :rtype: memoryview
         """
-        return self.data[7:-1]
+        if self._payload is not None:
+            return self._payload
+        return memoryview(self.data)[7:-1]
 
 
 class Method:
@@ -141,7 +221,8 @@ class Method:
     The format of the `FrameType.BODY` frame's payload is simply raw binary data of the message
     body.
     """
-    __slots__ = ['method_type', 'args', 'content', 'channel_id', '_body_bytes', '_expected_body_size']
+    __slots__ = ['method_type', 'args', 'content', 'channel_id', '_body_bytes', '_body_buffer',
+                 '_body_file', '_body_size', '_expected_body_size', '_method_size', '_header_size']
 
     def __init__(self, method_type=None, args=None, content=None, channel_id=None):
         """
@@ -170,7 +251,13 @@ class Method:
         self.channel_id = channel_id
 
         self._body_bytes = bytearray()  # used internally to store encoded GenericContent body
+        self._body_buffer = None  # preallocated buffer that a multi-frame body is assembled in
+        self._body_file = None  # temporary file that a large received body is spooled to
+        self._body_size = 0  # number of body bytes received so far
         self._expected_body_size = None  # set automatically when `load_header_frame()` is called
+        # payload sizes of the method and header frames, set when the method is packed
+        self._method_size = 0
+        self._header_size = 0
 
     def load_method_frame(self, frame):
         """Load method frame payload data
@@ -178,42 +265,129 @@ class Method:
         This method is intended to be called when constructing a `Method` from incoming data.
 
         After calling, `self.method_type`, `self.args`, and `self.channel_id` will be loaded with
-        data from the frame.
+        data from the frame. `self.args` reads directly from the frame's payload, without copying
+        it.
 
         :param frame: `FrameType.METHOD` frame
         :type frame: amqpy.proto.Frame
         """
+        payload = frame.payload
         # noinspection PyTypeChecker
-        self.method_type = method_t(*struct.unpack('>HH', frame.payload[:4]))
-        self.args = AMQPReader(frame.payload[4:])
+        self.method_type = method_t(*_method_header.unpack_from(payload))
+        self.args = AMQPReader(payload[4:])
         self.channel_id = frame.channel
 
-    def load_header_frame(self, frame):
+    def load_header_frame(self, frame, spool_threshold=None):
         """Add header to partial method
 
         This method is intended to be called when constructing a `Method` from incoming data.
 
         :param frame: `FrameType.HEADER` frame
+        :param spool_threshold: bodies larger than this many bytes are written to a temporary file
+            as their frames arrive, rather than being assembled in memory
         :type frame: amqpy.proto.Frame
+        :type spool_threshold: int or None
         """
         if not self.content:
             self.content = Message()
 
+        payload = frame.payload
         # noinspection PyTypeChecker
-        class_id, weight, self._expected_body_size = struct.unpack('>HHQ', frame.payload[:12])
-        self.content.load_properties(frame.payload[12:])
+        class_id, weight, self._expected_body_size = _content_header.unpack_from(payload)
+        self.content.load_properties(payload[12:])
+        if spool_threshold is not None and self._expected_body_size > spool_threshold:
+            self._body_file = tempfile.TemporaryFile()
+
+    def body_buffer(self, size):
+        """Get the destination for the payload of the next body frame
+
+        A buffer of the full body size is allocated when the body spans more than one frame, i.e.
+        when the next frame doesn't complete the body. The payloads of the frames are placed at
+        their offsets in that buffer, which becomes the message body once it is complete, without
+        being copied again.
+
+        This method is intended to be called when constructing a `Method` from incoming data.
+
+        :param int size: payload size of the next body frame
+        :return: writable view of `size` bytes in the body buffer, or None if the payload isn't
+            placed in a body buffer
+        :rtype: memoryview or None
+        """
+        if self._body_file is not None:
+            return None
+
+        offset = self._body_size
+        if self._body_buffer is None:
+            if offset + size >= self._expected_body_size:
+                return None
+            self._body_buffer = bytearray(self._expected_body_size)
+
+        if offset + size > len(self._body_buffer):
+            return None
+        return memoryview(self._body_buffer)[offset:offset + size]
 
     def load_body_frame(self, frame):
         """Add content to partial method
 
         This method is intended to be called when constructing a `Method` from incoming data.
 
+        A body which is received in a single frame is copied out of the frame into a `bytes` body.
+        A body which spans several frames is assembled in a buffer preallocated from the size in
+        the content header (see :meth:`body_buffer()`), and the completed `bytearray` becomes the
+        message body. If the body is being spooled to a temporary file, each payload is written to
+        the file instead, and the message body is set to the file once it is complete.
+
         :param frame: `FrameType.BODY` frame
         :type frame: amqpy.proto.Frame
         """
-        self._body_bytes.extend(frame.payload)
+        payload = frame.payload
+        size = len(payload)
+        if self._body_file is not None:
+            self._body_size += size
+            self._body_file.write(payload)
+            if self.complete:
+                self._body_file.seek(0)
+                self.content.body = self._body_file
+                self.content.body_size = self._body_size
+                self._body_file = None
+            return
+
+        if frame._payload is None:
+            # the payload is in the frame data, rather than already in the body buffer
+            dest = self.body_buffer(size)
+            if dest is None:
+                if self._body_buffer is None and self._body_size + size == self._expected_body_size:
+                    # the whole body is in this frame
+                    self._body_size += size
+                    self.content.body = payload.tobytes()
+                    return
+                raise UnexpectedFrame('Received more body data than declared in the content '
+                                      'header ({} bytes)'.format(self._expected_body_size))
+            dest[:] = payload
+
+        self._body_size += size
         if self.complete:
-            self.content.body = bytes(self._body_bytes)
+            self.content.body, self._body_buffer = self._body_buffer, None
+
+    def detach(self):
+        """Copy any data this method references in the transport's receive buffer
+
+        Received methods read their arguments directly from the receive buffer. This method should
+        be called on methods which are kept around for a while, such as methods queued for a
+        channel which isn't currently waiting for them, so that they don't keep old receive buffers
+        alive.
+        """
+        if isinstance(self.args, AMQPReader):
+            self.args.detach()
+
+    @property
+    def body_size(self):
+        """Size of the message body carried by this method, as declared in the content header
+
+        :return: body size in bytes, or None if the content header has not been loaded
+        :rtype: int or None
+        """
+        return self._expected_body_size
 
     @property
     def complete(self):
@@ -225,7 +399,7 @@ class Method:
         :return: True if method is complete, else False
         :rtype: bool
         """
-        return self._expected_body_size == 0 or len(self._body_bytes) == self._expected_body_size
+        return self._expected_body_size == 0 or self._body_size == self._expected_body_size
 
     def _pack_method(self):
         """Pack this method into a bytes object suitable for using as a payload for
@@ -237,8 +411,8 @@ class Method:
         :return: bytes
         :rtype: bytes
         """
-        return struct.pack('>HH', self.method_type.class_id,
-                           self.method_type.method_id) + self.args.getvalue()
+        return _method_header.pack(self.method_type.class_id,
+                                   self.method_type.method_id) + self.args.getvalue()
 
     def _pack_header(self):
         """Pack this method into a bytes object suitable for using as a payload for
@@ -253,17 +427,18 @@ class Method:
         if not self.content:
             raise ValueError('`_pack_header()` is only meaningful if there is content to pack')
 
-        self._body_bytes = self.content.body
-        if isinstance(self._body_bytes, six.string_types):
-            # encode body to bytes
-            coding = self.content.properties.setdefault('content_encoding', 'UTF-8')
-            try:
-                self._body_bytes = self.content.body.encode(coding)
-            except LookupError:
-                self._body_bytes = self.content.body
+        if self.content.body_is_stream:
+            # the body is read by `_pack_body()`
+            self._body_bytes = None
+            properties = self.content.serialize_properties()
+            return (_content_header.pack(self.method_type.class_id, 0, self.content.body_size)
+                    + properties)
+
+        self._body_bytes = self.content.encode_body()
 
         properties = self.content.serialize_properties()
-        return struct.pack('>HHQ', self.method_type.class_id, 0, len(self._body_bytes)) + properties
+        return (_content_header.pack(self.method_type.class_id, 0, len(self._body_bytes))
+                + properties)
 
     def _pack_body(self, chunk_size):
         """Pack this method into a bytes object suitable for using as a payload for
@@ -280,8 +455,106 @@ class Method:
         if not self.content:
             raise ValueError('`_pack_body()` is only meaningful if there is content to pack')
 
-        for i in range(0, len(self._body_bytes), chunk_size):
-            yield self._body_bytes[i:i + chunk_size]
+        if self._body_bytes is None:
+            for chunk in _read_chunks(self.content.body, chunk_size, self.content.body_size):
+                yield chunk
+            return
+
+        body = memoryview(self._body_bytes)
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+    def pack_frames(self, chunk_size, buffers=None):
+        """Pack this method and its content (if any) into a list of buffers which together hold
+        the complete frames, ready to be written to the transport in a single call
+
+        The method frame, header frame, and frame headers are packed together into contiguous
+        buffers. Body chunks larger than `_COALESCE_MAX` are not copied: they are included as views
+        of the encoded body.
+
+        This method is intended to be called when sending frames for an already-completed `Method`.
+
+        :param chunk_size: body chunk size in bytes; this is typically the maximum frame size - 8
+        :param buffers: list of buffers (as returned by a previous call) to append the frames to; if
+            the list ends with a `bytearray`, the frames are appended to it rather than starting a
+            new buffer
+        :type chunk_size: int
+        :type buffers: list or None
+        :return: list of buffers
+        :rtype: list[bytes or bytearray or memoryview]
+        """
+        channel_id = self.channel_id
+        if buffers is None:
+            buffers = []
+
+        if buffers and isinstance(buffers[-1], bytearray):
+            out = buffers.pop()
+        else:
+            out = bytearray()
+
+        self._pack_method_and_header(out)
+        if self.content:
+            for chunk in self._pack_body(chunk_size):
+                out += _frame_header.pack(FrameType.BODY, channel_id, len(chunk))
+                if len(chunk) > _COALESCE_MAX:
+                    buffers.append(out)
+                    buffers.append(chunk)
+                    out = bytearray()
+                else:
+                    out += chunk
+                out += _frame_end
+
+        buffers.append(out)
+        return buffers
+
+    def _pack_method_and_header(self, out):
+        """Append the method frame, and the header frame if this method carries content, to `out`
+
+        :param bytearray out: output buffer
+        """
+        channel_id = self.channel_id
+        method_payload = self._pack_method()
+        self._method_size = len(method_payload)
+        out += _frame_header.pack(FrameType.METHOD, channel_id, len(method_payload))
+        out += method_payload
+        out += _frame_end
+
+        if self.content:
+            header_payload = self._pack_header()
+            self._header_size = len(header_payload)
+            out += _frame_header.pack(FrameType.HEADER, channel_id, len(header_payload))
+            out += header_payload
+            out += _frame_end
+
+    def pack_frame_batches(self, chunk_size, batch_size=_STREAM_BATCH):
+        """Pack this method and its content (if any) into successive lists of buffers, each holding
+        roughly `batch_size` bytes of complete frames
+
+        Unlike :meth:`pack_frames()`, the body is only read as the batches are consumed, so a
+        streamed body (see :class:`~amqpy.message.Message`) is never held in memory as a whole.
+
+        This method is intended to be called when sending frames for an already-completed `Method`.
+
+        :param chunk_size: body chunk size in bytes; this is typically the maximum frame size - 8
+        :param batch_size: number of bytes after which a batch is produced
+        :type chunk_size: int
+        :type batch_size: int
+        :return: generator of lists of buffers
+        :rtype: generator[list[bytearray]]
+        """
+        channel_id = self.channel_id
+        out = bytearray()
+        self._pack_method_and_header(out)
+        if self.content:
+            for chunk in self._pack_body(chunk_size):
+                out += _frame_header.pack(FrameType.BODY, channel_id, len(chunk))
+                out += chunk
+                out += _frame_end
+                if len(out) >= batch_size:
+                    yield [out]
+                    out = bytearray()
+        if out:
+            yield [out]
 
     def dump_method_frame(self):
         """Create a method frame
@@ -0,0 +1,205 @@
+"""Topology recording for automatic connection recovery
+
+A connection created with `auto_recover=True` records the exchanges, queues and bindings declared
+on its channels in a :class:`Topology`. After the connection is lost and reconnected, the topology
+is declared again, followed by the mode, prefetch limits and consumers of each channel (see
+:meth:`amqpy.connection.Connection.recover()`).
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import logging
+from collections import OrderedDict
+from threading import Lock
+
+from . import spec
+from .exceptions import ChannelError
+from .method_codecs import pack_args
+from .proto import Method
+
+log = logging.getLogger('amqpy')
+
+# placeholder for the `nowait` argument of recorded declarations
+_NOWAIT = object()
+
+__all__ = ['Topology', 'RECOVERABLE_CLOSE_CODES']
+
+#: Reply codes of a server-initiated `Connection.Close` after which the connection is recovered:
+#: `CONNECTION_FORCED` (320, e.g. the broker is restarting), `RESOURCE_ERROR` (506) and
+#: `INTERNAL_ERROR` (541). Other codes are caused by client errors, which reconnecting won't fix.
+RECOVERABLE_CLOSE_CODES = frozenset([320, 506, 541])
+
+
+class Topology:
+    """Record of the exchanges, queues and bindings declared on a connection
+
+    Declarations are recorded in order, and removed again when the exchange or queue is deleted or
+    the binding is unbound. Passive declarations are not recorded.
+    """
+
+    def __init__(self):
+        #: Declared exchanges: `{name: (exch_type, durable, auto_delete, arguments)}`
+        #:
+        #: :type: OrderedDict[str, tuple]
+        self.exchanges = OrderedDict()
+
+        #: Declared queues: `{name: (durable, exclusive, auto_delete, arguments, server_named)}`
+        #:
+        #: :type: OrderedDict[str, tuple]
+        self.queues = OrderedDict()
+
+        #: Exchange to exchange bindings: `{(dest_exch, source_exch, routing_key): arguments}`
+        #:
+        #: :type: OrderedDict[tuple, dict]
+        self.exchange_bindings = OrderedDict()
+
+        #: Queue bindings: `{(queue, exchange, routing_key): arguments}`
+        #:
+        #: :type: OrderedDict[tuple, dict]
+        self.queue_bindings = OrderedDict()
+
+        # channels may declare topology from several threads
+        self._lock = Lock()
+
+    def declare_exchange(self, exchange, exch_type, durable, auto_delete, arguments):
+        with self._lock:
+            self.exchanges[exchange] = (exch_type, durable, auto_delete, arguments)
+
+    def delete_exchange(self, exchange):
+        with self._lock:
+            self.exchanges.pop(exchange, None)
+            for key in list(self.exchange_bindings):
+                if exchange in key[:2]:
+                    del self.exchange_bindings[key]
+            for key in list(self.queue_bindings):
+                if key[1] == exchange:
+                    del self.queue_bindings[key]
+
+    def declare_queue(self, queue, durable, exclusive, auto_delete, arguments, server_named):
+        with self._lock:
+            self.queues[queue] = (durable, exclusive, auto_delete, arguments, server_named)
+
+    def delete_queue(self, queue):
+        with self._lock:
+            self.queues.pop(queue, None)
+            for key in list(self.queue_bindings):
+                if key[0] == queue:
+                    del self.queue_bindings[key]
+
+    def bind_exchange(self, dest_exch, source_exch, routing_key, arguments):
+        with self._lock:
+            self.exchange_bindings[(dest_exch, source_exch, routing_key)] = arguments
+
+    def unbind_exchange(self, dest_exch, source_exch, routing_key):
+        with self._lock:
+            self.exchange_bindings.pop((dest_exch, source_exch, routing_key), None)
+
+    def bind_queue(self, queue, exchange, routing_key, arguments):
+        with self._lock:
+            self.queue_bindings[(queue, exchange, routing_key)] = arguments
+
+    def unbind_queue(self, queue, exchange, routing_key):
+        with self._lock:
+            self.queue_bindings.pop((queue, exchange, routing_key), None)
+
+    def _rename_queue(self, old, new):
+        """Replace the name of a server-named queue which was declared again
+
+        Must be called with `_lock` held.
+        """
+        self.queues = OrderedDict((new if name == old else name, value)
+                                  for name, value in self.queues.items())
+        self.queue_bindings = OrderedDict(((new if key[0] == old else key[0],) + key[1:], value)
+                                          for key, value in self.queue_bindings.items())
+
+    def replay(self, channel):
+        """Declare the recorded topology on `channel`
+
+        Server-named queues are declared first, one at a time, since the server gives them new
+        names; the records are updated with the new names. Everything else is declared with
+        `nowait` set, in a single write, followed by a round trip to make sure that all of it was
+        accepted. If the server rejects a declaration, which also discards the declarations after
+        it, the declarations are repeated one at a time, and those which fail are logged and
+        skipped.
+
+        :param channel: open channel, used only for the replay
+        :type channel: amqpy.channel.Channel
+        :return: `{old_name: new_name}` of server-named queues
+        :rtype: dict[str, str]
+        """
+        renamed = {}
+        with self._lock:
+            for queue, (durable, exclusive, auto_delete, arguments, server_named) in list(
+                    self.queues.items()):
+                if server_named:
+                    args = pack_args(spec.Queue.Declare, 0, '', False, durable, exclusive,
+                                     auto_delete, False, arguments)
+                    channel._send_method(Method(spec.Queue.Declare, args))
+                    renamed[queue] = channel.wait(spec.Queue.DeclareOk).queue
+                    self._rename_queue(queue, renamed[queue])
+            declarations = self._declarations()
+
+        if not declarations:
+            return renamed
+
+        try:
+            channel.connection.method_writer.write_methods(
+                [Method(method_type, packer(True), None, channel.channel_id)
+                 for method_type, _, packer in declarations])
+            # the server handles methods in order, so a reply to a synchronous method means that
+            # all of the declarations were accepted
+            channel.basic_qos(0, 0, False)
+        except ChannelError as exc:
+            log.warning('Failed to recover topology in a batch ({!r}), retrying one at a time'
+                        .format(exc))
+            for method_type, ok_type, packer in declarations:
+                try:
+                    channel._send_method(Method(method_type, packer(False)))
+                    channel.wait(ok_type)
+                except ChannelError as exc:
+                    log.warning('Failed to recover {}: {!r}'.format(method_type, exc))
+        return renamed
+
+    def _declarations(self):
+        """Build the methods which declare the recorded topology, in dependency order
+
+        Must be called with `_lock` held.
+
+        :return: `[(method_type, ok_method_type, packer)]`, where `packer(nowait)` packs the
+            method arguments
+        :rtype: list[(spec.method_t, spec.method_t, Callable)]
+        """
+        declarations = []
+        for exchange, (exch_type, durable, auto_delete, arguments) in self.exchanges.items():
+            declarations.append((spec.Exchange.Declare, spec.Exchange.DeclareOk, _packer(
+                spec.Exchange.Declare, 0, exchange, exch_type, False, durable, auto_delete, False,
+                _NOWAIT, arguments)))
+        for queue, (durable, exclusive, auto_delete, arguments, server_named) in \
+                self.queues.items():
+            if server_named:
+                # declared already, by `replay()`
+                continue
+            declarations.append((spec.Queue.Declare, spec.Queue.DeclareOk, _packer(
+                spec.Queue.Declare, 0, queue, False, durable, exclusive, auto_delete, _NOWAIT,
+                arguments)))
+        for (dest_exch, source_exch, routing_key), arguments in self.exchange_bindings.items():
+            declarations.append((spec.Exchange.Bind, spec.Exchange.BindOk, _packer(
+                spec.Exchange.Bind, 0, dest_exch, source_exch, routing_key, _NOWAIT, arguments)))
+        for (queue, exchange, routing_key), arguments in self.queue_bindings.items():
+            declarations.append((spec.Queue.Bind, spec.Queue.BindOk, _packer(
+                spec.Queue.Bind, 0, queue, exchange, routing_key, _NOWAIT, arguments)))
+        return declarations
+
+
+def _packer(method_type, *args):
+    """Create a function which packs `args` for `method_type`, with the `nowait` argument (given
+    as `_NOWAIT` in `args`) filled in
+    """
+    index = args.index(_NOWAIT)
+
+    def pack(nowait):
+        values = list(args)
+        values[index] = nowait
+        return pack_args(method_type, *values)
+
+    return pack
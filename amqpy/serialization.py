@@ -7,11 +7,38 @@ import six
 import io
 from datetime import datetime
 from decimal import Decimal
-from struct import pack, unpack
+from struct import Struct
 from time import mktime
 
 from .exceptions import FrameSyntaxError
 
+# precompiled codecs for the fixed-size types
+_octet = Struct('B')
+_short = Struct('>H')
+_long = Struct('>I')
+_longlong = Struct('>Q')
+_double = Struct('>d')
+_signed_long = Struct('>i')
+_timestamp = Struct('>q')
+
+# field value types which are stored as a single fixed-size value: {type octet: (codec, size)}
+_FIXED_ITEMS = {
+    98: (Struct('>b'), 1),  # 'b': short-short int
+    66: (_octet, 1),  # 'B': short-short unsigned int
+    85: (Struct('>h'), 2),  # 'U': short int
+    117: (_short, 2),  # 'u': short unsigned int
+    73: (_signed_long, 4),  # 'I': long int
+    105: (_long, 4),  # 'i': long unsigned int
+    76: (Struct('>q'), 8),  # 'L': long long int
+    108: (_longlong, 8),  # 'l': long long unsigned int
+    102: (Struct('>f'), 4),  # 'f': float
+    100: (_double, 8),  # 'd': double
+}
+
+_bool_item = Struct('>cB')
+_double_item = Struct('>cd')
+_int_item = Struct('>ci')
+
 
 def byte(n):
     return bytes([n])
@@ -19,40 +46,64 @@ def byte(n):
 
 class AMQPReader:
     """Read higher-level AMQP types from a bytestream
+
+    The reader reads directly from the source buffer, keeping track of its current offset, so
+    creating a reader for a frame payload does not copy the payload.
     """
-    __slots__ = ['input', 'bit_count', 'bits']
+    __slots__ = ['buf', 'pos', 'bit_count', 'bits']
 
     def __init__(self, source):
         """
         :param source: source bytes or file-like object
-        :type source: io.BytesIO or bytes or bytearray
+        :type source: bytes or bytearray or memoryview or io.BytesIO
         """
-        if isinstance(source, (bytes, bytearray)):
-            self.input = io.BytesIO(source)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self.buf = memoryview(source)
+            self.pos = 0
         elif isinstance(source, io.BytesIO):
-            self.input = source
+            self.buf = memoryview(source.getvalue())
+            self.pos = source.tell()
         else:
-            raise TypeError('AMQPReader needs an `io.BytesIO` or `bytes` or `bytearray`')
+            raise TypeError('AMQPReader needs an `io.BytesIO` or `bytes` or `bytearray` or '
+                            '`memoryview`')
 
         self.bit_count = self.bits = 0
 
     def close(self):
-        self.input.close()
+        self.buf = memoryview(bytes())
+        self.pos = 0
+
+    def detach(self):
+        """Copy the unread part of the source buffer, so that the reader no longer references the
+        source
+        """
+        self.buf = memoryview(self.buf[self.pos:].tobytes())
+        self.pos = 0
 
     def getvalue(self):
-        return self.input.getvalue()
+        return self.buf.tobytes()
+
+    def _read(self, n):
+        """Consume `n` bytes and return a view of them
+        """
+        pos = self.pos
+        self.pos = pos + n
+        return self.buf[pos:pos + n]
 
     def read(self, n=-1):
         """Read n bytes
         """
         self.bit_count = self.bits = 0
-        return self.input.read(n)
+        if n < 0:
+            n = len(self.buf) - self.pos
+        return self._read(n).tobytes()
 
     def read_bit(self):
         """Read a single boolean value
         """
         if not self.bit_count:
-            self.bits = ord(self.input.read(1))
+            self.bits, = _octet.unpack_from(self.buf, self.pos)
+            self.pos += 1
             self.bit_count = 8
         result = (self.bits & 1) == 1
         self.bits >>= 1
@@ -63,30 +114,40 @@ class AMQPReader:
         """Read one byte, return as an integer
         """
         self.bit_count = self.bits = 0
-        return unpack('B', self.input.read(1))[0]
+        val, = _octet.unpack_from(self.buf, self.pos)
+        self.pos += 1
+        return val
 
     def read_short(self):
         """Read an unsigned 16-bit integer
         """
         self.bit_count = self.bits = 0
-        return unpack('>H', self.input.read(2))[0]
+        val, = _short.unpack_from(self.buf, self.pos)
+        self.pos += 2
+        return val
 
     def read_long(self):
         """Read an unsigned 32-bit integer
         """
         self.bit_count = self.bits = 0
-        return unpack('>I', self.input.read(4))[0]
+        val, = _long.unpack_from(self.buf, self.pos)
+        self.pos += 4
+        return val
 
     def read_longlong(self):
         """Read an unsigned 64-bit integer
         """
         self.bit_count = self.bits = 0
-        return unpack('>Q', self.input.read(8))[0]
+        val, = _longlong.unpack_from(self.buf, self.pos)
+        self.pos += 8
+        return val
 
     def read_float(self):
         """Read float value."""
         self.bit_count = self.bits = 0
-        return unpack('>d', self.input.read(8))[0]
+        val, = _double.unpack_from(self.buf, self.pos)
+        self.pos += 8
+        return val
 
     def read_shortstr(self):
         """Read a short string that's stored in up to 255 bytes
@@ -94,8 +155,10 @@ class AMQPReader:
         The encoding isn't specified in the AMQP spec, so assume it's utf-8
         """
         self.bit_count = self.bits = 0
-        slen = unpack('B', self.input.read(1))[0]
-        return self.input.read(slen).decode('utf-8')
+        pos = self.pos
+        end = pos + 1 + _octet.unpack_from(self.buf, pos)[0]
+        self.pos = end
+        return self.buf[pos + 1:end].tobytes().decode('utf-8')
 
     def read_longstr(self):
         """Read a string that's up to 2**32 bytes
@@ -103,65 +166,54 @@ class AMQPReader:
         The encoding isn't specified in the AMQP spec, so assume it's utf-8
         """
         self.bit_count = self.bits = 0
-        slen = unpack('>I', self.input.read(4))[0]
-        return self.input.read(slen).decode('utf-8')
+        pos = self.pos
+        end = pos + 4 + _long.unpack_from(self.buf, pos)[0]
+        self.pos = end
+        return self.buf[pos + 4:end].tobytes().decode('utf-8')
 
     def read_table(self):
         """Read an AMQP table, and return as a Python dictionary
         """
         self.bit_count = self.bits = 0
-        tlen = unpack('>I', self.input.read(4))[0]
-        table_data = AMQPReader(self.input.read(tlen))
+        buf = self.buf
+        pos = self.pos
+        end = pos + 4 + _long.unpack_from(buf, pos)[0]
+        pos += 4
         result = {}
-        while table_data.input.tell() < tlen:
-            name = table_data.read_shortstr()
-            val = table_data.read_item()
-            result[name] = val
+        while pos < end:
+            # inlined `read_shortstr()`
+            name_end = pos + 1 + _octet.unpack_from(buf, pos)[0]
+            name = buf[pos + 1:name_end].tobytes().decode('utf-8')
+            self.pos = name_end
+            result[name] = self.read_item()
+            pos = self.pos
+        self.pos = end
         return result
 
     def read_item(self):
-        ftype = ord(self.input.read(1))
-
+        buf = self.buf
+        pos = self.pos
+        ftype, = _octet.unpack_from(buf, pos)
+        pos += 1
+
+        fixed = _FIXED_ITEMS.get(ftype)
+        if fixed is not None:
+            codec, size = fixed
+            self.pos = pos + size
+            return codec.unpack_from(buf, pos)[0]
+
+        self.pos = pos
         # 'S': long string
         if ftype == 83:
             val = self.read_longstr()
         # 's': short string
         elif ftype == 115:
             val = self.read_shortstr()
-        # 'b': short-short int
-        elif ftype == 98:
-            val, = unpack('>B', self.input.read(1))
-        # 'B': short-short unsigned int
-        elif ftype == 66:
-            val, = unpack('>b', self.input.read(1))
-        # 'U': short int
-        elif ftype == 85:
-            val, = unpack('>h', self.input.read(2))
-        # 'u': short unsigned int
-        elif ftype == 117:
-            val, = unpack('>H', self.input.read(2))
-        # 'I': long int
-        elif ftype == 73:
-            val, = unpack('>i', self.input.read(4))
-        # 'i': long unsigned int
-        elif ftype == 105:  # 'l'
-            val, = unpack('>I', self.input.read(4))
-        # 'L': long long int
-        elif ftype == 76:
-            val, = unpack('>q', self.input.read(8))
-        # 'l': long long unsigned int
-        elif ftype == 108:
-            val, = unpack('>Q', self.input.read(8))
-        # 'f': float
-        elif ftype == 102:
-            val, = unpack('>f', self.input.read(4))
-        # 'd': double
-        elif ftype == 100:
-            val = self.read_float()
         # 'D': decimal
         elif ftype == 68:
             d = self.read_octet()
-            n, = unpack('>i', self.input.read(4))
+            n, = _signed_long.unpack_from(buf, self.pos)
+            self.pos += 4
             val = Decimal(n) / Decimal(10 ** d)
         # 'F': table
         elif ftype == 70:
@@ -171,7 +223,7 @@ class AMQPReader:
             val = self.read_array()
         # 't' (bool)
         elif ftype == 116:
-            val = self.read_bit()
+            val = self.read_octet() != 0
         # 'T': timestamp
         elif ftype == 84:
             val = self.read_timestamp()
@@ -183,11 +235,12 @@ class AMQPReader:
         return val
 
     def read_array(self):
-        array_length = unpack('>I', self.input.read(4))[0]
-        array_data = AMQPReader(self.input.read(array_length))
+        array_length, = _long.unpack_from(self.buf, self.pos)
+        self.pos += 4
+        end = self.pos + array_length
         result = []
-        while array_data.input.tell() < array_length:
-            val = array_data.read_item()
+        while self.pos < end:
+            val = self.read_item()
             result.append(val)
         return result
 
@@ -202,52 +255,65 @@ class AMQPReader:
 
 class AMQPWriter:
     """Convert higher-level AMQP types to bytestreams
+
+    Values are appended to a `bytearray`. Consecutive bits are packed into octets as they are
+    written.
     """
-    __slots__ = ['out', 'bits', 'bit_count']
+    __slots__ = ['out', 'bit_count', '_dest']
 
     def __init__(self, dest=None):
         """
-        Note: dest must also implement `getvalue()`, such as :class:`io.BytesIO`
+        If `dest` is an :class:`io.BytesIO`, values are encoded into a separate buffer, which is
+        written through to `dest` by :meth:`flush()` and :meth:`getvalue()`.
 
-        :param dest: io.BytesIO object, or None create one
-        :type dest: io.IOBase or None
+        :param dest: bytearray to append to, io.BytesIO object to write to, or None to create a
+            bytearray
+        :type dest: bytearray or io.BytesIO or None
         """
-        if isinstance(dest, io.BytesIO):
+        self._dest = None
+        if isinstance(dest, bytearray):
             self.out = dest
         elif dest is None:
-            self.out = io.BytesIO()
+            self.out = bytearray()
+        elif isinstance(dest, io.BytesIO):
+            self.out = bytearray()
+            self._dest = dest
         else:
-            raise TypeError('AMQPWriter needs an `io.BytesIO` or `None`')
+            raise TypeError('AMQPWriter needs a `bytearray`, an `io.BytesIO` or `None`')
 
-        self.bits = []
+        # number of consecutive bits written to the octet at the end of `out`
         self.bit_count = 0
 
-    def _flush_bits(self):
-        if self.bits:
-            out = self.out
-            for b in self.bits:
-                out.write(pack('B', b))
-            self.bits = []
-            self.bit_count = 0
-
     def close(self):
-        """Pass through if possible to any file-like destinations
+        """Release the output buffer, and close the `io.BytesIO` destination if there is one
         """
-        self.out.close()
+        if self._dest is not None:
+            self.flush()
+            self._dest.close()
+        self.out = bytearray()
+        self.bit_count = 0
 
     def flush(self):
-        """Pass through if possible to any file-like destinations
+        """Write what's been encoded so far through to the `io.BytesIO` destination, if there is
+        one
         """
-        self.out.flush()
+        dest = self._dest
+        if dest is not None:
+            dest.write(bytes(self.out))
+            del self.out[:]
+            self.bit_count = 0
+            dest.flush()
 
     def getvalue(self):
-        """Get what's been encoded so far if we're working with a BytesIO
+        """Get what's been encoded so far
 
         :return: bytes
         :rtype: bytes
         """
-        self._flush_bits()
-        return self.out.getvalue()
+        if self._dest is not None:
+            self.flush()
+            return self._dest.getvalue()
+        return bytes(self.out)
 
     def write(self, b):
         """Write bytes
@@ -257,17 +323,17 @@ class AMQPWriter:
         """
         if six.PY2:
             b = bytes(b)
-        self._flush_bits()
-        self.out.write(b)
+        self.bit_count = 0
+        self.out += b
 
     def write_bit(self, b):
         """Write a boolean value
         """
-        b = 1 if b else 0
         shift = self.bit_count % 8
         if shift == 0:
-            self.bits.append(0)
-        self.bits[-1] |= (b << shift)
+            self.out.append(0)
+        if b:
+            self.out[-1] |= 1 << shift
         self.bit_count += 1
 
     def write_octet(self, n):
@@ -276,8 +342,8 @@ class AMQPWriter:
         if n < 0 or n > 255:
             raise FrameSyntaxError(
                 'Octet {0!r} out of range 0..255'.format(n))
-        self._flush_bits()
-        self.out.write(pack('B', n))
+        self.bit_count = 0
+        self.out.append(n)
 
     def write_short(self, n):
         """Write an integer as an unsigned 16-bit value
@@ -285,8 +351,8 @@ class AMQPWriter:
         if n < 0 or n > 65535:
             raise FrameSyntaxError(
                 'Octet {0!r} out of range 0..65535'.format(n))
-        self._flush_bits()
-        self.out.write(pack('>H', int(n)))
+        self.bit_count = 0
+        self.out += _short.pack(int(n))
 
     def write_long(self, n):
         """Write an integer as an unsigned2 32-bit value
@@ -294,8 +360,8 @@ class AMQPWriter:
         if n < 0 or n >= 4294967296:
             raise FrameSyntaxError(
                 'Octet {0!r} out of range 0..2**31-1'.format(n))
-        self._flush_bits()
-        self.out.write(pack('>I', n))
+        self.bit_count = 0
+        self.out += _long.pack(n)
 
     def write_longlong(self, n):
         """Write an integer as an unsigned 64-bit value
@@ -303,63 +369,83 @@ class AMQPWriter:
         if n < 0 or n >= 18446744073709551616:
             raise FrameSyntaxError(
                 'Octet {0!r} out of range 0..2**64-1'.format(n))
-        self._flush_bits()
-        self.out.write(pack('>Q', n))
+        self.bit_count = 0
+        self.out += _longlong.pack(n)
 
     def write_shortstr(self, s):
         """Write a string up to 255 bytes long (after any encoding)
 
         If passed a unicode string, encode with UTF-8.
         """
-        self._flush_bits()
         if isinstance(s, six.string_types):
             s = s.encode('utf-8')
         if len(s) > 255:
             raise FrameSyntaxError(
                 'Shortstring overflow ({0} > 255)'.format(len(s)))
-        self.write_octet(len(s))
-        self.out.write(s)
+        self.bit_count = 0
+        out = self.out
+        out.append(len(s))
+        out += s
 
     def write_longstr(self, s):
         """Write a string up to 2**32 bytes long after encoding
 
         If passed a unicode string, encode as UTF-8.
         """
-        self._flush_bits()
         if isinstance(s, six.string_types):
             s = s.encode('utf-8')
         self.write_long(len(s))
-        self.out.write(s)
+        self.out += s
+
+    def _begin_sized(self):
+        """Reserve space for a 32-bit size prefix
+
+        :return: offset of the size prefix, to be passed to :meth:`_end_sized()`
+        :rtype: int
+        """
+        self.bit_count = 0
+        pos = len(self.out)
+        self.out += b'\x00\x00\x00\x00'
+        return pos
+
+    def _end_sized(self, pos):
+        """Fill in a size prefix reserved by :meth:`_begin_sized()` with the number of bytes
+        written since
+        """
+        self.bit_count = 0
+        size = len(self.out) - pos - 4
+        if size >= 4294967296:
+            raise FrameSyntaxError('Table or array too large ({} bytes)'.format(size))
+        _long.pack_into(self.out, pos, size)
 
     def write_table(self, d):
         """Write out a Python dictionary made of up string keys, and values that are strings,
         signed integers, Decimal, datetime.datetime, or sub-dictionaries following the same
         constraints
         """
-        self._flush_bits()
-        table_data = AMQPWriter()
+        pos = self._begin_sized()
         for k, v in d.items():
-            table_data.write_shortstr(k)
-            table_data.write_item(v, k)
-        table_data = table_data.getvalue()
-        self.write_long(len(table_data))
-        self.out.write(table_data)
+            self.write_shortstr(k)
+            self.write_item(v, k)
+        self._end_sized(pos)
 
     def write_item(self, v, k=None):
+        out = self.out
+        self.bit_count = 0
         if isinstance(v, (six.string_types, bytes)):
-            if six.PY3:
-                if isinstance(v, str):
-                    v = v.encode('utf-8')
-            self.write(b'S')
-            self.write_longstr(v)
+            if isinstance(v, six.text_type):
+                v = v.encode('utf-8')
+            out += b'S'
+            out += _long.pack(len(v))
+            out += v
         elif isinstance(v, bool):
-            self.write(pack('>cB', b't', int(v)))
+            out += _bool_item.pack(b't', int(v))
         elif isinstance(v, float):
-            self.write(pack('>cd', b'd', v))
-        elif isinstance(v, int):
-            self.write(pack('>ci', b'I', v))
+            out += _double_item.pack(b'd', v)
+        elif isinstance(v, six.integer_types):
+            out += _int_item.pack(b'I', v)
         elif isinstance(v, Decimal):
-            self.write(b'D')
+            out += b'D'
             sign, digits, exponent = v.as_tuple()
             v = 0
             for d in digits:
@@ -367,18 +453,18 @@ class AMQPWriter:
             if sign:
                 v = -v
             self.write_octet(-exponent)
-            self.write(pack('>i', v))
+            out += _signed_long.pack(v)
         elif isinstance(v, datetime):
-            self.write(b'T')
+            out += b'T'
             self.write_timestamp(v)
         elif isinstance(v, dict):
-            self.write(b'F')
+            out += b'F'
             self.write_table(v)
         elif isinstance(v, (list, tuple)):
-            self.write(b'A')
+            out += b'A'
             self.write_array(v)
         elif v is None:
-            self.write(b'V')
+            out += b'V'
         else:
             if k:
                 err = 'Table type {!r} for key {!r} not handled by amqpy. [value: {!r}]' \
@@ -388,15 +474,14 @@ class AMQPWriter:
             raise FrameSyntaxError(err)
 
     def write_array(self, a):
-        array_data = AMQPWriter()
+        pos = self._begin_sized()
         for v in a:
-            array_data.write_item(v)
-        array_data = array_data.getvalue()
-        self.write_long(len(array_data))
-        self.out.write(array_data)
+            self.write_item(v)
+        self._end_sized(pos)
 
     def write_timestamp(self, v):
         """Write out a Python datetime.datetime object as a 64-bit integer representing seconds
         since the Unix epoch
         """
-        self.out.write(pack('>q', int(mktime(v.timetuple()))))
+        self.bit_count = 0
+        self.out += _timestamp.pack(int(mktime(v.timetuple())))
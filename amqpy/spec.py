@@ -103,6 +103,7 @@ class Basic:
     RecoverAsync = method_t(60, 100)
     Recover = method_t(60, 110)
     RecoverOk = method_t(60, 111)
+    Nack = method_t(60, 120)
 
 
 class Confirm:
@@ -121,3 +122,103 @@ class Tx:
     CommitOk = method_t(90, 21)
     Rollback = method_t(90, 30)
     RollbackOk = method_t(90, 31)
+
+
+#: Argument definitions of each method, in wire order: `{method_t: ((name, type), ...)}`
+#:
+#: The types are the AMQP base types: `bit`, `octet`, `short`, `long`, `longlong`, `shortstr`,
+#: `longstr`, and `table`. Method argument codecs are generated from these definitions by
+#: :mod:`amqpy.method_codecs`.
+METHOD_ARGS = {
+    Connection.Start: (('version_major', 'octet'), ('version_minor', 'octet'),
+                       ('server_properties', 'table'), ('mechanisms', 'longstr'),
+                       ('locales', 'longstr')),
+    Connection.StartOk: (('client_properties', 'table'), ('mechanism', 'shortstr'),
+                         ('response', 'longstr'), ('locale', 'shortstr')),
+    Connection.Secure: (('challenge', 'longstr'),),
+    Connection.SecureOk: (('response', 'longstr'),),
+    Connection.Tune: (('channel_max', 'short'), ('frame_max', 'long'), ('heartbeat', 'short')),
+    Connection.TuneOk: (('channel_max', 'short'), ('frame_max', 'long'), ('heartbeat', 'short')),
+    Connection.Open: (('virtual_host', 'shortstr'), ('capabilities', 'shortstr'),
+                      ('insist', 'bit')),
+    Connection.OpenOk: (('known_hosts', 'shortstr'),),
+    Connection.Close: (('reply_code', 'short'), ('reply_text', 'shortstr'), ('class_id', 'short'),
+                       ('method_id', 'short')),
+    Connection.CloseOk: (),
+    Connection.Blocked: (('reason', 'shortstr'),),
+    Connection.Unblocked: (),
+
+    Channel.Open: (('out_of_band', 'shortstr'),),
+    Channel.OpenOk: (('channel_id', 'longstr'),),
+    Channel.Flow: (('active', 'bit'),),
+    Channel.FlowOk: (('active', 'bit'),),
+    Channel.Close: (('reply_code', 'short'), ('reply_text', 'shortstr'), ('class_id', 'short'),
+                    ('method_id', 'short')),
+    Channel.CloseOk: (),
+
+    Exchange.Declare: (('reserved_1', 'short'), ('exchange', 'shortstr'), ('type', 'shortstr'),
+                       ('passive', 'bit'), ('durable', 'bit'), ('auto_delete', 'bit'),
+                       ('internal', 'bit'), ('nowait', 'bit'), ('arguments', 'table')),
+    Exchange.DeclareOk: (),
+    Exchange.Delete: (('reserved_1', 'short'), ('exchange', 'shortstr'), ('if_unused', 'bit'),
+                      ('nowait', 'bit')),
+    Exchange.DeleteOk: (),
+    Exchange.Bind: (('reserved_1', 'short'), ('destination', 'shortstr'), ('source', 'shortstr'),
+                    ('routing_key', 'shortstr'), ('nowait', 'bit'), ('arguments', 'table')),
+    Exchange.BindOk: (),
+    Exchange.Unbind: (('reserved_1', 'short'), ('destination', 'shortstr'), ('source', 'shortstr'),
+                      ('routing_key', 'shortstr'), ('nowait', 'bit'), ('arguments', 'table')),
+    Exchange.UnbindOk: (),
+
+    Queue.Declare: (('reserved_1', 'short'), ('queue', 'shortstr'), ('passive', 'bit'),
+                    ('durable', 'bit'), ('exclusive', 'bit'), ('auto_delete', 'bit'),
+                    ('nowait', 'bit'), ('arguments', 'table')),
+    Queue.DeclareOk: (('queue', 'shortstr'), ('message_count', 'long'),
+                      ('consumer_count', 'long')),
+    Queue.Bind: (('reserved_1', 'short'), ('queue', 'shortstr'), ('exchange', 'shortstr'),
+                 ('routing_key', 'shortstr'), ('nowait', 'bit'), ('arguments', 'table')),
+    Queue.BindOk: (),
+    Queue.Purge: (('reserved_1', 'short'), ('queue', 'shortstr'), ('nowait', 'bit')),
+    Queue.PurgeOk: (('message_count', 'long'),),
+    Queue.Delete: (('reserved_1', 'short'), ('queue', 'shortstr'), ('if_unused', 'bit'),
+                   ('if_empty', 'bit'), ('nowait', 'bit')),
+    Queue.DeleteOk: (('message_count', 'long'),),
+    Queue.Unbind: (('reserved_1', 'short'), ('queue', 'shortstr'), ('exchange', 'shortstr'),
+                   ('routing_key', 'shortstr'), ('arguments', 'table')),
+    Queue.UnbindOk: (),
+
+    Basic.Qos: (('prefetch_size', 'long'), ('prefetch_count', 'short'), ('a_global', 'bit')),
+    Basic.QosOk: (),
+    Basic.Consume: (('reserved_1', 'short'), ('queue', 'shortstr'), ('consumer_tag', 'shortstr'),
+                    ('no_local', 'bit'), ('no_ack', 'bit'), ('exclusive', 'bit'),
+                    ('nowait', 'bit'), ('arguments', 'table')),
+    Basic.ConsumeOk: (('consumer_tag', 'shortstr'),),
+    Basic.Cancel: (('consumer_tag', 'shortstr'), ('nowait', 'bit')),
+    Basic.CancelOk: (('consumer_tag', 'shortstr'),),
+    Basic.Publish: (('reserved_1', 'short'), ('exchange', 'shortstr'), ('routing_key', 'shortstr'),
+                    ('mandatory', 'bit'), ('immediate', 'bit')),
+    Basic.Return: (('reply_code', 'short'), ('reply_text', 'shortstr'), ('exchange', 'shortstr'),
+                   ('routing_key', 'shortstr')),
+    Basic.Deliver: (('consumer_tag', 'shortstr'), ('delivery_tag', 'longlong'),
+                    ('redelivered', 'bit'), ('exchange', 'shortstr'), ('routing_key', 'shortstr')),
+    Basic.Get: (('reserved_1', 'short'), ('queue', 'shortstr'), ('no_ack', 'bit')),
+    Basic.GetOk: (('delivery_tag', 'longlong'), ('redelivered', 'bit'), ('exchange', 'shortstr'),
+                  ('routing_key', 'shortstr'), ('message_count', 'long')),
+    Basic.GetEmpty: (('cluster_id', 'shortstr'),),
+    Basic.Ack: (('delivery_tag', 'longlong'), ('multiple', 'bit')),
+    Basic.Reject: (('delivery_tag', 'longlong'), ('requeue', 'bit')),
+    Basic.RecoverAsync: (('requeue', 'bit'),),
+    Basic.Recover: (('requeue', 'bit'),),
+    Basic.RecoverOk: (),
+    Basic.Nack: (('delivery_tag', 'longlong'), ('multiple', 'bit'), ('requeue', 'bit')),
+
+    Confirm.Select: (('nowait', 'bit'),),
+    Confirm.SelectOk: (),
+
+    Tx.Select: (),
+    Tx.SelectOk: (),
+    Tx.Commit: (),
+    Tx.CommitOk: (),
+    Tx.Rollback: (),
+    Tx.RollbackOk: (),
+}
@@ -10,6 +10,10 @@ import pytest
 
 from .. import Connection
 
+if sys.version_info < (3, 5):
+    # `amqpy.aio` uses `async`/`await` syntax
+    collect_ignore = ['test_aio.py']
+
 
 class ColouredFormatter(logging.Formatter):
     RESET = '\x1B[0m'
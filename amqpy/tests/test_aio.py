@@ -0,0 +1,106 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import asyncio
+from functools import wraps
+
+import pytest
+
+from .. import Message, NotFound
+from .. import aio
+
+
+def run_async(f):
+    """Run the decorated coroutine function to completion on a new event loop
+    """
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(asyncio.wait_for(f(*args, **kwargs), 15))
+        finally:
+            loop.close()
+
+    return wrapper
+
+
+class TestAsyncio:
+    @run_async
+    async def test_publish_get(self):
+        async with await aio.connect() as conn:
+            ch = await conn.channel()
+            qname, _, _ = await ch.queue_declare()
+
+            msg = Message('hello', content_type='text/plain', application_headers={'foo': 7})
+            await ch.basic_publish(msg, routing_key=qname)
+
+            msg2 = await ch.basic_get(qname)
+            assert msg2 == msg
+            msg2.ack()
+
+            assert await ch.basic_get(qname) is None
+            await ch.close()
+
+    @run_async
+    async def test_consume(self):
+        async with await aio.connect() as conn:
+            ch = await conn.channel()
+            qname, _, _ = await ch.queue_declare()
+            await ch.basic_qos(prefetch_count=10)
+
+            bodies = ['message {}'.format(i) for i in range(50)]
+            large_body = 'this is a test message' * 20000
+            for body in bodies + [large_body]:
+                await ch.basic_publish(Message(body), routing_key=qname)
+
+            consumer = await ch.basic_consume(qname)
+            received = []
+            async for msg in consumer:
+                received.append(msg.body)
+                msg.ack()
+                if len(received) == len(bodies) + 1:
+                    await consumer.cancel()
+
+            assert received == bodies + [large_body]
+
+    @run_async
+    async def test_publish_confirm(self):
+        async with await aio.connect() as conn:
+            ch = await conn.channel()
+            qname, _, _ = await ch.queue_declare()
+            await ch.confirm_select()
+
+            results = await asyncio.gather(*[ch.basic_publish(Message('message'),
+                                                              routing_key=qname)
+                                             for _ in range(100)])
+            assert results == [True] * 100
+
+            _, message_count, _ = await ch.queue_declare(qname, passive=True)
+            assert message_count == 100
+
+    @run_async
+    async def test_many_channels(self):
+        async with await aio.connect() as conn:
+            async def roundtrip(i):
+                ch = await conn.channel()
+                qname, _, _ = await ch.queue_declare()
+                await ch.basic_publish(Message('message {}'.format(i)), routing_key=qname)
+                msg = await ch.basic_get(qname, no_ack=True)
+                await ch.close()
+                return msg.body
+
+            bodies = await asyncio.gather(*[roundtrip(i) for i in range(500)])
+            assert bodies == ['message {}'.format(i) for i in range(500)]
+            assert list(conn.channels) == [0]
+
+    @run_async
+    async def test_survives_channel_error(self):
+        async with await aio.connect() as conn:
+            ch = await conn.channel()
+            with pytest.raises(NotFound):
+                await ch.queue_declare('amqpy.test.aio.nonexistent', passive=True)
+
+            # the channel is re-opened automatically
+            qname, _, _ = await ch.queue_declare()
+            assert qname
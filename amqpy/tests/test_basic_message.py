@@ -3,9 +3,14 @@ from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 from datetime import datetime
 from decimal import Decimal
+import io
 import pickle
 
-from .. import Message
+import pytest
+
+from .. import Message, MessageTemplate, spec
+from ..proto import Frame, Method
+from ..serialization import AMQPWriter
 
 
 class TestBasicMessage:
@@ -74,3 +79,194 @@ class TestBasicMessage:
         self.check_proplist(Message(application_headers={'foo': Decimal('10.1')}))
         self.check_proplist(Message(application_headers={'foo': Decimal('-1987654.193')}))
         self.check_proplist(Message(timestamp=datetime(1980, 1, 2, 3, 4, 6)))
+
+    def test_pack_frames(self):
+        """Check that the packed frame buffers match the individually dumped frames
+        """
+        for body in ['', 'hello', 'x' * 10000, 'x' * 30000]:
+            def method():
+                args = AMQPWriter()
+                args.write_short(0)
+                args.write_shortstr('exchange')
+                args.write_shortstr('routing.key')
+                args.write_bit(False)
+                return Method(spec.Basic.Publish, args, Message(body), 1)
+
+            chunk_size = 4096 - 8
+            m = method()
+            expected = m.dump_method_frame().data + m.dump_header_frame().data
+            for frame in m.dump_body_frame(chunk_size):
+                expected += frame.data
+
+            assert b''.join(method().pack_frames(chunk_size)) == expected
+
+    def test_template(self):
+        """Check that messages created from a template serialize like regular messages
+        """
+        template = MessageTemplate(content_type='application/json', delivery_mode=2,
+                                   application_headers={'foo': 7, 'bar': 'baz'}, app_id='test')
+        props = dict(template.properties)
+        for variable in [{}, {'message_id': '1'}, {'correlation_id': 'c', 'message_id': 'm'},
+                         {'timestamp': datetime(1980, 1, 2, 3, 4, 6), 'correlation_id': 'c'}]:
+            msg = template.message(b'body', **variable)
+            expected = Message(b'body', **dict(props, **variable))
+            assert msg == expected
+            assert msg.template.serialize_properties(msg.properties) is not None
+            assert msg.serialize_properties() == expected.serialize_properties()
+            self.check_proplist(msg)
+
+        # text bodies get a content encoding, which is included in the cached bytes
+        msg = template.message('text', message_id='1')
+        assert msg.properties['content_encoding'] == 'UTF-8'
+        assert msg.template.serialize_properties(msg.properties) is not None
+        self.check_proplist(msg)
+
+    def test_template_changed(self):
+        """Check that changing non-variable properties falls back to full serialization
+        """
+        template = MessageTemplate(content_type='text/plain', priority=3)
+
+        msg = template.message(b'body', message_id='1')
+        msg.properties['content_type'] = 'application/json'
+        assert template.serialize_properties(msg.properties) is None
+        self.check_proplist(msg)
+
+        msg = template.message(b'body', reply_to='replies')
+        assert template.serialize_properties(msg.properties) is None
+        self.check_proplist(msg)
+
+    def test_lazy_properties(self):
+        """Check that loaded properties are decoded individually, on first access
+        """
+        headers = {'foo': 7, 'bar': {'baz': 'qux'}}
+        msg = Message(b'body', content_type='text/plain', content_encoding='utf-8',
+                      application_headers=headers, message_id='42')
+        raw_properties = msg.serialize_properties()
+
+        new_msg = Message()
+        new_msg.load_properties(memoryview(raw_properties))
+        assert new_msg.get_property('content_encoding') == 'utf-8'
+        assert new_msg.get_property('priority') is None
+        assert new_msg.get_property('priority', 5) == 5
+        assert 'application_headers' not in new_msg._properties
+
+        # unmodified properties are sent as they were received
+        assert new_msg.serialize_properties() == raw_properties
+
+        assert new_msg.application_headers == headers
+        assert new_msg.properties == msg.properties
+
+        new_msg.properties['message_id'] = '43'
+        assert new_msg.serialize_properties() != raw_properties
+        self.check_proplist(new_msg)
+
+    def test_memoryview_properties(self):
+        msg = Message(content_type='text/plain', priority=3)
+        raw_properties = msg.serialize_properties()
+
+        new_msg = Message()
+        new_msg.load_properties(memoryview(bytearray(raw_properties)))
+        assert new_msg._raw_properties == raw_properties
+        assert new_msg.get_property('priority') == 3
+        assert new_msg.properties == msg.properties
+
+    def test_lazy_properties_modified(self):
+        """Check that modifying a decoded table doesn't drop the properties which weren't decoded
+        """
+        msg = Message(b'body', content_type='text/plain', content_encoding='utf-8',
+                      application_headers={'x': 1}, message_id='42')
+
+        new_msg = Message()
+        new_msg.load_properties(msg.serialize_properties())
+        new_msg.application_headers['y'] = 2
+
+        loaded_msg = Message()
+        loaded_msg.load_properties(new_msg.serialize_properties())
+        assert loaded_msg.properties == {'content_type': 'text/plain', 'content_encoding': 'utf-8',
+                                         'application_headers': {'x': 1, 'y': 2},
+                                         'message_id': '42'}
+
+    def test_streamed_body(self):
+        """Check that streamed bodies are packed into the same frames as in-memory bodies
+        """
+        body = bytes(bytearray(range(256))) * 100
+        chunk_size = 4096 - 8
+
+        def frames(msg, batches=False):
+            m = Method(spec.Basic.Publish, AMQPWriter(), msg, 1)
+            if batches:
+                return b''.join(b''.join(bufs) for bufs in m.pack_frame_batches(chunk_size, 5000))
+            return b''.join(m.pack_frames(chunk_size))
+
+        expected = frames(Message(body))
+        assert frames(Message(io.BytesIO(body))) == expected
+        assert frames(Message(io.BytesIO(body)), batches=True) == expected
+        chunks = (body[i:i + 1000] for i in range(0, len(body), 1000))
+        assert frames(Message(chunks, body_size=len(body)), batches=True) == expected
+
+        # the size of seekable files is determined from the current position
+        f = io.BytesIO(b'xx' + body)
+        f.seek(2)
+        assert Message(f).body_size == len(body)
+
+        with pytest.raises(ValueError):
+            Message(iter([body]))
+        with pytest.raises(ValueError):
+            frames(Message(iter([body]), body_size=len(body) + 1))
+        with pytest.raises(ValueError):
+            frames(Message(iter([body]), body_size=len(body) - 1))
+
+    def test_spooled_body(self):
+        """Check that large received bodies are spooled to a file
+        """
+        body = b'x' * 10000
+        sent = Method(spec.Basic.Publish, AMQPWriter(), Message(body), 1)
+        header = sent.dump_header_frame()
+        body_frames = [frame for frame in sent.dump_body_frame(4000)]
+
+        for threshold, spooled in [(None, False), (10000, False), (9999, True)]:
+            method = Method(spec.Basic.Deliver, AMQPWriter(), None, 1)
+            method.load_header_frame(Frame(header.frame_type, 1, header.payload), threshold)
+            for frame in body_frames:
+                method.load_body_frame(Frame(frame.frame_type, 1, frame.payload))
+            assert method.complete
+
+            msg = method.content
+            if spooled:
+                assert msg.body_is_stream
+                assert msg.body_size == len(body)
+                assert msg.body.read() == body
+            else:
+                assert msg.body == body
+
+    def test_body_buffer(self):
+        """Check that multi-frame bodies are assembled in a preallocated buffer
+        """
+        body = bytes(bytearray(range(256))) * 40
+        sent = Method(spec.Basic.Publish, AMQPWriter(), Message(body), 1)
+        header = sent.dump_header_frame()
+        payloads = [frame.payload.tobytes() for frame in sent.dump_body_frame(4000)]
+
+        # payloads copied from received frames, and payloads received directly into the buffer
+        for in_place in [False, True]:
+            method = Method(spec.Basic.Deliver, AMQPWriter(), None, 1)
+            method.load_header_frame(Frame(header.frame_type, 1, header.payload))
+            for payload in payloads:
+                if in_place:
+                    dest = method.body_buffer(len(payload))
+                    dest[:] = payload
+                    frame = Frame.with_payload(spec.FrameType.BODY, 1, dest)
+                else:
+                    frame = Frame(spec.FrameType.BODY, 1, payload)
+                method.load_body_frame(frame)
+            assert method.complete
+            assert isinstance(method.content.body, bytearray)
+            assert method.content.body == body
+
+        # a single-frame body is not buffered
+        method = Method(spec.Basic.Deliver, AMQPWriter(), None, 1)
+        method.load_header_frame(Frame(header.frame_type, 1, header.payload))
+        assert method.body_buffer(len(body)) is None
+        method.load_body_frame(Frame(spec.FrameType.BODY, 1, body))
+        assert isinstance(method.content.body, bytes)
+        assert method.content.body == body
@@ -0,0 +1,67 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import pytest
+
+from .. import Message, body_codecs
+from ..body_codecs import encode_body, decode_body, json_encode, json_decode
+
+
+@pytest.fixture
+def json_codec(monkeypatch):
+    monkeypatch.setitem(body_codecs.CONTENT_TYPES, 'application/json', (json_encode, json_decode))
+
+
+class TestBodyCodecs:
+    def test_text(self):
+        props = {}
+        data = encode_body('h\xe9llo', props)
+        assert data == 'h\xe9llo'.encode('utf-8')
+        assert props == {'content_encoding': 'UTF-8'}
+        assert decode_body(data, None, 'UTF-8') == 'h\xe9llo'
+
+        # unknown or invalid charsets leave the body undecoded
+        assert decode_body(b'\xff', None, 'UTF-8') == b'\xff'
+        assert decode_body(b'abc', None, 'I made this up') == b'abc'
+
+    @pytest.mark.parametrize('compression', sorted(body_codecs.COMPRESSIONS))
+    def test_compression(self, compression):
+        text = 'hello world ' * 100
+        props = {}
+        data = encode_body(text, props, compression, 100)
+        assert len(data) < len(text)
+        assert props['content_encoding'] == 'UTF-8, ' + compression
+        assert decode_body(bytearray(data), None, props['content_encoding']) == text
+
+        # encoding again gives the same result, rather than listing the compression twice
+        assert encode_body(text, props, compression, 100) == data
+        assert props['content_encoding'] == 'UTF-8, ' + compression
+
+        # bodies below the threshold are not compressed
+        props = {}
+        assert encode_body(b'short', props, compression, 100) == b'short'
+        assert props == {}
+
+    def test_content_type(self, json_codec):
+        obj = {'id': 7, 'tags': ['a', 'b']}
+        props = {'content_type': 'application/json; charset=utf-8'}
+        data = encode_body(obj, props, 'gzip')
+        assert props['content_encoding'] == 'gzip'
+        assert decode_body(data, props['content_type'], props['content_encoding']) == obj
+
+        # text bodies are passed to the codec as bytes
+        assert decode_body(b'[1]', 'application/json', 'UTF-8') == [1]
+
+    def test_no_codec(self):
+        with pytest.raises(TypeError):
+            encode_body({'id': 7}, {'content_type': 'application/x-unknown'})
+
+    def test_lazy_decode(self, json_codec):
+        msg = Message({'id': 7}, content_type='application/json', compression='deflate')
+        data = msg.encode_body()
+
+        received = Message(bytearray(data), **msg.properties)
+        received.defer_decode()
+        assert received._body == data
+        assert received.body == {'id': 7}
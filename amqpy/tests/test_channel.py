@@ -5,11 +5,15 @@ import six
 import uuid
 import logging
 import sys
+import threading
 
 import pytest
 
-from .. import Connection, Channel, Message, FrameSyntaxError, queue_declare_ok_t
+from .. import Connection, Channel, Message, FrameSyntaxError, queue_declare_ok_t, body_codecs
+from .. import spec
 from ..exceptions import AMQPError, ChannelError, PreconditionFailed, NotFound, AccessRefused
+from ..exceptions import Timeout
+from ..method_codecs import unpack_args
 from .conftest import get_server_props
 
 logging.basicConfig(level=logging.DEBUG, stream=sys.stdout, style='{',
@@ -88,6 +92,47 @@ class TestChannel:
         assert isinstance(msg2.body, bytes)
         assert msg2.body == six.u('hello w\xf6rld').encode('latin_1')
 
+
+    def test_compressed_body(self, ch, rand_rk, monkeypatch):
+        monkeypatch.setitem(body_codecs.CONTENT_TYPES, 'application/json',
+                            (body_codecs.json_encode, body_codecs.json_decode))
+        qname, _, _ = ch.queue_declare()
+        ch.queue_bind(qname, 'amq.direct', routing_key=rand_rk)
+
+        obj = {'items': list(range(1000))}
+        ch.basic_publish(Message(obj, content_type='application/json', compression='gzip'),
+                         'amq.direct', routing_key=rand_rk)
+        ch.basic_publish(Message('hello world' * 100, compression='gzip'), 'amq.direct',
+                         routing_key=rand_rk)
+
+        msg = ch.basic_get(qname, no_ack=True)
+        assert msg.properties['content_encoding'] == 'gzip'
+        assert msg.body == obj
+        msg = ch.basic_get(qname, no_ack=True)
+        assert msg.properties['content_encoding'] == 'UTF-8, gzip'
+        assert msg.body == 'hello world' * 100
+
+    def test_streamed_body(self, ch, rand_rk):
+        body = b'0123456789' * 50000
+        qname, _, _ = ch.queue_declare()
+        ch.queue_bind(qname, 'amq.direct', routing_key=rand_rk)
+
+        ch.basic_publish(Message(six.BytesIO(body)), 'amq.direct', routing_key=rand_rk)
+        msg = ch.basic_get(qname, no_ack=True)
+        assert msg.body == body
+
+        conn = Connection(body_spool_threshold=len(body) - 1)
+        try:
+            ch2 = conn.channel()
+            chunks = (body[i:i + 10000] for i in range(0, len(body), 10000))
+            ch2.basic_publish(Message(chunks, body_size=len(body)), 'amq.direct',
+                              routing_key=rand_rk)
+            msg = ch2.basic_get(qname, no_ack=True)
+            assert msg.body_size == len(body)
+            assert msg.body.read() == body
+        finally:
+            conn.close()
+
     def test_invalid_header(self, ch):
         """Test sending a message with an unserializable object in the header
 
@@ -323,6 +368,65 @@ class TestPublish:
         ch.confirm_select()
         ch.basic_publish(msg, rand_exch, rk)
 
+    def test_publish_batch(self, ch):
+        qname, _, _ = ch.queue_declare()
+        qname2, _, _ = ch.queue_declare()
+
+        msgs = [Message('message {}'.format(i), content_type='text/plain') for i in range(100)]
+        large_msg = Message('this is a test message' * 10000, content_type='text/plain')
+        ch.basic_publish_batch(msgs + [(large_msg, '', qname2)], routing_key=qname)
+
+        for msg in msgs:
+            assert ch.basic_get(qname, no_ack=True) == msg
+        assert ch.basic_get(qname, no_ack=True) is None
+        assert ch.basic_get(qname2, no_ack=True) == large_msg
+
+    def test_publish_batch_confirm(self, ch):
+        qname, _, _ = ch.queue_declare()
+        ch.confirm_select()
+
+        ch.basic_publish(Message('first'), routing_key=qname)
+        ch.basic_publish_batch([Message('batch {}'.format(i)) for i in range(50)],
+                               routing_key=qname)
+        ch.basic_publish(Message('last'), routing_key=qname)
+
+        _, message_count, _ = ch.queue_declare(qname, passive=True)
+        assert message_count == 52
+
+    def test_publish_confirm_nonblocking(self, ch):
+        qname, _, _ = ch.queue_declare()
+        ch.confirm_select(blocking=False)
+
+        confirms = []
+
+        def on_confirm(seq_no, acked):
+            confirms.append((seq_no, acked))
+
+        seq_nos = [ch.basic_publish(Message('message {}'.format(i)), routing_key=qname,
+                                    on_confirm=on_confirm) for i in range(100)]
+        assert seq_nos == list(range(1, 101))
+
+        assert ch.wait_for_confirms(timeout=5) is True
+        assert sorted(confirms) == [(seq_no, True) for seq_no in seq_nos]
+
+        _, message_count, _ = ch.queue_declare(qname, passive=True)
+        assert message_count == 100
+
+    def test_publish_confirm_nack(self, ch):
+        qname, _, _ = ch.queue_declare(arguments={'x-max-length': 0,
+                                                  'x-overflow': 'reject-publish'})
+        ch.confirm_select(blocking=False)
+
+        confirms = []
+        seq_no = ch.basic_publish(Message('rejected'), routing_key=qname,
+                                  on_confirm=lambda *args: confirms.append(args))
+
+        assert ch.wait_for_confirms(timeout=5) is False
+        assert confirms == [(seq_no, False)]
+
+        # the nack is only reported once
+        assert ch.wait_for_confirms(timeout=5) is True
+
     def test_publish_tx(self, conn, rand_queue, rand_rk):
         """Transactions must work as expected
         """
@@ -397,3 +501,208 @@ class TestPublish:
         ch.queue_declare('funtest_survive')
         ch.queue_declare('funtest_survive', passive=True)
         assert ch.queue_delete('funtest_survive') == 0
+
+
+class TestAck:
+    def record_writes(self, ch):
+        sent = []
+        method_writer = ch.connection.method_writer
+        write_method, write_methods = method_writer.write_method, method_writer.write_methods
+
+        def record_one(method):
+            sent.append([(method.method_type, unpack_args(method))])
+            write_method(method)
+
+        def record(methods):
+            sent.append([(m.method_type, unpack_args(m)) for m in methods])
+            write_methods(methods)
+
+        method_writer.write_method = record_one
+        method_writer.write_methods = record
+        return sent
+
+    def get_messages(self, ch, queue, count):
+        ch.queue_declare(queue)
+        for i in range(count):
+            ch.basic_publish(Message('{}'.format(i)), routing_key=queue)
+        return [ch.basic_get(queue) for _ in range(count)]
+
+    def test_coalesce_acks(self, ch, rand_queue):
+        msgs = self.get_messages(ch, rand_queue, 6)
+        tags = [msg.delivery_tag for msg in msgs]
+        sent = self.record_writes(ch)
+        ch.coalesce_acks(max_count=5, max_delay=None)
+
+        for msg in msgs[:4]:
+            msg.ack()
+        msgs[5].reject(requeue=False)
+        # the count limit is reached
+        assert sent == [[(spec.Basic.Ack, (tags[3], True)),
+                         (spec.Basic.Reject, (tags[5], False))]]
+
+        msgs[4].ack()
+        assert len(sent) == 1
+        ch.coalesce_acks(False)
+        assert sent[1] == [(spec.Basic.Ack, (tags[4], False))]
+        assert not ch._unsettled
+        assert ch.queue_declare(rand_queue, passive=True).message_count == 0
+
+    def test_coalesce_acks_delay(self, conn, ch, rand_queue):
+        msgs = self.get_messages(ch, rand_queue, 3)
+        sent = self.record_writes(ch)
+        ch.coalesce_acks(max_count=None, max_delay=0.05)
+
+        for msg in msgs:
+            msg.ack()
+        assert not sent
+        # `drain_events()` wakes up to send the acks before its own timeout
+        with pytest.raises(Timeout):
+            conn.drain_events(0.2)
+        assert sent == [[(spec.Basic.Ack, (msgs[2].delivery_tag, True))]]
+        assert not conn._ack_deadlines
+
+    def test_coalesce_acks_bytes(self, ch, rand_queue):
+        msgs = self.get_messages(ch, rand_queue, 3)
+        sent = self.record_writes(ch)
+        ch.coalesce_acks(max_count=None, max_bytes=2, max_delay=None)
+
+        msgs[0].ack()
+        assert not sent
+        msgs[2].reject(requeue=True)
+        assert sent == [[(spec.Basic.Ack, (msgs[0].delivery_tag, False)),
+                         (spec.Basic.Reject, (msgs[2].delivery_tag, True))]]
+        assert list(ch._unsettled) == [msgs[1].delivery_tag]
+
+    def test_coalesce_acks_defer_to_drain(self, conn, ch, rand_queue):
+        msgs = self.get_messages(ch, rand_queue, 3)
+        sent = self.record_writes(ch)
+        ch.coalesce_acks(max_count=2, max_delay=0.05, defer_to_drain=True)
+
+        # the count limit is reached on another thread, which leaves the acks to `drain_events()`
+        th = threading.Thread(target=lambda: [msg.ack() for msg in msgs[:2]])
+        th.start()
+        th.join()
+        assert not sent
+        with pytest.raises(Timeout):
+            conn.drain_events(0.01)
+        assert sent == [[(spec.Basic.Ack, (msgs[1].delivery_tag, True))]]
+
+        # while messages are unsettled, `drain_events()` checks for acks recorded during the wait
+        th = threading.Timer(0.05, msgs[2].ack)
+        th.start()
+        with pytest.raises(Timeout):
+            conn.drain_events(0.3)
+        th.join()
+        assert sent[1] == [(spec.Basic.Ack, (msgs[2].delivery_tag, False))]
+
+        with pytest.raises(ValueError):
+            ch.coalesce_acks(max_delay=None, defer_to_drain=True)
+
+    def test_flush_on_close(self, conn, rand_queue):
+        ch = conn.channel()
+        msgs = self.get_messages(ch, rand_queue, 2)
+        ch.coalesce_acks()
+        for msg in msgs:
+            msg.ack()
+        ch.close()
+
+        ch = conn.channel()
+        assert ch.queue_declare(rand_queue, passive=True).message_count == 0
+        ch.queue_delete(rand_queue)
+        ch.close()
+
+    def test_basic_nack(self, ch, rand_queue):
+        msgs = self.get_messages(ch, rand_queue, 4)
+        sent = self.record_writes(ch)
+        msgs[0].nack(requeue=False)
+        msgs[2].nack(multiple=True)
+        assert sent == [[(spec.Basic.Nack, (msgs[0].delivery_tag, False, False))],
+                        [(spec.Basic.Nack, (msgs[2].delivery_tag, True, True))]]
+        assert list(ch._unsettled) == [msgs[3].delivery_tag]
+        # two messages were requeued
+        assert ch.queue_declare(rand_queue, passive=True).message_count == 2
+
+    def test_reject_batch(self, ch, rand_queue):
+        msgs = self.get_messages(ch, rand_queue, 8)
+        tags = [msg.delivery_tag for msg in msgs]
+        sent = self.record_writes(ch)
+        ch.coalesce_acks(max_delay=None)
+        msgs[0].ack()
+        msgs[1].ack()
+        ch.basic_reject_batch(tags[2:5] + tags[6:], requeue=False)
+        assert sent == [[(spec.Basic.Ack, (tags[1], True)),
+                         (spec.Basic.Nack, (tags[4], True, False)),
+                         (spec.Basic.Reject, (tags[6], False)),
+                         (spec.Basic.Reject, (tags[7], False))]]
+        assert list(ch._unsettled) == [tags[5]]
+
+    def test_reject_batch_runs(self, ch, rand_queue):
+        for _ in range(2):
+            msgs = self.get_messages(ch, rand_queue, 5)
+            tags = [msg.delivery_tag for msg in msgs]
+            sent = self.record_writes(ch)
+            ch.basic_reject_batch(tags, requeue=False)
+            assert sent == [[(spec.Basic.Nack, (tags[-1], True, False))]]
+            assert not ch._unsettled
+
+    def test_basic_recover(self, ch, rand_queue):
+        msgs = self.get_messages(ch, rand_queue, 3)
+        ch.coalesce_acks(max_delay=None)
+        msgs[0].ack()
+        sent = self.record_writes(ch)
+        ch.basic_recover_async(requeue=True)
+        # the recorded ack is sent before the other messages are requeued
+        assert sent == [[(spec.Basic.Ack, (msgs[0].delivery_tag, False))],
+                        [(spec.Basic.RecoverAsync, (True,))]]
+        assert not ch._unsettled
+        assert ch.queue_declare(rand_queue, passive=True).message_count == 2
+
+    def test_reject_batch_without_nack(self, ch, rand_queue, monkeypatch):
+        msgs = self.get_messages(ch, rand_queue, 2)
+        monkeypatch.setitem(ch.connection.server_capabilities, 'basic.nack', False)
+        sent = self.record_writes(ch)
+        ch.basic_reject_batch([msg.delivery_tag for msg in msgs])
+        assert sent == [[(spec.Basic.Reject, (msg.delivery_tag, True)) for msg in msgs]]
+        assert ch.queue_declare(rand_queue, passive=True).message_count == 2
+
+
+class TestDrainQueue:
+    def publish(self, ch, queue, count):
+        ch.queue_declare(queue)
+        for i in range(count):
+            ch.basic_publish(Message('{:02}'.format(i)), routing_key=queue)
+
+    def test_drain_queue(self, ch, rand_queue):
+        self.publish(ch, rand_queue, 25)
+        bodies = [msg.body for msg in ch.drain_queue(rand_queue, batch_size=10, no_ack=True)]
+        assert bodies == ['{:02}'.format(i) for i in range(25)]
+        assert ch.queue_declare(rand_queue, passive=True).message_count == 0
+        assert not ch.callbacks
+
+    def test_max_messages(self, ch, rand_queue):
+        self.publish(ch, rand_queue, 25)
+        msgs = list(ch.drain_queue(rand_queue, max_messages=12, batch_size=5))
+        assert [msg.body for msg in msgs] == ['{:02}'.format(i) for i in range(12)]
+        ch.basic_ack(msgs[-1].delivery_tag, multiple=True)
+        assert ch.queue_declare(rand_queue, passive=True).message_count == 13
+
+    def test_max_bytes(self, ch, rand_queue):
+        self.publish(ch, rand_queue, 10)
+        msgs = list(ch.drain_queue(rand_queue, max_bytes=7, batch_size=8))
+        assert [msg.body for msg in msgs] == ['00', '01', '02', '03']
+        # the other fetched messages were requeued
+        assert list(ch._unsettled) == [msg.delivery_tag for msg in msgs]
+        assert ch.queue_declare(rand_queue, passive=True).message_count == 6
+
+        with pytest.raises(ValueError):
+            next(ch.drain_queue(rand_queue, max_bytes=7, no_ack=True))
+
+    def test_close_early(self, ch, rand_queue):
+        self.publish(ch, rand_queue, 10)
+        for msg in ch.drain_queue(rand_queue):
+            msg.ack()
+            break
+        assert not ch._unsettled
+        # the requeued messages are available again
+        assert sorted(msg.body for msg in ch.drain_queue(rand_queue)) == [
+            '{:02}'.format(i) for i in range(1, 10)]
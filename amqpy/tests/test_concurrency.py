@@ -0,0 +1,95 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import threading
+import time
+
+import pytest
+
+from ..concurrency import (synchronized, enable_lock_profiling, disable_lock_profiling,
+                           lock_profiler)
+
+
+class Locked:
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    @synchronized('lock')
+    def work(self, duration):
+        time.sleep(duration)
+
+
+@pytest.fixture(scope='function')
+def profiler(request):
+    request.addfinalizer(disable_lock_profiling)
+    return enable_lock_profiling()
+
+
+class TestLockProfiler:
+    def test_toggle(self):
+        assert lock_profiler() is None
+        profiler = enable_lock_profiling()
+        assert enable_lock_profiling() is profiler
+        assert lock_profiler() is profiler
+
+        Locked().work(0)
+        assert disable_lock_profiling() is profiler
+        Locked().work(0)
+        assert lock_profiler() is None
+        stats, = profiler.stats()
+        assert stats.calls == 1
+
+    def test_contention(self, profiler):
+        obj = Locked()
+        start = threading.Event()
+
+        def run():
+            start.wait(5)
+            obj.work(0.05)
+
+        threads = [threading.Thread(target=run, name='worker-{}'.format(i)) for i in range(3)]
+        for th in threads:
+            th.start()
+        start.set()
+        for th in threads:
+            th.join()
+
+        stats, = profiler.stats()
+        assert stats.name.endswith('work')
+        assert stats.lock_name == 'lock'
+        assert stats.calls == 3
+        assert stats.contended == 2
+        assert len(stats.threads) == 2
+        assert stats.max_waiters == 2
+        assert stats.wait.count == 2
+        assert stats.wait_max >= 0.04
+        assert stats.hold.count == 3
+        assert stats.hold.sum >= 0.15
+
+        report = profiler.report().splitlines()
+        assert report[0].split()[:4] == ['function', 'lock', 'calls', 'waited']
+        assert report[1].split()[1:4] == ['lock', '3', '2']
+
+        profiler.reset()
+        assert profiler.stats() == []
+
+    def test_channel_methods(self, profiler, conn):
+        ch = conn.channel()
+        locked = threading.Event()
+
+        def hold_lock():
+            with conn.conn_lock:
+                locked.set()
+                time.sleep(0.05)
+
+        th = threading.Thread(target=hold_lock)
+        th.start()
+        locked.wait(5)
+        ch.basic_qos(0, 10, False)
+        th.join()
+
+        stats = dict((s.name.split('.')[-1], s) for s in profiler.stats())
+        assert stats['basic_qos'].lock_name == 'conn_lock'
+        assert stats['basic_qos'].contended == 1
+        assert stats['basic_qos'].threads == set([threading.current_thread().name])
+        assert profiler.stats()[0] is stats['basic_qos']
@@ -1,17 +1,20 @@
 from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
+import datetime
 import gc
 import os
 from signal import SIGHUP
 import threading
 import time
 import signal
+import socket
 from amqpy.login import login_response_plain
 
 import pytest
 
-from .. import Channel, NotFound, FrameError, spec, Connection
+from .. import Channel, NotFound, FrameError, spec, Connection, Message, Timeout
+from ..heartbeat import HeartbeatScheduler
 from ..proto import Method
 
 
@@ -141,6 +144,196 @@ class TestConnection:
             conn.drain_events(2)
 
 
+class TestReaderThread:
+    def test_parallel_channels(self, rand_queue):
+        """Make sure a channel waiting for deliveries doesn't block RPCs on other channels
+        """
+        conn = Connection(reader_thread=True)
+        try:
+            consume_ch = conn.channel()
+            consume_ch.queue_declare(rand_queue)
+            received = []
+            consume_ch.basic_consume(rand_queue, no_ack=True,
+                                     callback=lambda msg: received.append(msg.body))
+
+            def consume():
+                while len(received) < 20:
+                    consume_ch.wait(spec.Basic.Deliver, timeout=10)
+
+            th = threading.Thread(target=consume)
+            th.start()
+
+            # the consumer thread is blocked waiting for deliveries while this thread does RPCs
+            publish_ch = conn.channel()
+            for i in range(20):
+                publish_ch.queue_declare(rand_queue, passive=True)
+                publish_ch.basic_publish(Message('message {}'.format(i)), routing_key=rand_queue)
+
+            th.join(15)
+            assert not th.is_alive()
+            assert received == ['message {}'.format(i) for i in range(20)]
+
+            publish_ch.queue_delete(rand_queue)
+        finally:
+            conn.close()
+
+    def test_drain_events(self, rand_queue):
+        conn = Connection(reader_thread=True)
+        try:
+            ch = conn.channel()
+            ch.queue_declare(rand_queue, auto_delete=True)
+            received = []
+            ch.basic_consume(rand_queue, no_ack=True, callback=received.append)
+            ch.basic_publish(Message('hello'), routing_key=rand_queue)
+
+            conn.drain_events(timeout=5)
+            assert [msg.body for msg in received] == ['hello']
+
+            with pytest.raises(Timeout):
+                conn.drain_events(timeout=0.1)
+        finally:
+            conn.close()
+        assert conn._reader_thread is None
+
+    def test_channel_error(self, rand_queue):
+        conn = Connection(reader_thread=True)
+        try:
+            ch = conn.channel()
+            with pytest.raises(NotFound):
+                ch.queue_declare(rand_queue, passive=True)
+            assert ch.queue_declare(rand_queue, auto_delete=True).queue == rand_queue
+            assert conn.is_alive()
+        finally:
+            conn.close()
+
+
+class TestHeartbeat:
+    def test_shared_thread(self, conn):
+        conn2 = Connection(heartbeat=10)
+        try:
+            threads = [t for t in threading.enumerate() if t.name == 'amqp-HeartbeatScheduler']
+            assert len(threads) == 1
+        finally:
+            conn2.close()
+
+    def test_suppressed_after_write(self, conn):
+        transport = conn.transport
+        transport.last_write = time.monotonic()
+        assert conn._heartbeat_tick()
+        assert transport.last_heartbeat_sent is None
+
+        transport.last_write -= conn._heartbeat_final
+        assert conn._heartbeat_tick()
+        assert transport.last_heartbeat_sent is not None
+
+    def test_write_lock_held(self, conn):
+        """Make sure a heartbeat never waits for a thread which is writing frames
+        """
+        transport = conn.transport
+        locked = threading.Event()
+        done = threading.Event()
+
+        def hold_lock():
+            with transport._frame_write_lock:
+                locked.set()
+                done.wait(5)
+
+        th = threading.Thread(target=hold_lock)
+        th.start()
+        try:
+            locked.wait(5)
+            assert transport.send_heartbeat_if_idle(0) is False
+        finally:
+            done.set()
+            th.join()
+        assert transport.send_heartbeat_if_idle(0) is True
+
+    def test_send_buffer_full(self, conn):
+        """Make sure a heartbeat never waits for a full send buffer to drain
+        """
+        transport = conn.transport
+        sock, peer = socket.socketpair()
+        sock.setblocking(False)
+        try:
+            while True:
+                sock.send(b'x' * 65536)
+        except socket.error:
+            pass
+        sock.settimeout(1)
+
+        transport.sock, sock = sock, transport.sock
+        try:
+            assert transport.send_heartbeat_if_idle(0) is False
+        finally:
+            transport.sock, sock = sock, transport.sock
+            sock.close()
+            peer.close()
+        assert transport.send_heartbeat_if_idle(0) is True
+
+    def test_missed_heartbeats(self, conn):
+        conn.transport.last_read -= conn._heartbeat_final * 3
+        assert not conn._heartbeat_tick()
+        assert not conn.is_alive()
+        with pytest.raises(IOError):
+            conn.drain_events(1)
+
+    def test_pending_data(self, conn, ch, rand_queue):
+        """Make sure frames which nobody has read yet count as received
+        """
+        ch.queue_declare(rand_queue, auto_delete=True)
+        ch.basic_consume(rand_queue, no_ack=True)
+        ch.basic_publish(Message('hello'), routing_key=rand_queue)
+        time.sleep(0.1)
+        conn.transport.last_read -= conn._heartbeat_final * 3
+        assert conn._heartbeat_tick()
+
+    def test_stats(self, conn):
+        stats = conn.stats()
+        assert stats.last_heartbeat_sent is None
+        assert stats.last_heartbeat_received is None
+        assert stats.last_read <= time.monotonic()
+
+        conn.send_heartbeat()
+        stats2 = conn.stats()
+        assert stats2.last_write >= stats.last_write
+        assert stats2.last_heartbeat_sent == stats2.last_write
+
+        now = datetime.datetime.now()
+        sent = stats2.datetimes().last_heartbeat_sent
+        assert abs((now - sent).total_seconds()) < 1
+        assert abs((now - conn.last_heartbeat_sent).total_seconds()) < 1
+        assert conn.last_heartbeat_recv is None
+
+        conn.close()
+        assert conn.stats() is None
+
+    def test_scheduler(self):
+        class Ticker:
+            def __init__(self, count):
+                self.count = count
+                self.ticked = threading.Event()
+
+            def _heartbeat_tick(self):
+                self.count -= 1
+                if not self.count:
+                    self.ticked.set()
+                return self.count > 0
+
+        scheduler = HeartbeatScheduler()
+        tickers = [Ticker(3), Ticker(5)]
+        for ticker in tickers:
+            scheduler.schedule(ticker, 0.01)
+        cancelled = Ticker(1)
+        scheduler.schedule(cancelled, 0.01)
+        scheduler.cancel(cancelled)
+
+        for ticker in tickers:
+            assert ticker.ticked.wait(5)
+        time.sleep(0.05)
+        assert [ticker.count for ticker in tickers] == [0, 0]
+        assert cancelled.count == 1
+
+
 class TestLogin:
     def test_login_response_plain(self):
         b = login_response_plain('blah', 'blah')
@@ -2,8 +2,14 @@ from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
 import logging
+import threading
+import time
+
+import pytest
 
 from .. import Message, AbstractConsumer
+from .. import spec
+from ..method_codecs import unpack_args
 
 from ..exceptions import Timeout
 
@@ -16,6 +22,30 @@ class Consumer(AbstractConsumer):
         msg.ack()
 
 
+class PoolConsumer(AbstractConsumer):
+    requeue_failed = False
+
+    def __init__(self, *args, **kwargs):
+        super(PoolConsumer, self).__init__(*args, **kwargs)
+        self.threads = set()
+        self.bodies = []
+
+    def run(self, msg):
+        self.threads.add(threading.current_thread())
+        time.sleep(0.01)
+        if msg.body == 'fail':
+            raise ValueError('failed')
+        self.bodies.append(msg.body)
+
+
+def drain(conn, timeout=0.2):
+    while True:
+        try:
+            conn.drain_events(timeout)
+        except Timeout:
+            break
+
+
 class TestConsumer:
     def test_basic_consume(self, conn, ch, rand_exch, rand_queue):
         self.consume_count = 0
@@ -100,3 +130,74 @@ class TestConsumer:
                 break
 
         assert c1.consume_count == 10
+
+    def test_executor(self, conn, ch, rand_queue):
+        futures = pytest.importorskip('concurrent.futures')
+        q = rand_queue
+        ch.queue_declare(q)
+        for i in range(20):
+            ch.basic_publish(Message('{}'.format(i)), routing_key=q)
+        ch.basic_publish(Message('fail'), routing_key=q)
+
+        sent = []
+        writers = set()
+        write_methods = conn.method_writer.write_methods
+
+        def record_one(method):
+            record([method])
+
+        def record(methods):
+            sent.extend(methods)
+            writers.add(threading.current_thread())
+            write_methods(methods)
+
+        conn.method_writer.write_method = record_one
+        conn.method_writer.write_methods = record
+
+        with futures.ThreadPoolExecutor(4) as executor:
+            c1 = PoolConsumer(ch, q, executor=executor)
+            c1.declare()
+            assert c1.prefetch_count == 8
+            drain(conn)
+
+        drain(conn)
+        assert c1.consume_count == 21
+        assert sorted(c1.bodies, key=int) == [str(i) for i in range(20)]
+        assert threading.current_thread() not in c1.threads
+        # the worker threads never write to the socket
+        assert writers == set([threading.current_thread()])
+
+        # every message is settled, with fewer acks than messages, and nothing is left over
+        acks = [unpack_args(m) for m in sent if m.method_type == spec.Basic.Ack]
+        rejects = [unpack_args(m) for m in sent if m.method_type == spec.Basic.Reject]
+        assert len(acks) < 20
+        assert rejects == [(21, False)]
+        assert not ch._unsettled
+        assert ch.queue_declare(q, passive=True).message_count == 0
+
+    def test_executor_prefetch_count(self, ch):
+        class Executor:
+            def submit(self, fn, *args):
+                pass
+
+        with pytest.raises(ValueError):
+            PoolConsumer(ch, 'q', executor=Executor())
+        assert PoolConsumer(ch, 'q', executor=Executor(), prefetch_count=3).prefetch_count == 3
+
+    def test_settle_tags(self, ch, rand_queue):
+        q = rand_queue
+        ch.queue_declare(q)
+        for i in range(6):
+            ch.basic_publish(Message('{}'.format(i)), routing_key=q)
+        tags = [ch.basic_get(q).delivery_tag for _ in range(6)]
+        assert list(ch._unsettled) == tags
+
+        sent = []
+        ch.connection.method_writer.write_methods = sent.extend
+        ch._settle_tags([tags[2], tags[0], tags[1], tags[4]], discards=[tags[5]])
+        assert [(m.method_type, unpack_args(m)) for m in sent] == [
+            (spec.Basic.Ack, (tags[2], True)),
+            (spec.Basic.Ack, (tags[4], False)),
+            (spec.Basic.Reject, (tags[5], False)),
+        ]
+        assert list(ch._unsettled) == [tags[3]]
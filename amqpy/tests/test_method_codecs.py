@@ -0,0 +1,64 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import pytest
+
+from .. import spec
+from ..exceptions import FrameSyntaxError
+from ..method_codecs import ENCODERS, DECODERS, pack_args, unpack_args
+from ..proto import Method
+from ..serialization import AMQPReader, AMQPWriter
+
+# a sample value of each argument type
+SAMPLE_VALUES = {
+    'bit': True,
+    'octet': 9,
+    'short': 65535,
+    'long': 100000,
+    'longlong': 2 ** 40,
+    'shortstr': 'amqpy.test',
+    'longstr': 'x' * 300,
+    'table': {'foo': 7, 'bar': {'baz': 'qux'}},
+}
+
+
+class TestMethodCodecs:
+    def test_all_methods(self):
+        assert set(ENCODERS) == set(DECODERS) == set(spec.METHOD_ARGS)
+
+    @pytest.mark.parametrize('method_type', sorted(spec.METHOD_ARGS))
+    def test_roundtrip(self, method_type):
+        fields = spec.METHOD_ARGS[method_type]
+        # alternate bit values to make sure they are packed in the right order
+        values = tuple(SAMPLE_VALUES[arg_type] if arg_type != 'bit' else i % 2 == 0
+                       for i, (_, arg_type) in enumerate(fields))
+
+        writer = pack_args(method_type, *values)
+        method = Method(method_type, AMQPReader(writer.getvalue() + b'\xff'))
+        assert unpack_args(method) == values
+
+        # the reader is left at the end of the arguments
+        assert method.args.read_octet() == 255
+
+    def test_same_as_writer(self):
+        w = AMQPWriter()
+        w.write_shortstr('ctag')
+        w.write_longlong(42)
+        w.write_bit(False)
+        w.write_shortstr('exchange')
+        w.write_shortstr('routing.key')
+
+        args = pack_args(spec.Basic.Deliver, 'ctag', 42, False, 'exchange', 'routing.key')
+        assert args.getvalue() == w.getvalue()
+
+    def test_consecutive_bits(self):
+        out = bytearray()
+        ENCODERS[spec.Queue.Declare](out, 0, 'q', False, True, False, True, True, None)
+        assert out == bytearray(b'\x00\x00\x01q\x1a\x00\x00\x00\x00')
+
+    def test_invalid(self):
+        with pytest.raises(FrameSyntaxError):
+            pack_args(spec.Basic.Publish, 0, 'x' * 256, '', False, False)
+        with pytest.raises(FrameSyntaxError):
+            pack_args(spec.Basic.Ack, -1, False)
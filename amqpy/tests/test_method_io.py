@@ -0,0 +1,45 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+
+import pytest
+
+from .. import spec
+from ..method_io import MethodQueue
+from ..proto import Method
+
+
+class TestMethodQueue:
+    def test_pop_order(self):
+        q = MethodQueue()
+        methods = [Method(spec.Basic.Deliver), Method(spec.Queue.DeclareOk),
+                   Method(spec.Basic.Deliver), Method(spec.Basic.Ack)]
+        for method in methods:
+            q.append(method)
+        assert len(q) == 4
+
+        # the oldest method of the allowed types is returned
+        assert q.pop([spec.Basic.Ack, spec.Queue.DeclareOk]) is methods[1]
+        assert q.pop([spec.Queue.DeclareOk]) is None
+
+        # without allowed types, methods are returned in the order they were added
+        assert q.pop(exclude={spec.Basic.Deliver}) is methods[3]
+        assert q.pop() is methods[0]
+        assert q.pop() is methods[2]
+        assert q.pop() is None
+        assert not q
+
+    def test_error(self):
+        q = MethodQueue()
+        q.append(Method(spec.Basic.Deliver))
+        exc = ValueError('error')
+        q.set_error(exc)
+
+        # the error is raised on every call until the queue is cleared
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                q.pop()
+
+        q.clear()
+        assert len(q) == 0
+        assert q.pop() is None
@@ -0,0 +1,162 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import socket
+import threading
+import time
+
+import pytest
+
+from .. import Connection, Message, spec
+from ..spec import FrameType
+from ..metrics import Histogram, Metrics, Sample, StatsdSink, PrometheusSink, prometheus_text
+
+
+@pytest.fixture(scope='function')
+def mconn(request):
+    conn = Connection(metrics=True)
+    request.addfinalizer(conn.close)
+    return conn
+
+
+class TestMetrics:
+    def test_disabled(self, conn, ch):
+        assert conn.metrics is None
+        assert ch.metrics is None
+        assert conn.transport.metrics is None
+        assert conn.method_writer.metrics is None
+
+    def test_counters(self, mconn, rand_queue):
+        ch = mconn.channel()
+        ch.confirm_select()
+        ch.queue_declare(rand_queue, auto_delete=True)
+        for i in range(3):
+            ch.basic_publish(Message('message {}'.format(i)), routing_key=rand_queue)
+        ch.basic_publish_batch([Message('batch')] * 2, routing_key=rand_queue)
+
+        received = []
+        ch.basic_consume(rand_queue, callback=received.append)
+        while len(received) < 5:
+            mconn.drain_events(1)
+        received[0].ack()
+        ch.basic_ack(received[-1].delivery_tag, multiple=True)
+
+        metrics = mconn.metrics
+        assert metrics.frames_out[FrameType.METHOD] >= 5
+        assert metrics.frames_out[FrameType.BODY] == 5
+        assert metrics.frames_in[FrameType.BODY] == 5
+        assert metrics.bytes_in[FrameType.BODY] == sum(len(m.body) + 8 for m in received)
+
+        ch_metrics = ch.metrics
+        assert ch_metrics is metrics.channel(ch.channel_id)
+        assert ch_metrics.methods_out[spec.Basic.Publish] == 5
+        assert ch_metrics.methods_in[spec.Basic.Deliver] == 5
+        assert ch_metrics.publish_latency.count == 4
+        assert ch_metrics.confirm_latency.count == 5
+        assert ch_metrics.ack_latency.count == 5
+
+    def test_body_frames(self, mconn, rand_queue):
+        chunk_size = mconn.frame_max - 8
+        body = b'x' * (chunk_size * 2 + 1)
+        ch = mconn.channel()
+        ch.basic_publish(Message(body), routing_key=rand_queue)
+        assert mconn.metrics.frames_out[FrameType.BODY] == 3
+        assert mconn.metrics.bytes_out[FrameType.BODY] == len(body) + 3 * 8
+
+    def test_lock_wait(self, mconn):
+        ch = mconn.channel()
+        locked = threading.Event()
+
+        def hold_lock():
+            with mconn.conn_lock:
+                locked.set()
+                time.sleep(0.05)
+
+        th = threading.Thread(target=hold_lock)
+        th.start()
+        locked.wait(5)
+        ch.basic_qos(0, 10, False)
+        th.join()
+
+        hist = ch.metrics.lock_wait['conn_lock']
+        assert hist.count == 1
+        assert hist.sum >= 0.04
+
+    def test_queue_depth(self, mconn, rand_queue):
+        ch = mconn.channel()
+        ch.queue_declare(rand_queue, auto_delete=True)
+        ch.basic_consume(rand_queue, no_ack=True)
+        ch.basic_publish(Message('hello'), routing_key=rand_queue)
+        # the delivery is queued while waiting for the reply to another method
+        ch.queue_declare(rand_queue, passive=True)
+        samples = mconn.metrics.collect()
+        depth = Sample('amqpy_incoming_methods', (('channel', str(ch.channel_id)),), 1)
+        assert depth in samples
+
+    def test_export(self, mconn):
+        exported = []
+
+        def broken_sink(samples):
+            raise RuntimeError('sink failed')
+
+        mconn.metrics.sinks = [broken_sink, exported.append]
+        mconn.channel()
+        mconn.metrics.export()
+        assert len(exported) == 1
+        names = set(sample.name for sample in exported[0])
+        assert 'amqpy_frames_sent_total' in names
+        assert 'amqpy_methods_received_total' in names
+
+
+class TestSinks:
+    samples = [
+        Sample('amqpy_frames_sent_total', (('frame_type', 'method'),), 3),
+        Sample('amqpy_methods_sent_total', (('channel', '1'), ('method', 'basic.publish')), 2),
+        Sample('amqpy_frames_sent_total', (('frame_type', 'body'),), 1),
+    ]
+
+    def test_histogram(self):
+        hist = Histogram((0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 5):
+            hist.observe(value)
+        samples = hist.samples('latency', (('channel', '1'),))
+        assert [s.value for s in samples] == [1, 3, 4, 6.25, 4]
+        assert samples[0].labels == (('channel', '1'), ('le', '0.1'))
+        assert samples[2].labels == (('channel', '1'), ('le', '+Inf'))
+
+    def test_prometheus_text(self):
+        text = prometheus_text(self.samples)
+        assert text == ('# TYPE amqpy_frames_sent_total counter\n'
+                        'amqpy_frames_sent_total{frame_type="method"} 3\n'
+                        'amqpy_frames_sent_total{frame_type="body"} 1\n'
+                        '# TYPE amqpy_methods_sent_total counter\n'
+                        'amqpy_methods_sent_total{channel="1",method="basic.publish"} 2\n')
+
+    def test_prometheus_sink(self, tmpdir):
+        path = str(tmpdir.join('amqpy.prom'))
+        PrometheusSink(path)(self.samples)
+        with open(path) as f:
+            assert f.read() == prometheus_text(self.samples)
+
+    def test_statsd(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        sink = StatsdSink(port=server.getsockname()[1])
+        try:
+            sink(self.samples)
+            lines = server.recv(4096).decode('utf-8').split('\n')
+        finally:
+            sink.close()
+            server.close()
+        assert lines == ['amqpy.frames_sent_total.method:3|g',
+                         'amqpy.methods_sent_total.1.basic_publish:2|g',
+                         'amqpy.frames_sent_total.body:1|g']
+
+    def test_unbound_metrics(self):
+        metrics = Metrics()
+        metrics.frame_in(FrameType.HEARTBEAT, 8)
+        assert metrics.collect() == [
+            Sample('amqpy_frames_received_total', (('frame_type', 'heartbeat'),), 1),
+            Sample('amqpy_frame_bytes_received_total', (('frame_type', 'heartbeat'),), 8),
+        ]
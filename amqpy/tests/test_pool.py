@@ -0,0 +1,115 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import time
+
+import pytest
+
+from .. import Channel, Timeout, NotFound
+from ..pool import ConnectionPool, ChannelPool
+
+
+@pytest.fixture(scope='function')
+def pool(request):
+    p = ConnectionPool(max_size=2)
+    request.addfinalizer(p.close)
+    return p
+
+
+class TestConnectionPool:
+    def test_reuse(self, pool):
+        with pool.connection() as conn:
+            assert conn.connected
+        with pool.connection() as conn2:
+            assert conn2 is conn
+
+    def test_max_size(self, pool):
+        conn1 = pool.acquire()
+        conn2 = pool.acquire()
+        assert conn1 is not conn2
+        with pytest.raises(Timeout):
+            pool.acquire(timeout=0.05)
+        pool.release(conn2)
+        assert pool.acquire(timeout=0.05) is conn2
+
+    def test_dead_connection(self, pool):
+        with pool.connection() as conn:
+            pass
+        conn.transport.close()
+        with pool.connection() as conn2:
+            assert conn2 is not conn
+            assert conn2.connected
+
+    def test_idle_eviction(self):
+        pool = ConnectionPool(max_idle_time=0.05)
+        with pool.connection() as conn:
+            pass
+        time.sleep(0.1)
+        with pool.connection() as conn2:
+            assert conn2 is not conn
+        assert not conn.connected
+        pool.close()
+        assert not conn2.connected
+
+    def test_channel(self, pool):
+        with pool.channel() as ch:
+            assert ch.mode == Channel.CH_MODE_NONE
+        with pool.channel(Channel.CH_MODE_CONFIRM) as confirm_ch:
+            assert confirm_ch is not ch
+            assert confirm_ch.mode == Channel.CH_MODE_CONFIRM
+        with pool.channel() as ch2:
+            assert ch2 is ch
+        with pool.channel(Channel.CH_MODE_CONFIRM) as ch2:
+            assert ch2 is confirm_ch
+
+
+class TestChannelPool:
+    def test_modes(self, conn):
+        channels = ChannelPool(conn)
+        ch = channels.acquire()
+        tx_ch = channels.acquire(Channel.CH_MODE_TX)
+        assert tx_ch.mode == Channel.CH_MODE_TX
+        channels.release(ch)
+        channels.release(tx_ch)
+        assert channels.acquire(Channel.CH_MODE_TX) is tx_ch
+        assert channels.acquire() is ch
+        channels.close()
+
+    def test_channel_error(self, conn):
+        channels = ChannelPool(conn)
+        with pytest.raises(NotFound):
+            with channels.channel(Channel.CH_MODE_CONFIRM) as ch:
+                ch.queue_declare('amqpy.pool.nonexistent', passive=True)
+
+        # the channel was reopened in the default mode
+        with channels.channel() as ch2:
+            assert ch2 is ch
+        with channels.channel(Channel.CH_MODE_CONFIRM) as ch2:
+            assert ch2 is not ch
+        channels.close()
+
+    def test_closed_channel(self, conn):
+        channels = ChannelPool(conn)
+        with channels.channel() as ch:
+            ch.close()
+        with channels.channel() as ch2:
+            assert ch2 is not ch
+            assert ch2.is_open
+        channels.close()
+
+    def test_max_size(self, conn):
+        channels = ChannelPool(conn, max_size=2)
+        ch = channels.acquire()
+        confirm_ch = channels.acquire(Channel.CH_MODE_CONFIRM)
+        with pytest.raises(Timeout):
+            channels.acquire(timeout=0.05)
+
+        # the idle channel of the other mode is closed to make room
+        channels.release(confirm_ch)
+        ch2 = channels.acquire()
+        assert ch2 is not confirm_ch
+        assert not confirm_ch.is_open
+        channels.release(ch)
+        channels.release(ch2)
+        channels.close()
+        assert not ch.is_open
@@ -0,0 +1,189 @@
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import socket
+import time
+
+import pytest
+
+from .. import Connection, Message, Channel, AMQPConnectionError, Timeout, spec
+from ..method_codecs import pack_args
+from ..proto import Method
+
+
+@pytest.fixture(scope='function')
+def rconn(request):
+    conn = Connection(auto_recover=True, recovery_delay=0.01)
+    request.addfinalizer(conn.close)
+    return conn
+
+
+def kill(conn):
+    """Drop the connection's socket without a close handshake
+    """
+    conn.transport.sock.shutdown(socket.SHUT_RDWR)
+
+
+def server_close(conn, reply_code=320, reply_text='CONNECTION_FORCED'):
+    """Make the connection handle a `Connection.Close` as if it had been sent by the server
+    """
+    args = pack_args(spec.Connection.Close, reply_code, reply_text, 0, 0)
+    conn._queue_method(conn, Method(spec.Connection.Close, args, None, 0))
+
+
+class TestRecovery:
+    def test_disabled(self, conn):
+        assert conn.topology is None
+        with pytest.raises(AMQPConnectionError):
+            conn.recover()
+
+    def test_topology(self, rconn, conn, rand_exch, rand_queue):
+        ch = rconn.channel()
+        ch.exchange_declare(rand_exch, 'direct', auto_delete=False)
+        ch.queue_declare(rand_queue, auto_delete=False)
+        ch.queue_bind(rand_queue, rand_exch, 'key')
+        assert list(rconn.topology.queue_bindings) == [(rand_queue, rand_exch, 'key')]
+
+        kill(rconn)
+        # the topology is gone after the broker forgets about it
+        with conn.channel() as ch2:
+            ch2.queue_delete(rand_queue)
+            ch2.exchange_delete(rand_exch)
+
+        rconn.recover()
+        assert rconn.is_alive()
+        assert ch.is_open
+
+        ch.basic_publish(Message('recovered'), rand_exch, 'key')
+        msg = None
+        for _ in range(10):
+            msg = ch.basic_get(rand_queue, no_ack=True)
+            if msg is not None:
+                break
+        assert msg is not None and msg.body == 'recovered'
+
+        ch.queue_delete(rand_queue)
+        ch.exchange_delete(rand_exch)
+        assert not rconn.topology.queues
+        assert not rconn.topology.exchanges
+        assert not rconn.topology.queue_bindings
+
+    def test_consumer(self, rconn, rand_queue):
+        ch = rconn.channel()
+        ch.confirm_select()
+        ch.basic_qos(0, 10, False)
+        ch.queue_declare(rand_queue)
+        received = []
+        tag = ch.basic_consume(rand_queue, callback=received.append)
+
+        kill(rconn)
+        assert rconn.drain_events(1) is None
+        assert rconn.is_alive()
+        assert ch.mode == Channel.CH_MODE_CONFIRM
+        assert tag in ch.callbacks
+
+        ch.basic_publish(Message('hello'), routing_key=rand_queue)
+        while not received:
+            rconn.drain_events(1)
+        assert received[0].body == 'hello'
+        assert received[0].delivery_info['consumer_tag'] == tag
+        received[0].ack()
+        ch.queue_delete(rand_queue)
+
+    def test_timeout(self, rconn, rand_queue):
+        ch = rconn.channel()
+        ch.queue_declare(rand_queue)
+        received = []
+        ch.basic_consume(rand_queue, callback=received.append)
+
+        # nothing listens on the port while the broker is "down"
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port, rconn._port = rconn._port, sock.getsockname()[1]
+        sock.close()
+        kill(rconn)
+        start = time.monotonic()
+        with pytest.raises(Timeout):
+            rconn.drain_events(0.3)
+        assert time.monotonic() - start < 1
+        assert not rconn.is_alive()
+
+        # the next call resumes the recovery
+        rconn._port = port
+        assert rconn.drain_events(1) is None
+        assert rconn.is_alive()
+        assert ch.is_open
+
+        ch.basic_publish(Message('hello'), routing_key=rand_queue)
+        while not received:
+            rconn.drain_events(1)
+        ch.queue_delete(rand_queue)
+
+    def test_unconfirmed(self, rconn, rand_queue):
+        ch = rconn.channel()
+        ch.confirm_select(blocking=False)
+        ch.queue_declare(rand_queue)
+        confirms = []
+        for _ in range(2):
+            ch.basic_publish(Message('lost'), routing_key=rand_queue,
+                             on_confirm=lambda seq_no, acked: confirms.append((seq_no, acked)))
+
+        kill(rconn)
+        rconn.recover()
+        # the messages in flight are nacked, since they will never be confirmed
+        assert confirms == [(1, False), (2, False)]
+        assert not ch._unconfirmed
+        assert not ch.wait_for_confirms()
+        assert ch.mode == Channel.CH_MODE_CONFIRM
+        ch.queue_delete(rand_queue)
+
+    def test_server_named_queue(self, rconn):
+        ch = rconn.channel()
+        queue = ch.queue_declare(exclusive=True).queue
+        received = []
+        ch.basic_consume(queue, callback=received.append)
+
+        kill(rconn)
+        rconn.recover()
+        assert queue not in rconn.topology.queues
+        new_queue, = rconn.topology.queues
+
+        ch.basic_publish(Message('hello'), routing_key=new_queue)
+        while not received:
+            rconn.drain_events(1)
+        assert received[0].body == 'hello'
+
+    def test_server_close(self, rconn, rand_queue):
+        ch = rconn.channel()
+        ch.queue_declare(rand_queue)
+        received = []
+        tag = ch.basic_consume(rand_queue, callback=received.append)
+
+        server_close(rconn)
+        assert rconn.drain_events(1) is None
+        assert rconn.is_alive()
+        assert rconn.channels[ch.channel_id] is ch
+        assert ch.is_open
+        assert tag in ch.callbacks
+
+        ch.basic_publish(Message('hello'), routing_key=rand_queue)
+        while not received:
+            rconn.drain_events(1)
+        assert received[0].body == 'hello'
+        ch.queue_delete(rand_queue)
+
+    def test_server_close_client_error(self, rconn):
+        ch = rconn.channel()
+        server_close(rconn, 503, 'COMMAND_INVALID')
+        with pytest.raises(AMQPConnectionError) as exc_info:
+            rconn.drain_events(1)
+        assert exc_info.value.reply_code == 503
+        assert not rconn.is_alive()
+        assert ch.channel_id is None
+
+    def test_server_close_disabled(self, conn):
+        ch = conn.channel()
+        server_close(conn)
+        with pytest.raises(AMQPConnectionError):
+            conn.drain_events(1)
+        assert ch.channel_id is None
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
+import io
 import six
 from datetime import datetime
 from decimal import Decimal
@@ -366,6 +367,54 @@ class TestSerialization:
         r = AMQPReader(s)
         assert r.read_table() == val
 
+    # -------------
+    # Buffers
+
+    def test_read_memoryview(self):
+        w = AMQPWriter()
+        w.write_shortstr('hello')
+        w.write_table({'foo': 7})
+        buf = bytearray(b'\xff' + w.getvalue() + b'\xff')
+
+        r = AMQPReader(memoryview(buf)[1:-1])
+        assert r.read_shortstr() == 'hello'
+
+        # the reader must read from the buffer without copying it, until detached
+        r.detach()
+        buf[:] = b'\x00' * len(buf)
+        assert r.read_table() == {'foo': 7}
+
+    def test_write_bytearray(self):
+        buf = bytearray(b'\xff')
+        w = AMQPWriter(buf)
+        w.write_bit(True)
+        w.write_short(7)
+        w.write_bit(True)
+        w.write_bit(True)
+        assert buf == bytearray(b'\xff\x01\x00\x07\x03')
+
+    def test_write_bytesio(self):
+        dest = io.BytesIO()
+        w = AMQPWriter(dest)
+        w.write_bit(True)
+        w.write_short(7)
+        assert w.getvalue() == b'\x01\x00\x07'
+        w.write_bit(True)
+        w.flush()
+        assert dest.getvalue() == b'\x01\x00\x07\x01'
+
+        with pytest.raises(TypeError):
+            AMQPWriter(b'')
+
+    def test_read_fixed_size_items(self):
+        # field table values of each fixed-size type: 'b', 'B', 'U', 'u', 'i', 'l', 'f', 't'
+        data = (b'\x01bb\xff' b'\x01BB\xff' b'\x01UU\xff\xfe' b'\x01uu\xff\xfe'
+                b'\x01ii\x00\x00\x01\x00' b'\x01ll\x00\x00\x00\x01\x00\x00\x00\x00'
+                b'\x01ff\x3f\xc0\x00\x00' b'\x01tt\x01')
+        r = AMQPReader(six.int2byte(0) * 3 + six.int2byte(len(data)) + data)
+        assert r.read_table() == {'b': -1, 'B': 255, 'U': -2, 'u': 65534, 'i': 256,
+                                  'l': 2 ** 32, 'f': 1.5, 't': True}
+
 
 class TestGenericContent:
     def test_generic_content_eq(self):
@@ -2,14 +2,17 @@ from __future__ import absolute_import, division, print_function
 
 __metaclass__ = type
 import errno
+import select
 import six
 import socket
 import ssl
 from abc import ABCMeta, abstractmethod
 import logging
 from threading import RLock
+from collections import namedtuple
 from ssl import SSLError
 import datetime
+import struct
 import time
 
 from . import compat
@@ -26,29 +29,114 @@ _UNAVAIL = {errno.EAGAIN, errno.EINTR, errno.ENOENT}
 
 AMQP_PROTOCOL_HEADER = b'AMQP\x00\x00\x09\x01'  # bytes([65, 77, 81, 80, 0, 0, 9, 1])
 
+#: Minimum size of the receive buffer used for buffered frame reads
+READ_BUFFER_SIZE = 256 * 1024
+
+#: maximum number of buffers passed to a single `sendmsg()` call
+IOV_MAX = getattr(socket, 'IOV_MAX', None) or 1024
+
+_frame_header = struct.Struct('>BHI')
+
+
+def monotonic_to_datetime(t):
+    """Convert a :func:`time.monotonic` time to local wall-clock time
+
+    :param t: monotonic time, or None
+    :type t: float or None
+    :rtype: datetime.datetime or None
+    """
+    if t is None:
+        return None
+    return datetime.datetime.now() - datetime.timedelta(seconds=time.monotonic() - t)
+
+
+class TransportStats(namedtuple('TransportStats', ['last_read', 'last_write',
+                                                   'last_heartbeat_received',
+                                                   'last_heartbeat_sent'])):
+    """Snapshot of the activity of a transport
+
+    All times are :func:`time.monotonic` times, which can be compared to `time.monotonic()` to
+    check how long the connection has been idle. The heartbeat times are None if no heartbeat was
+    received or sent yet. Use :meth:`datetimes()` to get wall-clock times instead.
+
+    Fields:
+
+    * last_read (float): time at which the last frame was read
+    * last_write (float): time at which the last frame was written
+    * last_heartbeat_received (float or None): time at which the last heartbeat frame was read
+    * last_heartbeat_sent (float or None): time at which the last heartbeat frame was written
+    """
+    __slots__ = ()
+
+    def datetimes(self):
+        """Convert the times to local wall-clock times
+
+        :return: stats with :class:`datetime.datetime` times
+        :rtype: TransportStats
+        """
+        return TransportStats(*[monotonic_to_datetime(t) for t in self])
+
 
 class Transport:
     __metaclass__ = ABCMeta
     """Common superclass for TCP and SSL transports"""
     connected = False
 
-    def __init__(self, host, port, connect_timeout, buf_size):
+    #: Connection metrics, or None if disabled
+    #:
+    #: :type: amqpy.metrics.Metrics or None
+    metrics = None
+
+    def __init__(self, host, port, connect_timeout, buf_size, buffered=True):
         """
         :param host: hostname or IP address
         :param port: port
         :param connect_timeout: connect timeout
+        :param buf_size: maximum frame size in bytes
+        :param buffered: read as much data as is available from the socket into the receive buffer
+            and parse frames out of it, instead of reading each part of a frame separately
         :type host: str
         :type port: int
         :type connect_timeout: float or None
+        :type buf_size: int
+        :type buffered: bool
         """
-        self._rbuf = bytearray(buf_size)
-
-        #: :type: datetime.datetime
-        self.last_heartbeat_sent = None
-        #: :type: datetime.datetime
-        self.last_heartbeat_received = None
-
-        self.last_heartbeat_sent_monotonic = 0.0
+        self.buffered = buffered
+        if buffered:
+            self._rbuf_size = max(buf_size, READ_BUFFER_SIZE)
+        else:
+            self._rbuf_size = buf_size
+        self._rbuf = bytearray(self._rbuf_size)
+        self._rview = memoryview(self._rbuf)
+
+        # start and end offsets of the data in `_rbuf` which has been received but not yet consumed
+        # (only used when `buffered` is enabled)
+        self._rpos = 0
+        self._rend = 0
+
+        # `[view, offset]` of a body frame payload which is being received directly into a message
+        # body buffer (only used when `buffered` is enabled); kept across calls so that a read
+        # interrupted by a timeout can be resumed
+        self._rinto = None
+        self._rinto_frame = None
+
+        #: Monotonic time at which the last heartbeat frame was written
+        #:
+        #: :type: float or None
+        self.last_heartbeat_sent_monotonic = None
+        #: Monotonic time at which the last heartbeat frame was read
+        #:
+        #: :type: float or None
+        self.last_heartbeat_received_monotonic = None
+
+        #: Monotonic time at which the last frame was read
+        #:
+        #: :type: float
+        self.last_read = time.monotonic()
+        #: Monotonic time at which the last frame was written
+        #:
+        #: :type: float
+        self.last_write = self.last_read
 
         # the purpose of the frame lock is to allow no more than one thread to read/write a frame
         # to the connection at any time
@@ -135,6 +223,72 @@ class Transport:
 
         return memoryview(self._rbuf)[:n]
 
+    def _fill(self, n, initial, _errnos):
+        """Ensure that at least `n` unconsumed bytes are available in the receive buffer
+
+        This is the default implementation for buffered reads. Each `recv_into()` call requests as
+        much data as will fit in the remaining space of the buffer, so that many small frames can be
+        received with a single system call.
+
+        Data in the buffer is never overwritten once it has been received, since frames handed out
+        by :meth:`read_frame` are views of the buffer. When there is not enough room left at the
+        end of the buffer, reading continues in a new buffer.
+
+        :param int n: number of unconsumed bytes required, starting at `self._rpos`
+        """
+        if self._rend - self._rpos >= n:
+            return
+
+        if self._rpos + n > len(self._rbuf):
+            # carry the unconsumed bytes over to the start of a new buffer
+            pending = self._rview[self._rpos:self._rend]
+            self._rbuf = bytearray(max(n, self._rbuf_size))
+            self._rbuf[:len(pending)] = pending
+            self._rview = memoryview(self._rbuf)
+            self._rpos, self._rend = 0, len(pending)
+
+        mview = self._rview
+        while self._rend - self._rpos < n:
+            try:
+                bytes_read = self.sock.recv_into(mview[self._rend:])
+            except socket.error as exc:
+                if not initial and exc.errno in _errnos:
+                    continue
+                raise
+
+            if not bytes_read:
+                raise IOError('socket closed')
+            self._rend += bytes_read
+
+    def _fill_into(self, _errnos):
+        """Receive the payload that is currently being read into a message body buffer
+
+        Bytes which are already in the receive buffer are copied; the rest are received from the
+        socket directly into the destination view. The progress is saved, so that this method can
+        be called again after an interruption (such as a timeout).
+        """
+        state = self._rinto
+        view, pos = state
+        n = len(view)
+
+        avail = min(self._rend - self._rpos, n - pos)
+        if avail:
+            view[pos:pos + avail] = self._rview[self._rpos:self._rpos + avail]
+            self._rpos += avail
+            pos = state[1] = pos + avail
+
+        while pos < n:
+            try:
+                bytes_read = self.sock.recv_into(view[pos:])
+            except socket.error as exc:
+                if exc.errno in _errnos:
+                    continue
+                raise
+
+            if not bytes_read:
+                raise IOError('socket closed')
+            pos = state[1] = pos + bytes_read
+
     @abstractmethod
     def read(self, n, initial=False):
         """Read exactly `n` bytes from the peer
@@ -146,11 +300,36 @@ class Transport:
         """
         pass
 
+    @abstractmethod
+    def fill(self, n, initial=False):
+        """Ensure that at least `n` unconsumed bytes are available in the receive buffer
+
+        :param int n: number of bytes required
+        """
+        pass
+
+    @abstractmethod
+    def fill_into(self):
+        """Receive the payload that is currently being read into a message body buffer
+        """
+        pass
+
     @abstractmethod
     def write(self, s):
         """Completely write a string to the peer
         """
 
+    def writev(self, buffers):
+        """Completely write a sequence of buffers to the peer, in order
+
+        The default implementation coalesces the buffers and writes them with a single call to
+        :meth:`write()`.
+
+        :param buffers: buffers to write
+        :type buffers: list[bytes or bytearray or memoryview]
+        """
+        self.write(b''.join(buffers))
+
     def _setup_transport(self):
         """Do any additional initialization of the class (used by the subclasses)
         """
@@ -166,37 +345,27 @@ class Transport:
         self.connected = False
 
     @synchronized('_frame_read_lock')
-    def read_frame(self):
+    def read_frame(self, body_dest=None):
         """Read frame from connection
 
         Note that the frame may be destined for any channel. It is permitted to interleave frames
         from different channels.
 
+        If `body_dest` is given, it is called as `body_dest(channel, payload_size)` when the header
+        of a `FrameType.BODY` frame has been read. It may return a writable view of exactly
+        `payload_size` bytes, in which case the payload is received directly into that view rather
+        than into the receive buffer, and the returned frame's payload is that view.
+
+        :param body_dest: provides the destination of body frame payloads
+        :type body_dest: Callable or None
         :return: frame
         :rtype: amqpy.proto.Frame
         """
-        frame = Frame()
         try:
-            # read frame header: 7 bytes
-            frame_header = self.read(7, True)
-            frame.data.extend(frame_header)
-
-            # read frame payload
-            payload = self.read(frame.payload_size)
-            frame.data.extend(payload)
-
-            # read frame terminator byte
-            frame_terminator = self.read(1)
-            frame.data.extend(frame_terminator)
-
-            if six.PY2:
-                #: :type: int
-                i_last_byte = six.byte2int(frame_terminator)
+            if self.buffered:
+                frame, i_last_byte = self._read_frame_buffered(body_dest)
             else:
-                # this fixes the change in memoryview in Python 3.3 (accessing an element returns the
-                #  correct type)
-                #: :type: int
-                i_last_byte = six.byte2int(bytes(frame_terminator))
+                frame, i_last_byte = self._read_frame_unbuffered()
         except (OSError, IOError, socket.error) as exc:
             # don't disconnect for ssl read time outs (Python 3.2):
             # http://bugs.python.org/issue10272
@@ -207,12 +376,97 @@ class Transport:
             raise
 
         if i_last_byte == FrameType.END:
+            self.last_read = time.monotonic()
             if frame.frame_type == FrameType.HEARTBEAT:
-                self.last_heartbeat_received = datetime.datetime.now()
+                self.last_heartbeat_received_monotonic = self.last_read
             return frame
         else:
             raise UnexpectedFrame('Received {} while expecting 0xce (FrameType.END)'.format(hex(i_last_byte)))
 
+    def _read_frame_buffered(self, body_dest=None):
+        """Read a frame out of the receive buffer, refilling it from the socket only if the buffer
+        does not already contain the complete frame
+
+        The returned frame's data is a view of the receive buffer, not a copy. Body frame payloads
+        may instead be received directly into the view provided by `body_dest`.
+
+        :param body_dest: see :meth:`read_frame()`
+        :type body_dest: Callable or None
+        :return: tuple(frame, frame terminator byte)
+        :rtype: tuple(amqpy.proto.Frame, int)
+        """
+        if self._rinto is not None:
+            # resume reading a payload into a message body buffer
+            return self._read_frame_into()
+
+        # frame header: 7 bytes
+        self.fill(7, self._rend == self._rpos)
+        start = self._rpos
+        frame_type, channel, payload_size = _frame_header.unpack_from(self._rbuf, start)
+
+        if frame_type == FrameType.BODY and body_dest is not None:
+            dest = body_dest(channel, payload_size)
+            if dest is not None:
+                self._rpos = start + 7
+                self._rinto = [dest, 0]
+                self._rinto_frame = Frame.with_payload(frame_type, channel, dest)
+                return self._read_frame_into()
+
+        # frame payload and terminator byte
+        frame_size = payload_size + 8
+        self.fill(frame_size)
+        start = self._rpos  # `fill()` may have moved the data in the buffer
+        self._rpos = start + frame_size
+
+        frame = Frame()
+        frame.data = self._rview[start:start + frame_size]
+        return frame, self._rbuf[start + frame_size - 1]
+
+    def _read_frame_into(self):
+        """Finish reading a body frame whose payload is received into a message body buffer
+
+        :return: tuple(frame, frame terminator byte)
+        :rtype: tuple(amqpy.proto.Frame, int)
+        """
+        self.fill_into()
+        self.fill(1)
+        i_last_byte = self._rbuf[self._rpos]
+        self._rpos += 1
+
+        frame = self._rinto_frame
+        self._rinto = self._rinto_frame = None
+        return frame, i_last_byte
+
+    def _read_frame_unbuffered(self):
+        """Read a frame with separate reads for the header, payload, and terminator byte
+
+        :return: tuple(frame, frame terminator byte)
+        :rtype: tuple(amqpy.proto.Frame, int)
+        """
+        frame = Frame()
+
+        # read frame header: 7 bytes
+        frame_header = self.read(7, True)
+        frame.data.extend(frame_header)
+
+        # read frame payload
+        payload = self.read(frame.payload_size)
+        frame.data.extend(payload)
+
+        # read frame terminator byte
+        frame_terminator = self.read(1)
+        frame.data.extend(frame_terminator)
+
+        if six.PY2:
+            #: :type: int
+            i_last_byte = six.byte2int(frame_terminator)
+        else:
+            # this fixes the change in memoryview in Python 3.3 (accessing an element returns the
+            #  correct type)
+            #: :type: int
+            i_last_byte = six.byte2int(bytes(frame_terminator))
+        return frame, i_last_byte
+
 
     @synchronized('_frame_write_lock')
     def write_frame(self, frame):
@@ -226,6 +480,7 @@ class Transport:
         """
         try:
             self.write(frame.data)
+            self.last_write = time.monotonic()
         except socket.timeout:
             raise
         except (OSError, IOError, socket.error) as exc:
@@ -233,12 +488,140 @@ class Transport:
                 self.connected = False
             raise
 
+    @synchronized('_frame_write_lock')
+    def write_frames(self, buffers):
+        """Write buffers containing one or more complete frames to connection
+
+        The buffers are written in a single operation while holding the write lock, so frames from
+        other threads are never interleaved with them. This is used to write all frames of a method
+        (method, header, and body frames) at once.
+
+        :param buffers: buffers, as produced by :meth:`amqpy.proto.Method.pack_frames()`
+        :type buffers: list[bytes or bytearray or memoryview]
+        """
+        try:
+            self.writev(buffers)
+            self.last_write = time.monotonic()
+        except socket.timeout:
+            raise
+        except (OSError, IOError, socket.error) as exc:
+            if get_errno(exc) not in _UNAVAIL:
+                self.connected = False
+            raise
+
+    @property
+    def last_heartbeat_sent(self):
+        """Wall-clock time at which the last heartbeat frame was written
+
+        :rtype: datetime.datetime or None
+        """
+        return monotonic_to_datetime(self.last_heartbeat_sent_monotonic)
+
+    @property
+    def last_heartbeat_received(self):
+        """Wall-clock time at which the last heartbeat frame was read
+
+        :rtype: datetime.datetime or None
+        """
+        return monotonic_to_datetime(self.last_heartbeat_received_monotonic)
+
+    def stats(self):
+        """Get a snapshot of the activity of this transport
+
+        :rtype: TransportStats
+        """
+        return TransportStats(self.last_read, self.last_write,
+                              self.last_heartbeat_received_monotonic,
+                              self.last_heartbeat_sent_monotonic)
+
     def send_heartbeat(self):
         """Send a heartbeat to the server
         """
-        self.last_heartbeat_sent = datetime.datetime.now()
-        self.last_heartbeat_sent_monotonic = time.monotonic()
         self.write_frame(Frame(FrameType.HEARTBEAT))
+        self.last_heartbeat_sent_monotonic = self.last_write
+        if self.metrics is not None:
+            self.metrics.frame_out(FrameType.HEARTBEAT, 8)
+
+    def send_heartbeat_if_idle(self, interval):
+        """Send a heartbeat to the server, unless a frame was written in the last `interval` seconds
+
+        This method never waits for the write lock: a thread which holds it is writing frames, and
+        any frame serves as a heartbeat. Nor does it wait for the socket to become writable: if
+        the send buffer is full, e.g. while the server blocks the connection, the heartbeat is
+        skipped, so that the heartbeat thread shared by all connections is not held up.
+
+        :param float interval: seconds
+        :return: True if a heartbeat was sent
+        :rtype: bool
+        """
+        if not self._frame_write_lock.acquire(False):
+            return False
+        try:
+            if time.monotonic() - self.last_write < interval or not self._writable():
+                return False
+            self.send_heartbeat()
+            return True
+        finally:
+            self._frame_write_lock.release()
+
+    def heartbeat_expired(self, timeout):
+        """Check whether nothing has been received from the server for `timeout` seconds
+
+        Frames which have been received but not read yet (because no thread is reading from the
+        connection) count as received.
+
+        :param float timeout: seconds
+        :rtype: bool
+        """
+        if time.monotonic() - self.last_read <= timeout:
+            return False
+        return not self._data_pending()
+
+    def _data_pending(self):
+        """Check if received data is waiting to be read, without reading it
+
+        :rtype: bool
+        """
+        if self._rend > self._rpos or self._rinto is not None:
+            return True
+        sock = self.sock
+        if sock is None:
+            return False
+        try:
+            if isinstance(sock, ssl.SSLSocket) and sock.pending():
+                return True
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (ValueError, select.error, socket.error):
+            # the socket was closed by another thread
+            return False
+        return bool(readable)
+
+    def _writable(self):
+        """Check if a heartbeat frame can be written without blocking
+
+        :rtype: bool
+        """
+        sock = self.sock
+        if sock is None:
+            return False
+        try:
+            _, writable, _ = select.select([], [sock], [], 0)
+        except (ValueError, select.error, socket.error):
+            # the socket was closed by another thread
+            return False
+        return bool(writable)
+
+    def abort(self):
+        """Shut the socket down without closing it, so that threads which are reading from or
+        writing to it fail immediately
+        """
+        self.connected = False
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
 
     def is_alive(self):
         """Check if connection is alive
@@ -275,9 +658,10 @@ class Transport:
         #     finally:
         #         self.sock.settimeout(prev)
 
-        # send a heartbeat to check if the connection is alive
+        # send a heartbeat to check if the connection is alive, unless another thread is writing to
+        # it right now
         try:
-            self.send_heartbeat()
+            self.send_heartbeat_if_idle(0)
         except socket.error:
             return False
 
@@ -288,9 +672,9 @@ class SSLTransport(Transport):
     """Transport that works over SSL
     """
 
-    def __init__(self, host, port, connect_timeout, frame_max, ssl_opts):
+    def __init__(self, host, port, connect_timeout, frame_max, ssl_opts, buffered=True):
         self.ssl_opts = ssl_opts
-        super(SSLTransport, self).__init__(host, port, connect_timeout, frame_max)
+        super(SSLTransport, self).__init__(host, port, connect_timeout, frame_max, buffered)
 
     def _setup_transport(self):
         """Wrap the socket in an SSL object
@@ -309,6 +693,18 @@ class SSLTransport(Transport):
         """
         return self._read(n, initial, _errnos=(errno.ENOENT, errno.EAGAIN, errno.EINTR))
 
+    def fill(self, n, initial=False):
+        """Ensure that at least `n` unconsumed bytes are available in the receive buffer
+
+        :param int n: number of bytes required
+        """
+        self._fill(n, initial, _errnos=(errno.ENOENT, errno.EAGAIN, errno.EINTR))
+
+    def fill_into(self):
+        """Receive the payload that is currently being read into a message body buffer
+        """
+        self._fill_into(_errnos=(errno.ENOENT, errno.EAGAIN, errno.EINTR))
+
     def write(self, s):
         """Write a string out to the SSL socket fully
         """
@@ -338,11 +734,51 @@ class TCPTransport(Transport):
         """
         return self._read(n, initial, _errnos=(errno.EAGAIN, errno.EINTR))
 
+    def fill(self, n, initial=False):
+        """Ensure that at least `n` unconsumed bytes are available in the receive buffer
+
+        :param int n: number of bytes required
+        """
+        self._fill(n, initial, _errnos=(errno.EAGAIN, errno.EINTR))
+
+    def fill_into(self):
+        """Receive the payload that is currently being read into a message body buffer
+        """
+        self._fill_into(_errnos=(errno.EAGAIN, errno.EINTR))
+
     def write(self, s):
         self.sock.sendall(s)
 
+    def writev(self, buffers):
+        """Write a sequence of buffers fully with scatter/gather `sendmsg()` calls, without
+        coalescing them first
 
-def create_transport(host, port, connect_timeout, frame_max, ssl_opts=None):
+        Falls back to a single coalesced write if `sendmsg()` is not available on this platform.
+        """
+        if len(buffers) == 1:
+            self.write(buffers[0])
+            return
+
+        sendmsg = getattr(self.sock, 'sendmsg', None)
+        if sendmsg is None:
+            self.write(b''.join(buffers))
+            return
+
+        buffers = [memoryview(b) for b in buffers if len(b)]
+        i = 0
+        while i < len(buffers):
+            sent = sendmsg(buffers[i:i + IOV_MAX])
+            # skip over the buffers that were fully sent, and trim a partially sent buffer
+            while sent:
+                n = len(buffers[i])
+                if sent < n:
+                    buffers[i] = buffers[i][sent:]
+                    break
+                sent -= n
+                i += 1
+
+
+def create_transport(host, port, connect_timeout, frame_max, ssl_opts=None, buffered=True):
     """Given a few parameters from the Connection constructor, select and create a subclass of
     Transport
 
@@ -352,11 +788,13 @@ def create_transport(host, port, connect_timeout, frame_max, ssl_opts=None):
     :param host: host
     :param connect_timeout: connect timeout
     :param ssl_opts: ssl options passed to :func:`ssl.wrap_socket()`
+    :param buffered: use buffered frame reads
     :type host: str
     :type connect_timeout: float or None
     :type ssl_opts: dict or None
+    :type buffered: bool
     """
     if isinstance(ssl_opts, dict):
-        return SSLTransport(host, port, connect_timeout, frame_max, ssl_opts)
+        return SSLTransport(host, port, connect_timeout, frame_max, ssl_opts, buffered)
     else:
-        return TCPTransport(host, port, connect_timeout, frame_max)
+        return TCPTransport(host, port, connect_timeout, frame_max, buffered)
@@ -0,0 +1,107 @@
+"""Compare list-based and indexed queuing of received methods
+
+A backlog of `Basic.Deliver` methods is queued across many channels, as happens with a high
+prefetch count while a thread is blocked in a synchronous RPC. Two operations are timed:
+
+- rpc: each channel waits for an RPC reply which was queued behind its share of the backlog
+- drain: `Connection.drain_events()` takes every queued method, one at a time
+
+The "list" variant is the previous implementation (a list scanned with `list.remove()` per channel
+and `pop(0)` from the first non-empty channel); the "indexed" variant uses `MethodQueue` and a
+ready-channel set, as `AbstractChannel` and `Connection` do now.
+
+Usage::
+
+    PYTHONPATH=. python benchmarks/bench_method_queue.py [channel_count] [backlog]
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import sys
+import time
+from collections import OrderedDict
+
+from amqpy import spec
+from amqpy.method_io import MethodQueue
+from amqpy.proto import Method
+
+RPC_REPLY = [spec.Channel.Close, spec.Connection.Close, spec.Queue.DeclareOk]
+
+
+def fill(queues, backlog, ready=None):
+    channel_count = len(queues)
+    for i in range(backlog):
+        channel_id = i % channel_count
+        queues[channel_id].append(Method(spec.Basic.Deliver, channel_id=channel_id))
+        if ready is not None:
+            ready[channel_id] = None
+    for channel_id, queue in enumerate(queues):
+        queue.append(Method(spec.Queue.DeclareOk, channel_id=channel_id))
+
+
+def rpc_list(queues):
+    for queue in queues:
+        for qm in queue:
+            if qm.method_type in RPC_REPLY:
+                queue.remove(qm)
+                break
+
+
+def rpc_indexed(queues):
+    for queue in queues:
+        queue.pop(RPC_REPLY)
+
+
+def drain_list(queues):
+    count = 0
+    while True:
+        for queue in queues:
+            if queue:
+                queue.pop(0)
+                count += 1
+                break
+        else:
+            return count
+
+
+def drain_indexed(queues, ready):
+    count = 0
+    while ready:
+        channel_id = next(iter(ready))
+        queue = queues[channel_id]
+        method = queue.pop()
+        if method is None or not queue:
+            del ready[channel_id]
+        if method is not None:
+            count += 1
+    return count
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    channel_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    backlog = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    print('{} channels, {} queued deliveries'.format(channel_count, backlog))
+
+    queues = [[] for _ in range(channel_count)]
+    fill(queues, backlog)
+    rpc = timed(rpc_list, queues)
+    drain = timed(drain_list, queues)
+    print('{:8}  rpc: {:.4f}s  drain: {:.4f}s'.format('list', rpc, drain))
+
+    queues = [MethodQueue() for _ in range(channel_count)]
+    ready = OrderedDict()
+    fill(queues, backlog, ready)
+    rpc = timed(rpc_indexed, queues)
+    drain = timed(drain_indexed, queues, ready)
+    print('{:8}  rpc: {:.4f}s  drain: {:.4f}s'.format('indexed', rpc, drain))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Compare serializing message properties with and without a `MessageTemplate`
+
+The messages carry a typical set of properties, including an application header table, and differ
+only in their `message_id` and `timestamp`.
+
+Usage::
+
+    PYTHONPATH=. python benchmarks/bench_properties.py [repeat]
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import sys
+import timeit
+from datetime import datetime
+
+from amqpy import Message, MessageTemplate
+
+PROPERTIES = {
+    'content_type': 'application/json',
+    'delivery_mode': 2,
+    'priority': 1,
+    'app_id': 'billing-service',
+    'application_headers': {
+        'x-trace-id': '7f3c2a9e-8b1d-4e55-a0f2-5c9d1e6b3a47',
+        'x-retry-count': 0,
+        'x-source': 'billing',
+        'x-version': 3,
+    },
+}
+
+NOW = datetime(2016, 1, 1, 12, 0, 0)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    number = 10000
+
+    plain = Message(b'{}', message_id='42', timestamp=NOW, **PROPERTIES)
+    templated = MessageTemplate(**PROPERTIES).message(b'{}', message_id='42', timestamp=NOW)
+    assert plain.serialize_properties() == templated.serialize_properties()
+
+    for name, msg in [('plain', plain), ('template', templated)]:
+        t = min(timeit.repeat(msg.serialize_properties, number=number, repeat=repeat)) / number
+        print('{:10} {:10.2f} us'.format(name, t * 1e6))
+
+
+if __name__ == '__main__':
+    main()
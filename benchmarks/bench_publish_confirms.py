@@ -0,0 +1,49 @@
+"""Compare blocking and non-blocking publisher confirms
+
+Publishes messages to a temporary queue on a running broker with `confirm_select()` (one round trip
+per message) and with `confirm_select(blocking=False)` followed by a single `wait_for_confirms()`.
+
+Usage::
+
+    PYTHONPATH=. python benchmarks/bench_publish_confirms.py [message_count] [host]
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import sys
+import time
+
+from amqpy import Connection, Message
+
+
+def run(conn, count, blocking):
+    with conn.channel() as ch:
+        qname, _, _ = ch.queue_declare(exclusive=True)
+        ch.confirm_select(blocking=blocking)
+        msg = Message('x' * 64)
+
+        start = time.perf_counter()
+        for _ in range(count):
+            ch.basic_publish(msg, routing_key=qname)
+        ch.wait_for_confirms()
+        elapsed = time.perf_counter() - start
+
+        ch.queue_delete(qname)
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    host = sys.argv[2] if len(sys.argv) > 2 else 'localhost'
+
+    conn = Connection(host)
+    print('{} confirmed publishes'.format(count))
+    for blocking in (True, False):
+        elapsed = run(conn, count, blocking)
+        print('{:12}  time: {:.3f}s  publishes/s: {:.0f}'.format(
+            'blocking' if blocking else 'non-blocking', elapsed, count / elapsed))
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Compare per-frame, per-method, and batched writes when publishing messages
+
+The client publishes `Basic.Publish` methods to a local TCP server thread which discards everything
+it receives. Frames are written either one at a time with `Transport.write_frame()` (one `Frame`
+object and one `sendall()` per frame), all frames of a method at once with
+`MethodWriter.write_method()`, or in batches of `BATCH_SIZE` methods with
+`MethodWriter.write_methods()`, as `Channel.basic_publish_batch()` does.
+
+Usage::
+
+    PYTHONPATH=. python benchmarks/bench_publish_framing.py [message_count] [body_size]
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import socket
+import sys
+import threading
+import time
+
+from amqpy import spec
+from amqpy.message import Message
+from amqpy.method_io import MethodWriter
+from amqpy.proto import Method
+from amqpy.serialization import AMQPWriter
+from amqpy.transport import create_transport
+
+FRAME_MAX = 131072
+BATCH_SIZE = 100
+
+
+def serve(listener):
+    conn, _ = listener.accept()
+    try:
+        buf = bytearray(1024 * 1024)
+        while conn.recv_into(buf):
+            pass
+    finally:
+        conn.close()
+
+
+def make_method(body):
+    args = AMQPWriter()
+    args.write_short(0)
+    args.write_shortstr('exchange')
+    args.write_shortstr('routing.key')
+    args.write_bit(False)
+    args.write_bit(False)
+    return Method(spec.Basic.Publish, args, Message(body, content_type='text/plain'), 1)
+
+
+def write_per_frame(transport, count, body):
+    for _ in range(count):
+        method = make_method(body)
+        transport.write_frame(method.dump_method_frame())
+        transport.write_frame(method.dump_header_frame())
+        for frame in method.dump_body_frame(FRAME_MAX - 8):
+            transport.write_frame(frame)
+
+
+def write_per_method(transport, count, body):
+    writer = MethodWriter(transport, FRAME_MAX)
+    for _ in range(count):
+        writer.write_method(make_method(body))
+
+
+def write_batched(transport, count, body):
+    writer = MethodWriter(transport, FRAME_MAX)
+    for i in range(0, count, BATCH_SIZE):
+        writer.write_methods([make_method(body) for _ in range(min(BATCH_SIZE, count - i))])
+
+
+def run(count, body_size, write):
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    server = threading.Thread(target=serve, args=(listener,))
+    server.daemon = True
+    server.start()
+
+    transport = create_transport('127.0.0.1', listener.getsockname()[1], None, FRAME_MAX)
+    body = b'x' * body_size
+
+    start = time.perf_counter()
+    write(transport, count, body)
+    elapsed = time.perf_counter() - start
+
+    transport.close()
+    server.join()
+    listener.close()
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    body_size = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    print('{} publishes, {} byte bodies'.format(count, body_size))
+    for name, write in [('per-frame', write_per_frame), ('per-method', write_per_method),
+                        ('batched', write_batched)]:
+        elapsed = run(count, body_size, write)
+        print('{:10}  time: {:.3f}s  publishes/s: {:.0f}'.format(name, elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    main()
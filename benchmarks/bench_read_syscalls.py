@@ -0,0 +1,116 @@
+"""Count `recv_into()` system calls per delivered message for buffered and unbuffered frame reads
+
+A local TCP server thread plays the part of the broker: it waits for the AMQP protocol header, then
+sends a burst of `Basic.Deliver` messages (method, header, and body frames). The client reads the
+deliveries with a `MethodReader`, with the transport's socket wrapped to count `recv_into()` calls.
+
+Usage::
+
+    PYTHONPATH=. python benchmarks/bench_read_syscalls.py [message_count] [body_size]
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import socket
+import sys
+import threading
+import time
+
+from amqpy import spec
+from amqpy.message import Message
+from amqpy.method_io import MethodReader
+from amqpy.proto import Method
+from amqpy.serialization import AMQPWriter
+from amqpy.transport import create_transport
+
+FRAME_MAX = 131072
+
+
+class CountingSocket:
+    """Socket wrapper which counts calls to `recv_into()`
+    """
+
+    def __init__(self, sock):
+        self._sock = sock
+        self.recv_calls = 0
+
+    def recv_into(self, *args):
+        self.recv_calls += 1
+        return self._sock.recv_into(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+def encode_deliveries(count, body_size):
+    """Encode `count` Basic.Deliver methods with their content into a single bytes object
+    """
+    data = bytearray()
+    body = b'x' * body_size
+    for i in range(count):
+        args = AMQPWriter()
+        args.write_shortstr('ctag')
+        args.write_longlong(i + 1)
+        args.write_bit(False)
+        args.write_shortstr('exchange')
+        args.write_shortstr('routing.key')
+        method = Method(spec.Basic.Deliver, args, Message(body, content_type='text/plain'), 1)
+        data += method.dump_method_frame().data
+        data += method.dump_header_frame().data
+        for frame in method.dump_body_frame(FRAME_MAX - 8):
+            data += frame.data
+    return bytes(data)
+
+
+def serve(listener, payload):
+    conn, _ = listener.accept()
+    try:
+        header = b''
+        while len(header) < 8:
+            header += conn.recv(8 - len(header))
+        conn.sendall(payload)
+        # wait for the client to disconnect
+        conn.recv(1)
+    finally:
+        conn.close()
+
+
+def run(count, body_size, buffered):
+    payload = encode_deliveries(count, body_size)
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    server = threading.Thread(target=serve, args=(listener, payload))
+    server.daemon = True
+    server.start()
+
+    transport = create_transport('127.0.0.1', listener.getsockname()[1], None, FRAME_MAX,
+                                 buffered=buffered)
+    transport.sock = CountingSocket(transport.sock)
+    reader = MethodReader(transport)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        reader.read_method()
+    elapsed = time.perf_counter() - start
+
+    recv_calls = transport.sock.recv_calls
+    transport.sock = transport.sock._sock
+    transport.close()
+    listener.close()
+    return recv_calls, elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    body_size = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    print('{} deliveries, {} byte bodies'.format(count, body_size))
+    for buffered in (False, True):
+        recv_calls, elapsed = run(count, body_size, buffered)
+        print('{:10}  recv_into calls: {:8}  per message: {:6.3f}  time: {:.3f}s'.format(
+            'buffered' if buffered else 'unbuffered', recv_calls, recv_calls / count, elapsed))
+
+
+if __name__ == '__main__':
+    main()
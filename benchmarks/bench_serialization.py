@@ -0,0 +1,132 @@
+"""Microbenchmarks for `AMQPReader` and `AMQPWriter`
+
+Each primitive is timed by reading or writing it `FIELDS` times in a row from or into a single
+buffer. The whole-table benchmarks decode and encode a typical message header table, and the
+`Basic.Deliver` benchmarks decode the argument block of a delivery field by field and with the
+generated codec from `amqpy.method_codecs`, as the channel does.
+
+Usage::
+
+    PYTHONPATH=. python benchmarks/bench_serialization.py [repeat]
+"""
+from __future__ import absolute_import, division, print_function
+
+__metaclass__ = type
+import sys
+import timeit
+from datetime import datetime
+from decimal import Decimal
+
+from amqpy import spec
+from amqpy.method_codecs import DECODERS
+from amqpy.serialization import AMQPReader, AMQPWriter
+
+FIELDS = 100
+
+PRIMITIVES = [
+    ('bit', True),
+    ('octet', 7),
+    ('short', 1000),
+    ('long', 100000),
+    ('longlong', 2 ** 40),
+    ('shortstr', 'amqpy.routing.key'),
+    ('longstr', 'x' * 256),
+]
+
+HEADERS = {
+    'x-trace-id': '7f3c2a9e-8b1d-4e55-a0f2-5c9d1e6b3a47',
+    'x-retry-count': 3,
+    'x-priority': 1.5,
+    'x-amount': Decimal('123.45'),
+    'x-created': datetime(2016, 1, 1, 12, 0, 0),
+    'x-flags': [1, 'two', None],
+    'x-nested': {'source': 'billing', 'version': 2, 'enabled': True},
+}
+
+
+def encode(name, value, count=FIELDS):
+    w = AMQPWriter()
+    write = getattr(w, 'write_' + name)
+    for _ in range(count):
+        write(value)
+    return w.getvalue()
+
+
+def bench_read(name, value, repeat):
+    data = encode(name, value)
+    reader_name = 'read_' + name
+
+    def run():
+        r = AMQPReader(data)
+        read = getattr(r, reader_name)
+        for _ in range(FIELDS):
+            read()
+
+    return min(timeit.repeat(run, number=100, repeat=repeat)) / (100 * FIELDS)
+
+
+def bench_write(name, value, repeat):
+    def run():
+        encode(name, value)
+
+    return min(timeit.repeat(run, number=100, repeat=repeat)) / (100 * FIELDS)
+
+
+def bench_table(repeat):
+    w = AMQPWriter()
+    w.write_table(HEADERS)
+    data = w.getvalue()
+
+    def read():
+        AMQPReader(data).read_table()
+
+    def write():
+        AMQPWriter().write_table(HEADERS)
+
+    return (min(timeit.repeat(read, number=1000, repeat=repeat)) / 1000,
+            min(timeit.repeat(write, number=1000, repeat=repeat)) / 1000)
+
+
+def bench_deliver(repeat):
+    w = AMQPWriter()
+    w.write_shortstr('amq.ctag-Jd3aZk3lFh5Dv0ANnlQ3ow')  # consumer tag
+    w.write_longlong(123456)  # delivery tag
+    w.write_bit(False)  # redelivered
+    w.write_shortstr('amq.topic')  # exchange
+    w.write_shortstr('orders.eu.created')  # routing key
+    data = w.getvalue()
+
+    def read():
+        r = AMQPReader(data)
+        r.read_shortstr()
+        r.read_longlong()
+        r.read_bit()
+        r.read_shortstr()
+        r.read_shortstr()
+
+    decode = DECODERS[spec.Basic.Deliver]
+
+    def read_codec():
+        decode(AMQPReader(data))
+
+    return (min(timeit.repeat(read, number=10000, repeat=repeat)) / 10000,
+            min(timeit.repeat(read_codec, number=10000, repeat=repeat)) / 10000)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print('{:12} {:>12} {:>12}'.format('primitive', 'read ns', 'write ns'))
+    for name, value in PRIMITIVES:
+        print('{:12} {:12.1f} {:12.1f}'.format(name, bench_read(name, value, repeat) * 1e9,
+                                               bench_write(name, value, repeat) * 1e9))
+
+    read, write = bench_table(repeat)
+    print('{:12} {:12.1f} {:12.1f}'.format('table', read * 1e9, write * 1e9))
+    fields, codec = bench_deliver(repeat)
+    print('{:12} {:12.1f}'.format('deliver', fields * 1e9))
+    print('{:12} {:12.1f}'.format('deliver gen', codec * 1e9))
+
+
+if __name__ == '__main__':
+    main()